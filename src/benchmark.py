@@ -0,0 +1,427 @@
+"""
+Micro benchmarks for the controller's hot paths.
+
+Usage:
+    python src/benchmark.py colors [config.json] [--iterations N]
+    python src/benchmark.py encode [--iterations N]
+    python src/benchmark.py render [--frames N] [--json results.json] [--compare baseline.json]
+    python src/benchmark.py output [--backend hidapi|hidraw|loopback] [--path PATH] [--frames N]
+    python src/benchmark.py startup [config.json] [--runs N]
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+import numpy as np
+from config import NUMBER_OF_LEDS, display_modes, display_modes_small, default_config
+from color_program import ColorProgram
+from hid_frame import FrameEncoder, HEADER
+from hid_output import OUTPUT_BACKENDS, open_output, read_recording
+from utils import hex_to_rgb, rgb_to_hex
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+
+SAMPLE_METRICS = {"cpu_temp": 55, "gpu_temp": 48, "cpu_usage": 37, "gpu_usage": 81}
+METRICS_MIN_VALUE = {"cpu_temp": 30, "gpu_temp": 30, "cpu_usage": 0, "gpu_usage": 0}
+METRICS_MAX_VALUE = {"cpu_temp": 90, "gpu_temp": 90, "cpu_usage": 100, "gpu_usage": 100}
+
+
+def _interpolate_hex(start_color, end_color, factor):
+    start_color = np.array([int(start_color[i:i+2], 16) for i in (0, 2, 4)])
+    end_color = np.array([int(end_color[i:i+2], 16) for i in (0, 2, 4)])
+    interpolated_color = (start_color * (1 - factor) + end_color * factor).astype(int)
+    return ''.join(f"{c:02x}" for c in interpolated_color)
+
+
+def _random_hex():
+    return f"{np.random.randint(0, 256):02x}{np.random.randint(0, 256):02x}{np.random.randint(0, 256):02x}"
+
+
+def reference_config_colors(conf_colors, metrics, cpt, cycle_duration, metrics_min_value, metrics_max_value, now):
+    """The per LED hex string interpreter that Controller.get_config_colors used before color programs."""
+    colors = []
+    for i, color in enumerate(conf_colors):
+        if color.lower() == "random":
+            colors.append(_random_hex())
+        elif color.startswith("wave_"):
+            wave_type, gradient = color.split(";", 1)
+            colors_list = gradient.split('-')
+            if len(colors_list) >= 2:
+                if colors_list[0] != colors_list[-1]:
+                    colors_list.append(colors_list[0])
+                num_segments = len(colors_list) - 1
+                if wave_type == "wave_ltr":
+                    phase_shift = (i / NUMBER_OF_LEDS) * cycle_duration
+                else:
+                    phase_shift = ((NUMBER_OF_LEDS - i) / NUMBER_OF_LEDS) * cycle_duration
+                time_in_cycle = (cpt + phase_shift) % cycle_duration
+                segment_duration = cycle_duration / num_segments
+                segment_index = min(int(time_in_cycle / segment_duration), num_segments - 1)
+                factor = (time_in_cycle - segment_index * segment_duration) / segment_duration
+                colors.append(_interpolate_hex(colors_list[segment_index], colors_list[segment_index + 1], factor))
+            else:
+                colors.append(colors_list[0])
+        elif ";" in color:
+            parts = color.split(';')
+            stops = []
+            for stop in parts[1:]:
+                stop_parts = stop.split(':')
+                stops.append({'color': stop_parts[0], 'value': int(stop_parts[1])})
+            stops.sort(key=lambda x: x['value'])
+            metric_value = metrics[parts[0]]
+            if metric_value <= stops[0]['value']:
+                colors.append(stops[0]['color'])
+            elif metric_value >= stops[-1]['value']:
+                colors.append(stops[-1]['color'])
+            else:
+                for j in range(len(stops) - 1):
+                    if stops[j]['value'] <= metric_value < stops[j+1]['value']:
+                        factor = (metric_value - stops[j]['value']) / (stops[j+1]['value'] - stops[j]['value'])
+                        colors.append(_interpolate_hex(stops[j]['color'], stops[j+1]['color'], factor))
+                        break
+        elif "-" in color:
+            split_color = color.split("-")
+            if len(split_color) == 3:
+                start_color, end_color, metric = split_color
+                if metric == "seconds":
+                    factor = now.second / 59
+                elif metric == "minutes":
+                    factor = now.minute / 59
+                elif metric == "hours":
+                    factor = now.hour / 23
+                else:
+                    min_val = metrics_min_value[metric]
+                    max_val = metrics_max_value[metric]
+                    factor = max(0, min(1, (metrics[metric] - min_val) / (max_val - min_val)))
+                colors.append(_interpolate_hex(start_color, end_color, factor))
+            else:
+                colors_list = split_color
+                if colors_list[0] != colors_list[-1]:
+                    colors_list.append(colors_list[0])
+                num_segments = len(colors_list) - 1
+                time_in_cycle = cpt % cycle_duration
+                segment_duration = cycle_duration / num_segments
+                segment_index = min(int(time_in_cycle / segment_duration), num_segments - 1)
+                factor = (time_in_cycle - segment_index * segment_duration) / segment_duration
+                colors.append(_interpolate_hex(colors_list[segment_index], colors_list[segment_index + 1], factor))
+        else:
+            colors.append(color)
+    return np.array(colors)
+
+
+def reference_encode(hex_colors, leds):
+    """The hex string packet encoding that Controller.send_packets used before FrameEncoder."""
+    header = HEADER.hex()
+    message = "".join([hex_colors[i] if leds[i] != 0 else "000000" for i in range(NUMBER_OF_LEDS)])
+    packets = [bytes.fromhex(header + message[:128 - len(header)])]
+    remaining = message[128 - len(header):]
+    for i in range(0, 4):
+        packets.append(bytes.fromhex('00' + remaining[i*128:(i+1)*128]))
+    return packets
+
+
+def _time_per_call(function, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        function(i)
+    return (time.perf_counter() - start) / iterations
+
+
+def bench_colors(config_path, iterations):
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    cycle_duration = int(config.get('cycle_duration', 5) / config.get('update_interval', 0.1))
+    now = datetime.datetime.now()
+    for key in ["metrics", "time"]:
+        conf_colors = config.get(key, {}).get('colors', ["ffe000"] * NUMBER_OF_LEDS)
+        program = ColorProgram(conf_colors, METRICS_MIN_VALUE, METRICS_MAX_VALUE)
+
+        reference = _time_per_call(lambda cpt: reference_config_colors(
+            conf_colors, SAMPLE_METRICS, cpt, cycle_duration, METRICS_MIN_VALUE, METRICS_MAX_VALUE, now), iterations)
+        compile_time = _time_per_call(lambda cpt: ColorProgram(conf_colors, METRICS_MIN_VALUE, METRICS_MAX_VALUE), iterations)
+        compiled = _time_per_call(lambda cpt: program.evaluate(SAMPLE_METRICS, cpt, cycle_duration, now), iterations)
+
+        # Check the compiled program against the reference on every LED that isn't random
+        mismatches = 0
+        deterministic = np.array([c.lower() != "random" for c in conf_colors])
+        for cpt in range(cycle_duration * 2):
+            expected = reference_config_colors(conf_colors, SAMPLE_METRICS, cpt, cycle_duration,
+                                               METRICS_MIN_VALUE, METRICS_MAX_VALUE, now)
+            expected = np.array([hex_to_rgb(c) for c in expected])
+            actual = program.evaluate(SAMPLE_METRICS, cpt, cycle_duration, now)
+            mismatches += int(np.any(expected[deterministic] != actual[deterministic], axis=1).sum())
+
+        print(f"[{key}] {len(conf_colors)} LEDs, {iterations} iterations")
+        print(f"  string interpreter : {reference * 1e6:9.1f} us/frame")
+        print(f"  compile (once)     : {compile_time * 1e6:9.1f} us")
+        print(f"  color program      : {compiled * 1e6:9.1f} us/frame ({reference / compiled:.1f}x)")
+        print(f"  mismatching LEDs   : {mismatches}")
+
+
+def bench_encode(iterations):
+    colors = np.random.randint(0, 256, (NUMBER_OF_LEDS, 3)).astype(np.uint8)
+    leds = np.random.randint(0, 2, NUMBER_OF_LEDS)
+    hex_colors = np.array([rgb_to_hex(c) for c in colors])
+    encoder = FrameEncoder()
+
+    reference = _time_per_call(lambda i: reference_encode(hex_colors, leds), iterations)
+    buffered = _time_per_call(lambda i: encoder.encode(colors, leds), iterations)
+    identical = [bytes(report) for report in encoder.encode(colors, leds)] == reference_encode(hex_colors, leds)
+
+    print(f"[encode] {NUMBER_OF_LEDS} LEDs, {iterations} iterations")
+    print(f"  hex string packets : {reference * 1e6:9.2f} us/frame")
+    print(f"  frame buffer       : {buffered * 1e6:9.2f} us/frame ({reference / buffered:.1f}x)")
+    print(f"  identical reports  : {identical}")
+
+
+# Color configs the render benchmark runs every display mode against
+RENDER_COLOR_CONFIGS = {
+    "plain": "ffe000",
+    "wave": "wave_ltr;ff0000-00ff00-0000ff",
+    "gradient": "cpu_temp;0000ff:30;00ff00:55;ffa000:70;ff0000:85",
+    "random": "random",
+}
+
+RENDER_STAGES = ["config", "metrics", "colors", "draw", "encode", "send"]
+
+
+class FakeDevice:
+    """Stands in for hid.Device, counting the reports written to it."""
+
+    def __init__(self):
+        self.reports = 0
+        self.bytes = 0
+
+    def write(self, report):
+        self.reports += 1
+        self.bytes += len(report)
+        return len(report)
+
+
+class SyntheticMetrics:
+    """Stands in for Metrics with deterministic, changing values and no sensor reads."""
+
+    def __init__(self):
+        self.update_interval = 0.5
+        self.intervals = {}
+        self.calls = 0
+
+    def configure_smoothing(self, smoothing):
+        pass
+
+    def get_metrics(self, temp_unit):
+        self.calls += 1
+        metrics = {
+            "cpu_temp": 30 + (self.calls * 7) % 60,
+            "gpu_temp": 30 + (self.calls * 5) % 60,
+            "cpu_usage": (self.calls * 3) % 101,
+            "gpu_usage": (self.calls * 11) % 101,
+        }
+        for device in ["cpu", "gpu"]:
+            if temp_unit[device] == "fahrenheit":
+                metrics[f"{device}_temp"] = int(metrics[f"{device}_temp"] * 9 / 5 + 32)
+        return metrics
+
+
+class StageClock:
+    """
+    Accumulates time spent in wrapped functions per stage. Time spent in a nested
+    wrapped call is only counted for the inner stage.
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self._stack = []
+
+    def wrap(self, stage, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            self._stack.append(0.0)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                nested = self._stack.pop()
+                self.totals[stage] += elapsed - nested
+                if self._stack:
+                    self._stack[-1] += elapsed
+        return timed
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def bench_render_mode(controller_class, config_path, frames):
+    controller = controller_class(config_path=config_path, metrics=SyntheticMetrics(), device=FakeDevice())
+    clock = StageClock()
+    controller.update = clock.wrap("config", controller.update)
+    controller.metrics.get_metrics = clock.wrap("metrics", controller.metrics.get_metrics)
+    controller.get_config_colors = clock.wrap("colors", controller.get_config_colors)
+    controller.render_mode = clock.wrap("draw", controller.render_mode)
+    controller.frame_encoder.encode = clock.wrap("encode", controller.frame_encoder.encode)
+    controller.send_packets = clock.wrap("send", controller.send_packets)
+
+    start = time.perf_counter()
+    for frame in range(frames):
+        controller.phase = frame * controller.update_interval
+        controller.update()
+        controller.render_frame()
+    total = time.perf_counter() - start
+    return {
+        "fps": frames / total,
+        "frame_us": total / frames * 1e6,
+        "stages_us": {stage: clock.totals[stage] / frames * 1e6 for stage in RENDER_STAGES},
+        "frames_sent": controller.frames_sent,
+    }
+
+
+def bench_render(frames, json_path=None, compare_path=None):
+    from controller import Controller
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = os.path.join(directory, "config.json")
+        for layout_mode, modes in (("big", display_modes), ("small", display_modes_small)):
+            for mode in modes:
+                for colors_name, spec in RENDER_COLOR_CONFIGS.items():
+                    config = json.loads(json.dumps(default_config))
+                    config.update(display_mode=mode, layout_mode=layout_mode)
+                    for key in ["metrics", "time"]:
+                        config[key] = {"colors": [spec] * NUMBER_OF_LEDS}
+                    with open(config_path, 'w') as f:
+                        json.dump(config, f)
+                    result = {"layout": layout_mode, "mode": mode, "colors": colors_name}
+                    result.update(bench_render_mode(Controller, config_path, frames))
+                    results.append(result)
+
+    baseline = {}
+    if compare_path:
+        with open(compare_path, 'r') as f:
+            baseline = {(r["layout"], r["mode"], r["colors"]): r for r in json.load(f)["results"]}
+
+    print(f"{'layout':6} {'mode':28} {'colors':9} {'fps':>9} " + " ".join(f"{stage:>7}" for stage in RENDER_STAGES)
+          + ("   vs base" if baseline else ""))
+    for r in results:
+        line = f"{r['layout']:6} {r['mode']:28} {r['colors']:9} {r['fps']:9.0f} " + \
+            " ".join(f"{r['stages_us'][stage]:7.1f}" for stage in RENDER_STAGES)
+        base = baseline.get((r["layout"], r["mode"], r["colors"]))
+        if base:
+            line += f"   {r['fps'] / base['fps']:6.2f}x"
+        print(line)
+    print("(stage columns in us/frame)")
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump({
+                "benchmark": "render",
+                "commit": _git_commit(),
+                "python": sys.version.split()[0],
+                "numpy": np.__version__,
+                "frames": frames,
+                "results": results,
+            }, f, indent=2)
+
+
+def bench_output(backend, path, frames, vendor_id=0x0416, product_id=0x8001):
+    with tempfile.TemporaryDirectory() as directory:
+        if backend == "loopback" and path is None:
+            path = os.path.join(directory, "recording.bin")
+        output = open_output(backend, vendor_id, product_id, path)
+        encoder = FrameEncoder()
+        leds = np.ones(NUMBER_OF_LEDS)
+        start = time.perf_counter()
+        for frame in range(frames):
+            colors = np.full((NUMBER_OF_LEDS, 3), frame % 256, dtype=np.uint8)
+            for report in encoder.encode(colors, leds):
+                output.write(report)
+        total = time.perf_counter() - start
+        output.close()
+
+        latency = output.write_latency
+        print(f"[output] {backend}, {frames} frames, {output.reports_written} reports, {output.bytes_written} bytes")
+        print(f"  frames/sec         : {frames / total:9.0f}")
+        print(f"  write latency      : mean {latency.mean * 1e6:.1f} us, stdev {latency.stdev * 1e6:.1f} us, "
+              f"max {latency.max * 1e6:.1f} us")
+        print(f"  dropped reports    : {output.dropped_reports}")
+        if backend == "loopback":
+            recorded = list(read_recording(path))
+            first_frame = [bytes(report) for report in encoder.encode(np.zeros((NUMBER_OF_LEDS, 3), dtype=np.uint8), leds)]
+            print(f"  recorded reports   : {len(recorded)}, "
+                  f"first frame matches: {[report for _, report in recorded[:len(first_frame)]] == first_frame}")
+
+
+# Run in a fresh interpreter by bench_startup: start a controller and send one frame
+STARTUP_SCRIPT = """
+import json, sys, time
+import controller
+c = controller.Controller(config_path=sys.argv[1])
+c.phase = time.monotonic()
+c.render_frame()
+print(json.dumps({"time_to_first_frame": c.time_to_first_frame, "backends": c.metrics.backends}))
+"""
+
+
+def bench_startup(config_path, runs):
+    """Time to first frame of fresh controller processes, without and then with the probe and layout caches."""
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    with tempfile.TemporaryDirectory() as directory:
+        config.update(output_backend="loopback", output_path=os.path.join(directory, "recording.bin"), control_socket=False)
+        startup_config = os.path.join(directory, "config.json")
+        with open(startup_config, 'w') as f:
+            json.dump(config, f)
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(directory, "cache"), DIGITAL_LCD_CONFIG=startup_config)
+        print(f"[startup] {runs} runs, the first one without caches")
+        for run in range(runs):
+            output = subprocess.check_output([sys.executable, "-c", STARTUP_SCRIPT, startup_config], env=env, text=True,
+                                             cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL)
+            result = json.loads(output.strip().splitlines()[-1])
+            label = "cold" if run == 0 else "warm"
+            print(f"  {label} {result['time_to_first_frame'] * 1e3:8.1f} ms   backends: {result['backends']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Controller micro benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+    colors_parser = subparsers.add_parser("colors", help="color spec evaluation")
+    colors_parser.add_argument("config", nargs="?", default=DEFAULT_CONFIG)
+    colors_parser.add_argument("--iterations", type=int, default=2000)
+    encode_parser = subparsers.add_parser("encode", help="HID frame encoding")
+    encode_parser.add_argument("--iterations", type=int, default=20000)
+    render_parser = subparsers.add_parser("render", help="full frames for every display mode with a fake device")
+    render_parser.add_argument("--frames", type=int, default=200)
+    render_parser.add_argument("--json", help="write machine-readable results to this file")
+    render_parser.add_argument("--compare", help="results file of a previous run to compare frames/sec with")
+    output_parser = subparsers.add_parser("output", help="report write throughput and latency of an output backend")
+    output_parser.add_argument("--backend", choices=OUTPUT_BACKENDS, default="loopback")
+    output_parser.add_argument("--path", help="hidraw device or loopback recording file")
+    output_parser.add_argument("--frames", type=int, default=2000)
+    startup_parser = subparsers.add_parser("startup", help="time to first frame of a fresh controller process")
+    startup_parser.add_argument("config", nargs="?", default=DEFAULT_CONFIG)
+    startup_parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.benchmark == "colors":
+        bench_colors(args.config, args.iterations)
+    elif args.benchmark == "encode":
+        bench_encode(args.iterations)
+    elif args.benchmark == "render":
+        bench_render(args.frames, args.json, args.compare)
+    elif args.benchmark == "output":
+        bench_output(args.backend, args.path, args.frames)
+    elif args.benchmark == "startup":
+        bench_startup(args.config, args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+import datetime
+import threading
+import numpy as np
+from config import NUMBER_OF_LEDS
+from utils import hex_to_rgb, interpolate_color
+
+DEFAULT_COLOR = "ff0000"
+
+# Time dependent gradients: "start-end-seconds" etc.
+TIME_UNITS = {
+    "seconds": (lambda t: t.second, 59),
+    "minutes": (lambda t: t.minute, 59),
+    "hours": (lambda t: t.hour, 23),
+}
+TIME_UNIT_SECONDS = {"seconds": 1.0, "minutes": 60.0, "hours": 3600.0}
+
+
+class ColorProgram:
+    """
+    A colors array from the config compiled into grouped NumPy operations.
+
+    Every LED spec is parsed once and sorted into a group:
+      - static: plain hex colors, written into the base frame at compile time
+      - random: new random color on every frame
+      - wave: cycling gradients, with a per LED phase offset for wave_ltr/wave_rtl
+        and none for plain "color1-color2-..." gradients
+      - metric: multi-stop "metric;color:value;..." and "start-end-metric" gradients
+      - time: "start-end-seconds|minutes|hours" gradients
+    LEDs sharing the same spec are evaluated together, so a frame costs a handful
+    of vectorized expressions instead of one string parse per LED.
+    """
+
+    def __init__(self, colors, metrics_min_value=None, metrics_max_value=None):
+        self.metrics_min_value = metrics_min_value or {}
+        self.metrics_max_value = metrics_max_value or {}
+        self.base = np.zeros((NUMBER_OF_LEDS, 3), dtype=np.uint8)
+        self.static_mask = np.zeros(NUMBER_OF_LEDS, dtype=bool)
+        self.random_indexes = np.array([], dtype=int)
+        self.wave_groups = []    # (indexes, phase shift as a fraction of the cycle, stops (k, 3))
+        self.metric_groups = []  # (indexes, metric, stop values (k,), stop colors (k, 3))
+        self.time_groups = []    # (indexes, time unit, start color, end color)
+        self._warned = set()
+
+        if len(colors) != NUMBER_OF_LEDS:
+            print("Warning: config colors length mismatch, using default colors.")
+            colors = [DEFAULT_COLOR] * NUMBER_OF_LEDS
+        self._compile(colors)
+
+    def _compile(self, colors):
+        random_indexes = []
+        waves = {}
+        metric_stops = {}
+        times = {}
+        for i, color in enumerate(colors):
+            try:
+                if color.lower() == "random":
+                    random_indexes.append(i)
+                elif color.startswith("wave_"):
+                    wave_type, gradient = color.split(";", 1)
+                    colors_list = gradient.split('-')
+                    if len(colors_list) < 2:
+                        self._set_static(i, colors_list[0])
+                        continue
+                    if wave_type == "wave_ltr":
+                        shift = i / NUMBER_OF_LEDS
+                    else:  # wave_rtl
+                        shift = (NUMBER_OF_LEDS - i) / NUMBER_OF_LEDS
+                    waves.setdefault(tuple(colors_list), []).append((i, shift))
+                elif ";" in color:  # Multi-stop gradient: metric;color:value;...
+                    parts = color.split(';')
+                    stops = []
+                    for stop in parts[1:]:
+                        stop_color, value = stop.split(':')
+                        stops.append((int(value), tuple(hex_to_rgb(stop_color).tolist())))
+                    stops.sort(key=lambda x: x[0])
+                    metric_stops.setdefault((parts[0], tuple(stops)), []).append(i)
+                elif "-" in color:
+                    split_color = color.split("-")
+                    if len(split_color) == 3:
+                        start_color, end_color, metric = split_color
+                        start_color, end_color = tuple(hex_to_rgb(start_color).tolist()), tuple(hex_to_rgb(end_color).tolist())
+                        if metric in TIME_UNITS:
+                            times.setdefault((metric, start_color, end_color), []).append(i)
+                        elif metric not in self.metrics_min_value or metric not in self.metrics_max_value:
+                            print(f"Warning: {metric} not found in metrics, using start color.")
+                            self._set_static(i, start_color)
+                        elif self.metrics_min_value[metric] == self.metrics_max_value[metric]:
+                            print(f"Warning: {metric} min and max values are the same, using start color.")
+                            self._set_static(i, start_color)
+                        else:
+                            # Linear gradient between the configured bounds, as a two stop gradient
+                            stops = sorted([(self.metrics_min_value[metric], start_color),
+                                            (self.metrics_max_value[metric], end_color)], key=lambda x: x[0])
+                            metric_stops.setdefault((metric, tuple(stops)), []).append(i)
+                    elif len(split_color) >= 2:
+                        waves.setdefault(tuple(split_color), []).append((i, 0.0))
+                    else:
+                        self._set_static(i, split_color[0])
+                else:
+                    self._set_static(i, color)
+            except ValueError as e:
+                print(f"Warning: invalid color spec {color!r} for LED {i} ({e}), using default color.")
+                self._set_static(i, DEFAULT_COLOR)
+
+        self.random_indexes = np.array(random_indexes, dtype=int)
+        for colors_list, leds in waves.items():
+            colors_list = list(colors_list)
+            # Add first color to the end to make a loop
+            if colors_list[0] != colors_list[-1]:
+                colors_list.append(colors_list[0])
+            stops = np.array([hex_to_rgb(c) for c in colors_list], dtype=float)
+            indexes = np.array([led for led, _ in leds], dtype=int)
+            shifts = np.array([shift for _, shift in leds], dtype=float)
+            self.wave_groups.append((indexes, shifts, stops))
+        for (metric, stops), leds in metric_stops.items():
+            values = np.array([value for value, _ in stops], dtype=float)
+            stop_colors = np.array([c for _, c in stops], dtype=float)
+            self.metric_groups.append((np.array(leds, dtype=int), metric, values, stop_colors))
+        for (unit, start_color, end_color), leds in times.items():
+            self.time_groups.append((np.array(leds, dtype=int), unit,
+                                     np.array(start_color, dtype=float), np.array(end_color, dtype=float)))
+
+    def _set_static(self, index, color):
+        if isinstance(color, str):
+            color = hex_to_rgb(color)
+        self.base[index] = color
+        self.static_mask[index] = True
+
+    def refresh_interval(self, frame_interval, metrics_interval):
+        """
+        Longest interval between frames that still shows every change of these colors:
+        `frame_interval` for random colors and waves, the smallest time unit of the time
+        gradients, `metrics_interval` for metric gradients, None if they're all static.
+        """
+        if len(self.random_indexes) or self.wave_groups:
+            return frame_interval
+        intervals = [TIME_UNIT_SECONDS[unit] for _, unit, _, _ in self.time_groups]
+        if self.metric_groups:
+            intervals.append(metrics_interval)
+        return min(intervals, default=None)
+
+    def evaluate(self, metrics, phase, cycle_duration, now=None):
+        """
+        Computes the (NUMBER_OF_LEDS, 3) uint8 RGB frame.
+        Args:
+            metrics (dict): current metric values, used by metric gradients.
+            phase (float): position in the animation, in the same unit as cycle_duration.
+            cycle_duration (float): length of one wave / gradient cycle.
+            now (datetime): time used by time gradients, defaults to the current time.
+        """
+        frame = self.base.copy()
+
+        if len(self.random_indexes):
+            frame[self.random_indexes] = np.random.randint(0, 256, (len(self.random_indexes), 3))
+
+        for indexes, shifts, stops in self.wave_groups:
+            num_segments = len(stops) - 1
+            time_in_cycle = (phase + shifts * cycle_duration) % cycle_duration
+            segment_duration = cycle_duration / num_segments
+            segment_index = np.minimum((time_in_cycle / segment_duration).astype(int), num_segments - 1)
+            if segment_duration > 0:
+                factor = (time_in_cycle - segment_index * segment_duration) / segment_duration
+            else:
+                factor = np.zeros(len(indexes))
+            frame[indexes] = interpolate_color(stops[segment_index], stops[segment_index + 1], factor[:, None])
+
+        for indexes, metric, values, stop_colors in self.metric_groups:
+            if metric not in metrics:
+                if metric not in self._warned:
+                    print(f"Warning: {metric} not found in metrics, using first color.")
+                    self._warned.add(metric)
+                frame[indexes] = stop_colors[0]
+                continue
+            metric_value = metrics[metric]
+            if metric_value <= values[0]:
+                frame[indexes] = stop_colors[0]
+            elif metric_value >= values[-1]:
+                frame[indexes] = stop_colors[-1]
+            else:
+                j = np.searchsorted(values, metric_value, side='right') - 1
+                factor = (metric_value - values[j]) / (values[j+1] - values[j])
+                frame[indexes] = interpolate_color(stop_colors[j], stop_colors[j+1], factor)
+
+        if self.time_groups:
+            if now is None:
+                now = datetime.datetime.now()
+            for indexes, unit, start_color, end_color in self.time_groups:
+                get_value, max_value = TIME_UNITS[unit]
+                frame[indexes] = interpolate_color(start_color, end_color, get_value(now) / max_value)
+
+        return frame
+
+
+class ProgramCache:
+    """
+    Compiled ColorPrograms shared between controllers, keyed by the colors and
+    metric bounds they were compiled from, so devices using the same colors
+    compile them once. Keeps the `max_size` most recently added programs.
+    """
+
+    def __init__(self, max_size=32):
+        self.max_size = max_size
+        self._programs = {}
+        self._lock = threading.Lock()
+
+    def get(self, colors, metrics_min_value=None, metrics_max_value=None):
+        try:
+            key = (tuple(colors), tuple(sorted((metrics_min_value or {}).items())),
+                   tuple(sorted((metrics_max_value or {}).items())))
+            hash(key)
+        except TypeError:
+            # Unhashable entries in a broken config, let ColorProgram report them
+            return ColorProgram(colors, metrics_min_value, metrics_max_value)
+        with self._lock:
+            program = self._programs.get(key)
+            if program is None:
+                program = ColorProgram(colors, metrics_min_value, metrics_max_value)
+                self._programs[key] = program
+                while len(self._programs) > self.max_size:
+                    del self._programs[next(iter(self._programs))]
+            return program
@@ -54,6 +54,8 @@ NUMBER_OF_LEDS = 84
 default_config = {
     "display_mode": "alternate_time_with_seconds",
     "gpu_vendor": "nvidia",
+    "gpus": [0],
+    "gpu_aggregation": "hottest",
     "metrics": {
         "colors": [
             "random",
@@ -232,6 +234,11 @@ default_config = {
     },
     "update_interval": 0.1,
     "metrics_update_interval": 1.0,
+    "metrics_smoothing": {
+        "cpu_usage": {"method": "ema", "alpha": 0.5, "hysteresis": 1},
+        "gpu_usage": {"method": "ema", "alpha": 0.5, "hysteresis": 1}
+    },
+    "keepalive_interval": 1.0,
     "cycle_duration": 5.0,
     "gpu_min_temp": 30.0,
     "gpu_max_temp": 90.0,
@@ -0,0 +1,139 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import struct
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class ConfigWatcher:
+    """
+    Watches a JSON config file and reloads it only when it changes on disk.
+
+    The parent directory is watched with inotify so that editors which replace
+    the file (write to a temp file and rename) are noticed as well. When inotify
+    is not available, every poll compares the file's mtime, size and inode instead.
+    Each successful reload increments `generation`, so callers can cheaply tell
+    whether anything they derived from the config needs to be rebuilt.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.config = None
+        self.generation = 0
+        self._signature = None
+        self._failed_signature = None
+        self._pending = True
+        self._inotify_fd = self._init_inotify()
+
+    def _init_inotify(self):
+        try:
+            libc_name = ctypes.util.find_library('c')
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                return None
+            watch = libc.inotify_add_watch(fd, os.path.dirname(self.path).encode(), WATCH_MASK)
+            if watch < 0:
+                os.close(fd)
+                return None
+            return fd
+        except Exception:
+            # Not on Linux (or no libc inotify): fall back to stat polling
+            return None
+
+    def _drain_events(self):
+        """Read all queued inotify events and report whether one concerns the config file."""
+        name = os.path.basename(self.path).encode()
+        changed = False
+        while True:
+            try:
+                data = os.read(self._inotify_fd, 4096)
+            except BlockingIOError:
+                return changed
+            except OSError:
+                return True
+            if not data:
+                return changed
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                _, _, _, length = EVENT_HEADER.unpack_from(data, offset)
+                event_name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+                if event_name == name:
+                    changed = True
+                offset += EVENT_HEADER.size + length
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size, st.st_ino)
+        except OSError:
+            return None
+
+    def poll(self):
+        """
+        Reload the config if the file changed since the last poll.
+        Returns True when a new config was loaded (and `generation` was bumped).
+        """
+        if self._inotify_fd is not None:
+            if self._drain_events():
+                self._pending = True
+            if not self._pending:
+                return False
+            self._pending = False
+
+        signature = self._stat_signature()
+        if signature is None:
+            if self._failed_signature != 'missing':
+                print(f"Error loading config: {self.path} does not exist")
+                self._failed_signature = 'missing'
+            return False
+        if signature == self._signature or signature == self._failed_signature:
+            return False
+
+        try:
+            with open(self.path, 'r') as f:
+                config = json.load(f)
+        except Exception as e:
+            # Possibly caught mid-write; retried once the file changes again
+            print(f"Error loading config: {e}")
+            self._failed_signature = signature
+            return False
+
+        self._signature = signature
+        self._failed_signature = None
+        self.config = config
+        self.generation += 1
+        return True
+
+    def close(self):
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+
+
+def write_config(path, config):
+    """
+    Writes the config atomically: to a temporary file next to it, then renamed
+    over it, so readers (and the watcher) never see a partially written file.
+    """
+    path = os.path.abspath(path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(config, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,315 @@
+import argparse
+import copy
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from config import NUMBER_OF_LEDS, default_config, display_modes, display_modes_small
+from config_watcher import write_config
+
+APPLY_TIMEOUT = 2.0  # Seconds to wait for the render loops to pick a change up
+
+
+def default_socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'digital_lcd.sock')
+    return f"/tmp/digital_lcd-{os.getuid()}.sock"
+
+
+def _all_colors(metrics_color, time_color=None):
+    return {"metrics": {"colors": [metrics_color] * NUMBER_OF_LEDS},
+            "time": {"colors": [time_color or metrics_color] * NUMBER_OF_LEDS}}
+
+
+# Built-in presets, the color themes of led_control.sh. A "presets" object in the
+# config adds to (or replaces) them; a preset is merged into the config.
+PRESETS = {
+    "rainbow": _all_colors("ff0000-ffff00-00ff00-00ffff-0000ff-ff00ff-ff0000"),
+    "stealth": _all_colors("000000"),
+    "cool_blue": _all_colors("0080ff", "00d9ff"),
+    "fire": _all_colors("ff0000-ff8800"),
+    "matrix": _all_colors("00ff00"),
+    "wave_ltr": _all_colors("wave_ltr;ff0000-ffff00-00ff00-00ffff-0000ff-ff00ff-ff0000"),
+    "wave_rtl": _all_colors("wave_rtl;ff0000-ffff00-00ff00-00ffff-0000ff-ff00ff-ff0000"),
+}
+
+
+def merge_config(config, overlay):
+    """Returns a copy of config with overlay merged in; nested objects are merged, anything else replaced."""
+    merged = copy.deepcopy(config)
+    for key, value in overlay.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+class ConfigChange:
+    """
+    A config edit queued for a controller. apply() runs in the render thread,
+    which replaces the controller's config with the edited copy before the next
+    frame is drawn; the control thread waits for it with wait().
+    """
+
+    def __init__(self, edit):
+        self.edit = edit  # function(config copy) -> None, edits in place
+        self.config = None
+        self.error = None
+        self._applied = threading.Event()
+
+    def apply(self, controller):
+        try:
+            config = copy.deepcopy(controller.config) if controller.config else copy.deepcopy(default_config)
+            self.edit(config)
+            controller.apply_config(config)
+            self.config = config
+        except Exception as e:
+            self.error = str(e)
+        self._applied.set()
+
+    def wait(self, timeout=APPLY_TIMEOUT):
+        return self._applied.wait(timeout)
+
+
+class ControlHandler(socketserver.StreamRequestHandler):
+    """One JSON request per line, answered by one JSON response line."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+                response = self.server.dispatch(request)
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(response).encode() + b'\n')
+            self.wfile.flush()
+
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Local control socket of the controllers. Requests are JSON objects with a
+    "cmd" and its arguments:
+        {"cmd": "status"}
+        {"cmd": "frame", "device": 0}
+        {"cmd": "set_mode", "mode": "metrics"}
+        {"cmd": "patch_colors", "key": "metrics", "start": 0, "end": 41, "color": "ff0000"}
+        {"cmd": "preset", "name": "fire"}
+    Changes go to every controller unless "device" (index or device path) selects
+    one, apply from the next frame on, and are written back to the config file
+    with "persist": true. Responses are {"ok": true, ...} or {"ok": false, "error": ...}.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, controllers, path=None):
+        self.controllers = controllers
+        self.path = path or default_socket_path()
+        self._remove_stale_socket()
+        super().__init__(self.path, ControlHandler)
+        self.commands = {
+            "status": self.status,
+            "frame": self.frame,
+            "set_mode": self.set_mode,
+            "patch_colors": self.patch_colors,
+            "preset": self.preset,
+        }
+
+    def server_bind(self):
+        # Only the owner may connect; set through the umask so the socket is never open to others, even briefly
+        previous = os.umask(0o177)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(previous)
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path)  # Left over by a process that didn't shut down
+        else:
+            raise OSError(f"control socket {self.path} is already in use")
+        finally:
+            probe.close()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="control-socket", daemon=True).start()
+        return self
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def dispatch(self, request):
+        command = self.commands.get(request.get("cmd"))
+        if command is None:
+            raise ValueError(f"unknown command {request.get('cmd')!r}, expected one of {sorted(self.commands)}")
+        response = command(request)
+        response["ok"] = True
+        return response
+
+    def targets(self, request):
+        device = request.get("device")
+        if device is None:
+            return self.controllers
+        if isinstance(device, int):
+            if not 0 <= device < len(self.controllers):
+                raise ValueError(f"no device {device}")
+            return [self.controllers[device]]
+        matching = [controller for controller in self.controllers if controller.device_path == device]
+        if not matching:
+            raise ValueError(f"no device {device!r}")
+        return matching
+
+    def submit(self, request, edit):
+        controllers = self.targets(request)
+        changes = [ConfigChange(edit) for _ in controllers]
+        for controller, change in zip(controllers, changes):
+            controller.pending_changes.put(change)
+        applied = all([change.wait() for change in changes])
+        errors = [change.error for change in changes if change.error]
+        if errors:
+            raise ValueError("; ".join(errors))
+        if request.get("persist"):
+            if not applied:
+                raise ValueError("change queued but not applied yet, not persisted")
+            for controller, change in zip(controllers, changes):
+                write_config(controller.config_path, change.config)
+        # Not applied within APPLY_TIMEOUT: still queued, e.g. while waiting for the device
+        return {"applied": applied}
+
+    def status(self, request):
+        devices = []
+        for index, controller in enumerate(self.controllers):
+            scheduler = getattr(controller, 'scheduler', None)
+            devices.append({
+                "device": index,
+                "path": controller.device_path,
+                "config_path": controller.config_path,
+                "connected": controller.dev is not None,
+                "display_mode": controller.display_mode,
+                "layout_mode": controller.layout.name,
+                "frame_interval": controller.frame_interval,
+                "config_generation": controller.config_generation,
+                "frames_rendered": controller.frames_rendered,
+                "frames_sent": controller.frames_sent,
+                "time_to_first_frame": controller.time_to_first_frame,
+                "pending_changes": controller.pending_changes.qsize(),
+                "scheduler": scheduler.stats() if scheduler is not None else None,
+            })
+        snapshot = getattr(self.controllers[0].metrics, 'snapshot', None)
+        return {"devices": devices, "metrics": dict(snapshot.values) if snapshot is not None else None}
+
+    def frame(self, request):
+        controller = self.targets({"device": request.get("device", 0)})[0]
+        rgb = bytes(controller.frame_encoder.rgb).hex()
+        return {"colors": [rgb[i:i + 6] for i in range(0, len(rgb), 6)]}
+
+    def set_mode(self, request):
+        mode = request.get("mode")
+        if mode not in display_modes + display_modes_small:
+            raise ValueError(f"unknown display mode {mode!r}")
+        layout_mode = request.get("layout_mode")
+        if layout_mode not in (None, "big", "small"):
+            raise ValueError(f"unknown layout mode {layout_mode!r}")
+        for controller in self.targets(request):
+            layout = layout_mode or controller.layout.name
+            if mode not in (display_modes_small if layout == "small" else display_modes):
+                raise ValueError(f"display mode {mode!r} doesn't fit the {layout} layout of device "
+                                 f"{controller.device_path or self.controllers.index(controller)}")
+
+        def edit(config):
+            config["display_mode"] = mode
+            if layout_mode is not None:
+                config["layout_mode"] = layout_mode
+        return self.submit(request, edit)
+
+    def patch_colors(self, request):
+        key = request.get("key", "metrics")
+        if key not in ("metrics", "time"):
+            raise ValueError(f"key must be metrics or time, not {key!r}")
+        start = request.get("start", 0)
+        end = request.get("end", start)  # Inclusive, like led_control.sh ranges
+        if not (isinstance(start, int) and isinstance(end, int) and 0 <= start <= end < NUMBER_OF_LEDS):
+            raise ValueError(f"start and end must be LED indexes with 0 <= start <= end < {NUMBER_OF_LEDS}")
+        if "colors" in request:
+            colors = request["colors"]
+            if not isinstance(colors, list) or len(colors) != end - start + 1:
+                raise ValueError(f"colors must be a list of {end - start + 1} color specs")
+        else:
+            colors = [request.get("color")] * (end - start + 1)
+        if not all(isinstance(color, str) for color in colors):
+            raise ValueError("color specs must be strings")
+
+        def edit(config):
+            current = config.setdefault(key, {}).get("colors")
+            if not isinstance(current, list) or len(current) != NUMBER_OF_LEDS:
+                current = ["ffe000"] * NUMBER_OF_LEDS
+            current[start:end + 1] = colors
+            config[key]["colors"] = current
+        return self.submit(request, edit)
+
+    def preset(self, request):
+        name = request.get("name")
+        presets = dict(PRESETS)
+        presets.update((self.controllers[0].config or {}).get("presets", {}))
+        if name not in presets:
+            raise ValueError(f"unknown preset {name!r}, expected one of {sorted(presets)}")
+        overlay = presets[name]
+
+        def edit(config):
+            merged = merge_config(config, overlay)
+            config.clear()
+            config.update(merged)
+        return self.submit(request, edit)
+
+
+def send_request(request, path=None, timeout=5.0):
+    """Sends one request to a running controller and returns its response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path or default_socket_path())
+        client.sendall(json.dumps(request).encode() + b'\n')
+        with client.makefile('rb') as f:
+            return json.loads(f.readline())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a command to the running controller")
+    parser.add_argument("--socket", help=f"control socket, defaults to {default_socket_path()}")
+    parser.add_argument("cmd", help="status, frame, set_mode, patch_colors or preset")
+    parser.add_argument("args", nargs="*", help="arguments as key=string or key:=JSON, e.g. color=ff0000 end:=41")
+    args = parser.parse_args()
+    request = {"cmd": args.cmd}
+    for arg in args.args:
+        key, _, value = arg.partition('=')
+        if key.endswith(':'):
+            request[key[:-1]] = json.loads(value)
+        else:
+            request[key] = value
+    try:
+        response = send_request(request, args.socket)
+    except OSError as e:
+        print(f"Could not reach the controller: {e}")
+        sys.exit(1)
+    print(json.dumps(response, indent=2))
+    sys.exit(0 if response.get("ok") else 1)
+
+
+if __name__ == '__main__':
+    main()
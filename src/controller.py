@@ -1,132 +1,149 @@
+import time
+STARTED_AT = time.monotonic()  # Before the imports below, for the time to first frame
 import numpy as np
 from metrics import Metrics
-from config import leds_indexes, NUMBER_OF_LEDS, leds_indexes_small, display_modes, display_modes_small
-from utils import interpolate_color, get_random_color
-import hid
-import time
-import datetime 
+from config import NUMBER_OF_LEDS, display_modes, display_modes_small
+from config_watcher import ConfigWatcher
+from color_program import ProgramCache
+from render_engine import RenderEngine
+from utils import hex_to_rgb
+from hid_frame import FrameEncoder
+from scheduler import FrameScheduler, RunningStats
+from hid_output import open_output, enumerate_devices
+from layout import LAYOUT_SOURCES, load_layout
+from profiling import ProfileCapture, StageProfiler, profiling_enabled
+import datetime
 import json
 import os
 import sys
-
-
-digit_to_segments = {
-    0: ['a', 'b', 'c', 'd', 'e', 'f'],
-    1: ['b', 'c'],
-    2: ['a', 'b', 'g', 'e', 'd'],
-    3: ['a', 'b', 'g', 'c', 'd'],
-    4: ['f', 'g', 'b', 'c'],
-    5: ['a', 'f', 'g', 'c', 'd'],
-    6: ['a', 'f', 'g', 'e', 'c', 'd'],
-    7: ['a', 'b', 'c'],
-    8: ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
-    9: ['a', 'b', 'g', 'f', 'c', 'd'],
+import threading
+import queue
+import signal
+import socket
+
+# Color keys each display mode shows, "metrics" only for the others
+MODE_COLOR_KEYS = {
+    "time": ("time",),
+    "alternate_time": ("metrics", "time"),
+    "time_cpu": ("metrics", "time"),
+    "time_gpu": ("metrics", "time"),
+    "alternate_time_with_seconds": ("metrics", "time"),
 }
-
-digit_mask = np.array(
-    [
-        [1, 1, 1, 1, 1, 1, 1],  # 0
-        [1, 1, 1, 1, 1, 1, 1],  # 1
-        [1, 1, 1, 1, 1, 1, 1],  # 2
-        [1, 1, 1, 1, 1, 1, 1],  # 3
-        [1, 1, 1, 1, 1, 1, 1],  # 4
-        [1, 1, 1, 1, 1, 1, 1],  # 5
-        [1, 1, 1, 1, 1, 1, 1],  # 6
-        [1, 1, 1, 1, 1, 1, 1],  # 7
-        [1, 1, 1, 1, 1, 1, 1],  # 8
-        [1, 1, 1, 1, 1, 1, 1],  # 9
-        [1, 1, 1, 1, 1, 1, 1],  # nothing
-    ]
-)
-
-letter_mask = {
-    'H': [1, 0, 1, 1, 1, 0, 1],
+# Seconds between changes of the clock digits of the time modes
+CLOCK_INTERVALS = {
+    "time": 1.0,
+    "alternate_time_with_seconds": 1.0,
+    "alternate_time": 60.0,
+    "time_cpu": 60.0,
+    "time_gpu": 60.0,
 }
+# Modes switching between views, and their switch period in cycle durations
+MODE_SWITCH_PERIODS = {
+    "alternate_time": 1.0,
+    "alternate_time_with_seconds": 1.0,
+    "alternate_metrics": 0.5,
+}
+NO_METRICS_MODES = {"time", "debug_ui"}
+IDLE_FRAME_INTERVAL = 1.0  # Frame interval when nothing on the display changes, config changes still apply this often
+# Largest value each numeric field of the display can show
+FIELD_LIMITS = {"cpu_temp": 999, "gpu_temp": 999, "cpu_usage": 199, "gpu_usage": 199}
 
 
-
-def _number_to_array(number):
-    if number>=10:
-        return _number_to_array(int(number/10))+[number%10]
-    else:
-        return [number]
-
-def get_number_array(temp, array_length=3, fill_value=-1):
-    if temp<0:
-        return [fill_value]*array_length
-    else:
-        narray = _number_to_array(temp)
-        if (len(narray)!=array_length):
-            if(len(narray)<array_length):
-                narray = np.concatenate([[fill_value]*(array_length-len(narray)),narray])
-            else:
-                narray = narray[1:]
-        return narray
-
 class Controller:
-    def __init__(self, config_path=None):
+    def __init__(self, config_path=None, metrics=None, device=None, device_path=None,
+                 programs=None, layouts=None, configure_metrics=True):
+        """
+        Args:
+            config_path (str): config file, defaults to $DIGITAL_LCD_CONFIG or config.json.
+            metrics: metrics source to use instead of sampling this host (e.g. for benchmarks).
+            device: object with a write(report) method to use instead of the configured output.
+            device_path (str): output device path, overrides output_path from the config.
+            programs (ProgramCache): compiled colors shared with other controllers.
+            layouts (dict): compiled layouts shared with other controllers.
+            configure_metrics (bool): whether the config sets the metrics refresh intervals,
+                only one of the controllers sharing a Metrics should.
+        """
         self.temp_unit = {"cpu": "celsius", "gpu": "celsius"}
-        self.metrics = Metrics()
+        # Configurable config path
+        self.config_path = config_path if config_path is not None else default_config_path()
+        if metrics is None:
+            metrics = Metrics(config_path=self.config_path)
+            metrics.start()
+        self.metrics = metrics
+        self.configure_metrics = configure_metrics
+        self.engine = RenderEngine(programs)  # Colors of the config, shared with the GUI preview
         self.VENDOR_ID = 0x0416   
         self.PRODUCT_ID = 0x8001 
-        self.dev = self.get_device()
-        self.HEADER = 'dadbdcdd000000000000000000000000fc0000ff'
+        self.output_backend = "hidapi"  # hidapi, hidraw or loopback, see hid_output
+        self.output_path = None
+        self.device_path = device_path
+        self.device = device
+        self.dev = None  # Opened once the config is applied
+        self.frame_encoder = FrameEncoder()
+        self.keepalive_interval = 1.0  # Resend unchanged frames after this many seconds, None to never resend them
+        self.frame_interval = 0.1  # Seconds between frames, see adaptive_frame_interval
+        self.last_sent_time = None
+        self.frames_rendered = 0
+        self.frames_sent = 0
+        self.time_to_first_frame = None  # Seconds from process start to the first frame sent
+        self.write_latency = RunningStats()  # Seconds to write the reports of a frame
         self.leds = np.array([0] * NUMBER_OF_LEDS)
-        self.leds_indexes = leds_indexes
-        # Configurable config path
-        if config_path is None:
-            self.config_path = os.environ.get('DIGITAL_LCD_CONFIG', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json'))
-        else:
-            self.config_path = config_path
-        self.cpt = 0  # For alternate_time cycling
-        self.cycle_duration = 50
+        # Compiled LED geometry; the config selects the active one
+        self.layouts = layouts if layouts is not None else {name: load_layout(name) for name in LAYOUT_SOURCES}
+        self.layout = self.layouts["big"]
+        self.phase = 0  # Seconds on the monotonic clock, drives animations and alternate modes
+        self.cycle_duration = 5.0  # Seconds
         self.display_mode = None
-        self.colors = np.array(["ffe000"] * NUMBER_OF_LEDS)  # Will be set in update()
-        self.layout = self.load_layout()
+        self.colors = np.tile(hex_to_rgb("ffe000"), (NUMBER_OF_LEDS, 1))  # (NUMBER_OF_LEDS, 3) uint8, set in update()
+        self.config_watcher = ConfigWatcher(self.config_path)
+        self.config_generation = None  # Generation of the config currently applied
+        self.config_reloads = 0  # Configs applied after the first one
+        self.pending_changes = queue.Queue()  # ConfigChanges from the control socket
+        self.metric_fields = {}  # Display field -> metric shown in it instead, from "metric_fields"
+        self.profile_capture = None  # ProfileCapture polled between frames, set by main()
         self.update()
 
-    def load_config(self):
-        try:
-            with open(self.config_path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading config: {e}")
-            return None
-
-    def load_layout(self):
-        try:
-            layout_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'layout.json')
-            with open(layout_path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading layout: {e}")
-            return None
-
     def get_device(self):
+        if self.device is not None:
+            return self.device
         try:
-            return hid.Device(self.VENDOR_ID, self.PRODUCT_ID)
+            return open_output(self.output_backend, self.VENDOR_ID, self.PRODUCT_ID, self.output_path)
         except Exception as e:
             print(f"Error initializing HID device: {e}")
             return None
 
     def set_leds(self, key, value):
-        try:
-            self.leds[self.leds_indexes[key]] = value
-        except KeyError:
-            print(f"Warning: Key {key} not found in leds_indexes.")
+        self.leds[self.layout.groups[key]] = value
+
+    def draw_glyph(self, key, value):
+        self.layout.glyphs[key].draw(self.leds, value)
 
     def send_packets(self):
-        message = "".join([self.colors[i] if self.leds[i] != 0 else "000000" for i in range(NUMBER_OF_LEDS)])
-        packet0 = bytes.fromhex(self.HEADER+message[:128-len(self.HEADER)])
-        self.dev.write(packet0)
-        packets = message[88:]
-        for i in range(0,4):
-            packet = bytes.fromhex('00'+packets[i*128:(i+1)*128])
-            self.dev.write(packet)
+        reports = self.frame_encoder.encode(self.colors, self.leds)
+        self.frames_rendered += 1
+        now = time.monotonic()
+        # The keepalive goes out with the frame closest to its deadline
+        if (self.last_sent_time is not None and not self.frame_encoder.changed()
+                and (self.keepalive_interval is None
+                     or now - self.last_sent_time < self.keepalive_interval - self.frame_interval / 2)):
+            # Identical to what the device already shows
+            return
+        for report in reports:
+            if self.dev.write(report) == 0:
+                # Dropped (the hidraw queue is full): the frame stays unsent and goes out again next frame
+                self.write_latency.add(time.monotonic() - now)
+                return
+        self.write_latency.add(time.monotonic() - now)
+        self.frame_encoder.mark_sent()
+        self.last_sent_time = now
+        self.frames_sent += 1
+        if self.time_to_first_frame is None:
+            self.time_to_first_frame = time.monotonic() - STARTED_AT
+            print(f"First frame sent {self.time_to_first_frame:.3f}s after start")
 
     def set_temp(self, temperature: int, device='cpu', unit="celsius"):        
         if temperature < 1000:
-            self.set_leds(device + '_temp', digit_mask[get_number_array(temperature)].flatten())
+            self.draw_glyph(device + '_temp', temperature)
             if unit == "celsius":
                 self.set_leds(device + '_celsius', 1)
             elif unit == "fahrenheit":
@@ -136,24 +153,20 @@ class Controller:
 
     def set_usage(self, usage : int, device='cpu'):
         if usage<200:
-            self.set_leds(device+'_usage', np.concatenate(([int(usage>=100)]*2,digit_mask[get_number_array(usage, array_length=2)].flatten())))
+            self.draw_glyph(device + '_usage', usage)
             self.set_leds(device+'_percent_led', 1)
         else:
             raise Exception("The numbers displayed on the usage LCD must be less than 200")
 
-    def draw_number(self, number, num_digits, digits_mapping):
-        number_str = f"{number:0{num_digits}d}"
-        for i, digit_char in enumerate(number_str):
-            digit = int(digit_char)
-            segments_to_light = digit_to_segments[digit]
-            digit_map = digits_mapping[i]['map']
-            for segment_name in segments_to_light:
-                segment_index = digit_map[segment_name]
-                self.leds[segment_index] = 1
+    def draw_layout_number(self, field, value):
+        """Draws a numeric field of layout.json; usage fields light their leading 1 from 100 on."""
+        if field.endswith('_usage'):
+            value = value % 100 + (100 if value >= 100 else 0)
+        self.layouts["big"].segment_glyphs[field].draw(self.leds, value)
 
     def display_peerless_standard(self):
         """Merged display mode: dual_metrics + peerless_standard with color support"""
-        if not self.layout:
+        if not self.layouts["big"].segment_glyphs:
             print("Warning: layout.json not loaded. Cannot display peerless standard.")
             return
 
@@ -161,7 +174,7 @@ class Controller:
         gpu_unit = self.config.get('gpu_temperature_unit', 'celsius')
         temp_unit = {'cpu': cpu_unit, 'gpu': gpu_unit}
 
-        metrics = self.metrics.get_metrics(temp_unit=temp_unit)
+        metrics = self.read_metrics(temp_unit)
         
         # Get colors based on current metrics
         self.colors = self.get_config_colors(self.config, key="metrics", metrics=metrics)
@@ -172,41 +185,33 @@ class Controller:
         gpu_usage = metrics.get("gpu_usage", 0)
 
         # Draw CPU Temp
-        self.draw_number(cpu_temp, 3, self.layout['cpu_temp_digits'])
+        self.draw_layout_number('cpu_temp', cpu_temp)
         if cpu_unit == 'celsius':
-            self.leds[self.layout['cpu_celsius']] = 1
+            self.leds[self.layouts['big'].groups['cpu_celsius']] = 1
         else:
-            self.leds[self.layout['cpu_fahrenheit']] = 1
+            self.leds[self.layouts['big'].groups['cpu_fahrenheit']] = 1
 
         # Draw CPU Usage
-        self.draw_number(cpu_usage % 100, 2, self.layout['cpu_usage_digits'])
-        if cpu_usage >= 100:
-            self.leds[self.layout['cpu_usage_1']['top']] = 1
-            self.leds[self.layout['cpu_usage_1']['bottom']] = 1
-        self.leds[self.layout['cpu_percent']] = 1
+        self.draw_layout_number('cpu_usage', cpu_usage)
+        self.leds[self.layouts['big'].groups['cpu_percent_led']] = 1
 
         # Draw GPU Temp
-        self.draw_number(gpu_temp, 3, self.layout['gpu_temp_digits'])
+        self.draw_layout_number('gpu_temp', gpu_temp)
         if gpu_unit == 'celsius':
-            self.leds[self.layout['gpu_celsius']] = 1
+            self.leds[self.layouts['big'].groups['gpu_celsius']] = 1
         else:
-            self.leds[self.layout['gpu_fahrenheit']] = 1
+            self.leds[self.layouts['big'].groups['gpu_fahrenheit']] = 1
 
         # Draw GPU Usage
-        self.draw_number(gpu_usage % 100, 2, self.layout['gpu_usage_digits'][::-1])
-        if gpu_usage >= 100:
-            self.leds[self.layout['gpu_usage_1']['top']] = 1
-            self.leds[self.layout['gpu_usage_1']['bottom']] = 1
-        self.leds[self.layout['gpu_percent']] = 1
+        self.draw_layout_number('gpu_usage', gpu_usage)
+        self.leds[self.layouts['big'].groups['gpu_percent_led']] = 1
         
         # Set CPU and GPU LEDs
-        for led in self.layout['cpu_led']:
-            self.leds[led] = 1
-        for led in self.layout['gpu_led']:
-            self.leds[led] = 1
+        self.leds[self.layouts['big'].groups['cpu_led']] = 1
+        self.leds[self.layouts['big'].groups['gpu_led']] = 1
 
     def display_peerless_temp(self):
-        if not self.layout:
+        if not self.layouts["big"].segment_glyphs:
             print("Warning: layout.json not loaded. Cannot display peerless temp.")
             return
 
@@ -214,34 +219,32 @@ class Controller:
         gpu_unit = self.config.get('gpu_temperature_unit', 'celsius')
         temp_unit = {'cpu': cpu_unit, 'gpu': gpu_unit}
 
-        metrics = self.metrics.get_metrics(temp_unit=temp_unit)
+        metrics = self.read_metrics(temp_unit)
         self.colors = self.get_config_colors(self.config, key="metrics", metrics=metrics)
         
         cpu_temp = metrics.get("cpu_temp", 0)
         gpu_temp = metrics.get("gpu_temp", 0)
 
         # Draw CPU Temp
-        self.draw_number(cpu_temp, 3, self.layout['cpu_temp_digits'])
+        self.draw_layout_number('cpu_temp', cpu_temp)
         if cpu_unit == 'celsius':
-            self.leds[self.layout['cpu_celsius']] = 1
+            self.leds[self.layouts['big'].groups['cpu_celsius']] = 1
         else:
-            self.leds[self.layout['cpu_fahrenheit']] = 1
+            self.leds[self.layouts['big'].groups['cpu_fahrenheit']] = 1
 
         # Draw GPU Temp
-        self.draw_number(gpu_temp, 3, self.layout['gpu_temp_digits'])
+        self.draw_layout_number('gpu_temp', gpu_temp)
         if gpu_unit == 'celsius':
-            self.leds[self.layout['gpu_celsius']] = 1
+            self.leds[self.layouts['big'].groups['gpu_celsius']] = 1
         else:
-            self.leds[self.layout['gpu_fahrenheit']] = 1
+            self.leds[self.layouts['big'].groups['gpu_fahrenheit']] = 1
         
         # Set CPU and GPU LEDs
-        for led in self.layout['cpu_led']:
-            self.leds[led] = 1
-        for led in self.layout['gpu_led']:
-            self.leds[led] = 1
+        self.leds[self.layouts['big'].groups['cpu_led']] = 1
+        self.leds[self.layouts['big'].groups['gpu_led']] = 1
 
     def display_peerless_usage(self):
-        if not self.layout:
+        if not self.layouts["big"].segment_glyphs:
             print("Warning: layout.json not loaded. Cannot display peerless usage.")
             return
 
@@ -249,351 +252,391 @@ class Controller:
         gpu_unit = self.config.get('gpu_temperature_unit', 'celsius')
         temp_unit = {'cpu': cpu_unit, 'gpu': gpu_unit}
 
-        metrics = self.metrics.get_metrics(temp_unit=temp_unit)
+        metrics = self.read_metrics(temp_unit)
         self.colors = self.get_config_colors(self.config, key="metrics", metrics=metrics)
         
         cpu_usage = metrics.get("cpu_usage", 0)
         gpu_usage = metrics.get("gpu_usage", 0)
 
         # Draw CPU Usage
-        self.draw_number(cpu_usage % 100, 2, self.layout['cpu_usage_digits'])
-        if cpu_usage >= 100:
-            self.leds[self.layout['cpu_usage_1']['top']] = 1
-            self.leds[self.layout['cpu_usage_1']['bottom']] = 1
-        self.leds[self.layout['cpu_percent']] = 1
+        self.draw_layout_number('cpu_usage', cpu_usage)
+        self.leds[self.layouts['big'].groups['cpu_percent_led']] = 1
 
         # Draw GPU Usage
-        self.draw_number(gpu_usage % 100, 2, self.layout['gpu_usage_digits'])
-        if gpu_usage >= 100:
-            self.leds[self.layout['gpu_usage_1']['top']] = 1
-            self.leds[self.layout['gpu_usage_1']['bottom']] = 1
-        self.leds[self.layout['gpu_percent']] = 1
+        self.draw_layout_number('gpu_usage', gpu_usage)
+        self.leds[self.layouts['big'].groups['gpu_percent_led']] = 1
         
         # Set CPU and GPU LEDs
-        for led in self.layout['cpu_led']:
-            self.leds[led] = 1
-        for led in self.layout['gpu_led']:
-            self.leds[led] = 1
+        self.leds[self.layouts['big'].groups['cpu_led']] = 1
+        self.leds[self.layouts['big'].groups['gpu_led']] = 1
 
     def display_metrics(self, devices=["cpu","gpu"]):
         self.temp_unit = {device: self.config.get(f"{device}_temperature_unit", "celsius")for device in ["cpu","gpu"]}
-        metrics = self.metrics.get_metrics(temp_unit=self.temp_unit)
+        metrics = self.read_metrics(self.temp_unit)
         for device in devices:
             self.set_leds(device+"_led", 1)
             self.set_temp(metrics[device+"_temp"], device=device, unit=self.temp_unit[device])
             self.set_usage(metrics[device+"_usage"], device=device)
-            self.colors[self.leds_indexes[device]] = self.metrics_colors[self.leds_indexes[device]]
+            self.colors[self.layout.groups[device]] = self.metrics_colors[self.layout.groups[device]]
 
     def display_time(self, device="cpu"):
         current_time = datetime.datetime.now()
-        self.set_leds(device+'_temp', np.concatenate((digit_mask[get_number_array(current_time.hour, array_length=2, fill_value=0)].flatten(),letter_mask["H"])))
-        self.set_leds(device+'_usage', np.concatenate(([0,0],digit_mask[get_number_array(current_time.minute, array_length=2, fill_value=0)].flatten())))
-        self.colors[self.leds_indexes[device]] = self.time_colors[self.leds_indexes[device]]
+        self.draw_glyph(device + '_temp_hours', current_time.hour)
+        self.draw_glyph(device + '_usage_clock', current_time.minute)
+        self.colors[self.layout.groups[device]] = self.time_colors[self.layout.groups[device]]
     
     def display_time_with_seconds(self):
         current_time = datetime.datetime.now()
-        self.set_leds('cpu_temp', np.concatenate((digit_mask[get_number_array(current_time.hour, array_length=2, fill_value=0)].flatten(),letter_mask["H"])))
-        self.set_leds('gpu_usage', np.concatenate(([0,0],digit_mask[get_number_array(current_time.second, array_length=2, fill_value=0)].flatten())))
-        self.set_leds('cpu_usage', np.concatenate(([0,0],digit_mask[get_number_array(current_time.minute, array_length=2, fill_value=0)].flatten())))
+        self.draw_glyph('cpu_temp_hours', current_time.hour)
+        self.draw_glyph('gpu_usage_clock', current_time.second)
+        self.draw_glyph('cpu_usage_clock', current_time.minute)
         self.colors = self.time_colors
 
     def display_temp_small(self, device='cpu'):
         unit = {device: self.config.get(f"{device}_temperature_unit", "celsius")for device in ["cpu","gpu"]}
         self.set_leds(unit[device], 1)
         self.set_leds(device+'_led', 1)
-        current_temp = self.metrics.get_metrics(self.temp_unit)[f"{device}_temp"]
+        current_temp = self.read_metrics(self.temp_unit)[f"{device}_temp"]
         self.colors = self.metrics_colors
         if current_temp is not None:
-            self.set_leds('digit_frame', digit_mask[get_number_array(current_temp, array_length=3, fill_value=0)].flatten())
+            self.draw_glyph('digit_frame', current_temp % 1000 if current_temp >= 0 else current_temp)
         else:
             print(f"Warning: {device} temperature not available.")
     
     def display_usage_small(self, device='cpu'):   
-        current_usage = self.metrics.get_metrics(self.temp_unit)[f"{device}_usage"]
+        current_usage = self.read_metrics(self.temp_unit)[f"{device}_usage"]
         self.set_leds('percent_led', 1)
         self.set_leds(device+'_led', 1)
         self.colors = self.metrics_colors
         if current_usage is not None:
-            self.set_leds('digit_frame', digit_mask[get_number_array(current_usage, array_length=3, fill_value=0)].flatten())
+            self.draw_glyph('digit_frame', current_usage % 1000 if current_usage >= 0 else current_usage)
         else:
             print(f"Warning: {device} usage not available.")
 
+    def read_metrics(self, temp_unit):
+        """The metrics, with the display fields showing the metrics "metric_fields" assigns them."""
+        metrics = self.metrics.get_metrics(temp_unit)
+        for field, metric in self.metric_fields.items():
+            if metric in metrics:
+                metrics[field] = max(0, min(int(metrics[metric]), FIELD_LIMITS[field]))
+        return metrics
+
     def get_config_colors(self, config, key="metrics", metrics=None):
-        conf_colors = config.get(key, {}).get('colors', ["ffe000"] * NUMBER_OF_LEDS)
-        if len(conf_colors) != NUMBER_OF_LEDS:
-            print(f"Warning: config {key} colors length mismatch, using default colors.")
-            colors = ["ff0000"] * NUMBER_OF_LEDS
-        else:
-            if metrics is None:
-                metrics = self.metrics.get_metrics(self.temp_unit)
-            colors = []
-            for i, color in enumerate(conf_colors):
-                if color.lower() == "random":
-                    colors.append(get_random_color())
-                elif color.startswith("wave_"):
-                    wave_type, gradient = color.split(";", 1)
-                    colors_list = gradient.split('-')
-                    num_colors = len(colors_list)
-                    
-                    if num_colors >= 2:
-                        if colors_list[0] != colors_list[-1]:
-                            colors_list.append(colors_list[0])
-                        
-                        num_segments = len(colors_list) - 1
-                        total_duration = self.cycle_duration
-                        
-                        if wave_type == "wave_ltr":
-                            phase_shift = (i / NUMBER_OF_LEDS) * total_duration
-                        else: # wave_rtl
-                            phase_shift = ((NUMBER_OF_LEDS - i) / NUMBER_OF_LEDS) * total_duration
-                        
-                        time_in_cycle = (self.cpt + phase_shift) % total_duration
-                        
-                        if num_segments > 0:
-                            segment_duration = total_duration / num_segments
-                            segment_index = min(int(time_in_cycle / segment_duration), num_segments - 1)
-                            
-                            start_color = colors_list[segment_index]
-                            end_color = colors_list[segment_index + 1]
-                            
-                            time_in_segment = time_in_cycle - (segment_index * segment_duration)
-                            if segment_duration > 0:
-                                factor = time_in_segment / segment_duration
-                            else:
-                                factor = 0
-                            colors.append(interpolate_color(start_color, end_color, factor))
-                        else:
-                            colors.append(colors_list[0])
-                    else:
-                        colors.append(colors_list[0])
-                elif ";" in color:  # New multi-stop gradient format
-                    parts = color.split(';')
-                    metric = parts[0]
-                    stops = []
-                    for stop in parts[1:]:
-                        stop_parts = stop.split(':')
-                        stops.append({'color': stop_parts[0], 'value': int(stop_parts[1])})
-                    
-                    stops.sort(key=lambda x: x['value'])
-                    
-                    if metric not in metrics:
-                        print(f"Warning: {metric} not found in metrics, using first color.")
-                        colors.append(stops[0]['color'])
-                        continue
-
-                    metric_value = metrics[metric]
-
-                    if metric_value <= stops[0]['value']:
-                        colors.append(stops[0]['color'])
-                        continue
-                    
-                    if metric_value >= stops[-1]['value']:
-                        colors.append(stops[-1]['color'])
-                        continue
-
-                    for j in range(len(stops) - 1):
-                        if stops[j]['value'] <= metric_value < stops[j+1]['value']:
-                            start_stop = stops[j]
-                            end_stop = stops[j+1]
-                            factor = (metric_value - start_stop['value']) / (end_stop['value'] - start_stop['value'])
-                            colors.append(interpolate_color(start_stop['color'], end_stop['color'], factor))
-                            break
-                elif "-" in color:
-                    split_color = color.split("-")
-                    if len(split_color) == 3:
-                        start_color, end_color, metric = split_color
-                        current_time = datetime.datetime.now()
-                        if metric == "seconds":
-                            factor = current_time.second / 59
-                        elif metric == "minutes":
-                            factor = current_time.minute / 59
-                        elif metric == "hours":
-                            factor = current_time.hour / 23
-                        else:
-                            if metric not in metrics:
-                                print(f"Warning: {metric} not found in metrics, using start color.")
-                                factor = 0
-                            elif self.metrics_min_value[metric] == self.metrics_max_value[metric]:
-                                print(f"Warning: {metric} min and max values are the same, using start color.")
-                                factor = 0
-                            else:
-                                metric_value = metrics[metric]
-                                min_val = self.metrics_min_value[metric]
-                                max_val = self.metrics_max_value[metric]
-                                factor = (metric_value - min_val) / (max_val - min_val)
-                                factor = max(0, min(1, factor)) # Clamp factor between 0 and 1
-                        colors.append(interpolate_color(start_color, end_color, factor))
-                    else:
-                        colors_list = split_color
-                        num_colors = len(colors_list)
-                        
-                        if num_colors >= 2:
-                            # Add first color to the end to make a loop
-                            if colors_list[0] != colors_list[-1]:
-                                colors_list.append(colors_list[0])
-                            
-                            num_segments = len(colors_list) - 1
-                            total_duration = self.cycle_duration # number of steps
-                            time_in_cycle = self.cpt % total_duration
-                            
-                            if num_segments > 0:
-                                segment_duration = total_duration / num_segments
-                                segment_index = min(int(time_in_cycle / segment_duration), num_segments - 1)
-                                
-                                start_color = colors_list[segment_index]
-                                end_color = colors_list[segment_index + 1]
-                                
-                                time_in_segment = time_in_cycle - (segment_index * segment_duration)
-                                if segment_duration > 0:
-                                    factor = time_in_segment / segment_duration
-                                else:
-                                    factor = 0
-                                colors.append(interpolate_color(start_color, end_color, factor))
-                            else:
-                                colors.append(colors_list[0])
-                        else:
-                            colors.append(colors_list[0])
-                else:
-                    colors.append(color)
-        return np.array(colors)
+        if metrics is None:
+            metrics = self.read_metrics(self.temp_unit)
+        if config is self.config:
+            return self.engine.colors(key, metrics, self.phase)
+        return self.engine.compile(config, key).evaluate(metrics, self.phase, self.cycle_duration)
     
     def update(self):
         self.leds = np.array([0] * NUMBER_OF_LEDS)
-        self.config = self.load_config()
+        self.config_watcher.poll()
+        if self.config_watcher.generation != self.config_generation:
+            self.apply_config(self.config_watcher.config)
+            self.config_generation = self.config_watcher.generation
+        while not self.pending_changes.empty():
+            self.pending_changes.get_nowait().apply(self)
+        if self.config:
+            self.metrics_colors = self.get_config_colors(self.config, key="metrics")
+            self.time_colors = self.get_config_colors(self.config, key="time")
+
+    def apply_config(self, config):
+        """Derive all config dependent state. Only called when the config file changed."""
+        if self.config_generation is not None:
+            self.config_reloads += 1
+        self.config = config
+        self.engine.load(config)
+        self.cycle_duration = self.engine.cycle_duration
         if self.config:
             VENDOR_ID = int(self.config.get('vendor_id', "0x0416"),16)
             PRODUCT_ID = int(self.config.get('product_id', "0x8001"),16)
-            self.metrics_max_value = {
-                "cpu_temp": self.config.get('cpu_max_temp', 90),
-                "gpu_temp": self.config.get('gpu_max_temp', 90),
-                "cpu_usage": self.config.get('cpu_max_usage', 100),
-                "gpu_usage": self.config.get('gpu_max_usage', 100),
-            }
-            self.metrics_min_value = {
-                "cpu_temp": self.config.get('cpu_min_temp', 30),
-                "gpu_temp": self.config.get('gpu_min_temp', 30),
-                "cpu_usage": self.config.get('cpu_min_usage', 0),
-                "gpu_usage": self.config.get('gpu_min_usage', 0),
-            }
+            output = (self.config.get('output_backend', 'hidapi'), self.device_path or self.config.get('output_path'))
             self.display_mode = self.config.get('display_mode', 'metrics')
             
             # Handle legacy dual_metrics mode
             if self.display_mode == 'dual_metrics':
                 self.display_mode = 'peerless_standard'
                 
-            self.temp_unit = {device: self.config.get(f"{device}_temperature_unit", "celsius") for device in ["cpu", "gpu"]}
-            self.metrics_colors = self.get_config_colors(self.config, key="metrics")
-            self.time_colors = self.get_config_colors(self.config, key="time")
+            self.temp_unit = self.engine.temp_unit
+            self.metric_fields = {}
+            for field, metric in self.config.get('metric_fields', {}).items():
+                if field in FIELD_LIMITS:
+                    self.metric_fields[field] = metric
+                else:
+                    print(f"Warning: unknown display field {field} in metric_fields, expected one of {list(FIELD_LIMITS)}.")
             self.update_interval = self.config.get('update_interval', 0.1)
-            self.cycle_duration = int(self.config.get('cycle_duration', 5)/self.update_interval)
-            self.metrics.update_interval = self.config.get('metrics_update_interval', 0.5)
+            if self.configure_metrics:
+                self.metrics.update_interval = self.config.get('metrics_update_interval', 0.5)
+                self.metrics.intervals = self.config.get('metrics_update_intervals', {})
+                try:
+                    self.metrics.configure_smoothing(self.config.get('metrics_smoothing', {}))
+                except (ValueError, TypeError) as e:
+                    print(f"Error in metrics_smoothing: {e}")
+            self.keepalive_interval = self.config.get('keepalive_interval', 1.0) or None  # null or 0 disables it
             if self.config.get('layout_mode', 'big')== 'small':
-                self.leds_indexes = leds_indexes_small
+                self.layout = self.layouts["small"]
                 if self.display_mode not in display_modes_small:
                     print(f"Warning: Display mode {self.display_mode} not compatible with small layout, switching to alternate metrics.")
                     self.display_mode = "alternate_metrics"
             else:
-                self.leds_indexes = leds_indexes
+                self.layout = self.layouts["big"]
                 if self.display_mode not in display_modes:
                     print(f"Warning: Display mode {self.display_mode} not compatible with big layout, switching to metrics.")
                     self.display_mode = "metrics"
         else:
             VENDOR_ID = 0x0416
             PRODUCT_ID = 0x8001
-            self.metrics_max_value = {
-                "cpu_temp": 90,
-                "gpu_temp": 90,
-                "cpu_usage": 100,
-                "gpu_usage": 100,
-            }
-            self.metrics_min_value = {
-                "cpu_temp": 30,
-                "gpu_temp": 30,
-                "cpu_usage": 0,
-                "gpu_usage": 0,
-            }
+            output = ('hidapi', self.device_path)
             self.display_mode = 'metrics'
-            self.time_colors = np.array(["ffe000"] * NUMBER_OF_LEDS)
-            self.metrics_colors = np.array(["ff0000"] * NUMBER_OF_LEDS)
+            self.time_colors = np.tile(hex_to_rgb("ffe000"), (NUMBER_OF_LEDS, 1))
+            self.metrics_colors = np.tile(hex_to_rgb("ff0000"), (NUMBER_OF_LEDS, 1))
             self.update_interval = 0.1
-            self.cycle_duration = int(5/self.update_interval)
-            self.metrics.update_interval = 0.5
-            self.leds_indexes = leds_indexes
+            if self.configure_metrics:
+                self.metrics.update_interval = 0.5
+            self.keepalive_interval = 1.0
+            self.layout = self.layouts["big"]
         
 
-        if VENDOR_ID != self.VENDOR_ID or PRODUCT_ID != self.PRODUCT_ID:
-            print(f"Warning: Config VENDOR_ID or PRODUCT_ID changed, reinitializing device.")
+        if self.dev is None or VENDOR_ID != self.VENDOR_ID or PRODUCT_ID != self.PRODUCT_ID \
+                or output != (self.output_backend, self.output_path):
+            if self.dev is not None:
+                print(f"Warning: Config VENDOR_ID, PRODUCT_ID or output changed, reinitializing device.")
+                if self.dev is not self.device:
+                    self.dev.close()
             self.VENDOR_ID = VENDOR_ID
             self.PRODUCT_ID = PRODUCT_ID
+            self.output_backend, self.output_path = output
             self.dev = self.get_device()
+            self.last_sent_time = None
+        self.frame_interval = self.adaptive_frame_interval()
+
+    def adaptive_frame_interval(self):
+        """
+        Longest interval between frames that still shows every change on the display:
+        update_interval while random colors or waves are shown, otherwise the most
+        frequent of the clock digits, time gradients, metric refreshes, view switches
+        of the alternate modes and the keepalive. "adaptive_frame_rate": false keeps
+        update_interval.
+        """
+        if not self.config or not self.config.get('adaptive_frame_rate', True):
+            return self.update_interval
+        metrics_interval = min([self.config.get('metrics_update_interval', 0.5)]
+                               + list(self.config.get('metrics_update_intervals', {}).values()))
+        mode = self.display_mode
+        intervals = [self.keepalive_interval, CLOCK_INTERVALS.get(mode),
+                     self.engine.refresh_interval(MODE_COLOR_KEYS.get(mode, ("metrics",)), self.update_interval, metrics_interval)]
+        if mode not in NO_METRICS_MODES:
+            intervals.append(metrics_interval)
+        if mode in MODE_SWITCH_PERIODS:
+            intervals.append(self.cycle_duration * MODE_SWITCH_PERIODS[mode])
+        return max(self.update_interval, min((interval for interval in intervals if interval is not None),
+                                             default=IDLE_FRAME_INTERVAL))
+
+    def render_frame(self):
+        """Renders the display mode for the current phase and sends the frame to the device."""
+        self.render_mode()
+        self.send_packets()
+
+    def render_mode(self):
+        cycle_phase = self.phase % (self.cycle_duration*2)
+        if self.display_mode == "alternate_time":
+            if cycle_phase < self.cycle_duration:
+                self.display_time()
+                self.display_metrics(devices=['gpu'])
+            else:
+                self.display_time(device="gpu")
+                self.display_metrics(devices=['cpu'])
+        elif self.display_mode == "metrics":
+            self.display_metrics(devices=["cpu", "gpu"])
+        elif self.display_mode == "time":
+            self.display_time_with_seconds()
+        elif self.display_mode == "time_cpu":
+            self.display_time(device="gpu")
+            self.display_metrics(devices=['cpu'])
+        elif self.display_mode == "time_gpu":
+            self.display_time()
+            self.display_metrics(devices=['gpu'])
+        elif self.display_mode == "alternate_time_with_seconds":
+            if cycle_phase < self.cycle_duration:
+                self.display_time_with_seconds()
+            else:
+                self.display_metrics()
+        elif self.display_mode == "alternate_metrics":
+            if cycle_phase < self.cycle_duration/2:
+                self.display_temp_small(device='cpu')
+            elif cycle_phase < self.cycle_duration:
+                self.display_temp_small(device='gpu')
+            elif cycle_phase < 3*self.cycle_duration/2:
+                self.display_usage_small(device='cpu')
+            else:
+                self.display_usage_small(device='gpu')
+        elif self.display_mode == "cpu_temp":
+            self.display_temp_small(device='cpu')
+        elif self.display_mode == "gpu_temp":
+            self.display_temp_small(device='gpu')
+        elif self.display_mode == "cpu_usage":
+            self.display_usage_small(device='cpu')
+        elif self.display_mode == "gpu_usage":
+            self.display_usage_small(device='gpu')
+        elif self.display_mode == "peerless_standard":
+            self.display_peerless_standard()
+        elif self.display_mode == "peerless_temp":
+            self.display_peerless_temp()
+        elif self.display_mode == "peerless_usage":
+            self.display_peerless_usage()
+        elif self.display_mode == "debug_ui":
+            self.colors = self.metrics_colors
+            self.leds[:] = 1
+        else:
+            print(f"Unknown display mode: {self.display_mode}")
 
     def display(self):
+        self.scheduler = FrameScheduler(self.frame_interval)
+        profiler = None
+        if profiling_enabled(self.config):
+            profiler = StageProfiler(self.device_path or "controller",
+                                     log_interval=(self.config or {}).get('profile_log_interval', 60.0)).install(self)
         while True:
-            self.config = self.load_config()
+            self.scheduler.begin_frame()
+            if profiler is not None:
+                profiler.begin_frame()
+            # Monotonic clock time, so animations line up with the GUI preview
+            self.phase = time.monotonic()
             self.update()
             if self.dev is None:
                 print("No device found, with VENDOR_ID: {}, PRODUCT_ID: {}".format(self.VENDOR_ID, self.PRODUCT_ID))
                 time.sleep(5)
-            else:
-                if self.display_mode == "alternate_time":
-                    if self.cpt < self.cycle_duration:
-                        self.display_time()
-                        self.display_metrics(devices=['gpu'])
-                    else:
-                        self.display_time(device="gpu")
-                        self.display_metrics(devices=['cpu'])
-                elif self.display_mode == "metrics":
-                    self.display_metrics(devices=["cpu", "gpu"])
-                elif self.display_mode == "time":
-                    self.display_time_with_seconds()
-                elif self.display_mode == "time_cpu":
-                    self.display_time(device="gpu")
-                    self.display_metrics(devices=['cpu'])
-                elif self.display_mode == "time_gpu":
-                    self.display_time()
-                    self.display_metrics(devices=['gpu'])
-                elif self.display_mode == "alternate_time_with_seconds":
-                    if self.cpt < self.cycle_duration:
-                        self.display_time_with_seconds()
-                    else:
-                        self.display_metrics()
-                elif self.display_mode == "alternate_metrics":
-                    if self.cpt < self.cycle_duration/2:
-                        self.display_temp_small(device='cpu')
-                    elif self.cpt < self.cycle_duration:
-                        self.display_temp_small(device='gpu')
-                    elif self.cpt < 3*self.cycle_duration/2:
-                        self.display_usage_small(device='cpu')
-                    else:
-                        self.display_usage_small(device='gpu')
-                elif self.display_mode == "cpu_temp":
-                    self.display_temp_small(device='cpu')
-                elif self.display_mode == "gpu_temp":
-                    self.display_temp_small(device='gpu')
-                elif self.display_mode == "cpu_usage":
-                    self.display_usage_small(device='cpu')
-                elif self.display_mode == "gpu_usage":
-                    self.display_usage_small(device='gpu')
-                elif self.display_mode == "peerless_standard":
-                    self.display_peerless_standard()
-                elif self.display_mode == "peerless_temp":
-                    self.display_peerless_temp()
-                elif self.display_mode == "peerless_usage":
-                    self.display_peerless_usage()
-                elif self.display_mode == "debug_ui":
-                    self.colors = self.metrics_colors
-                    self.leds[:] = 1
-                else:
-                    print(f"Unknown display mode: {self.display_mode}")
-                
-                self.cpt = (self.cpt + 1) % (self.cycle_duration*2)
-                self.send_packets()
-            time.sleep(self.update_interval)
+                self.scheduler.reset()
+                continue
+            self.render_frame()
+            if profiler is not None:
+                profiler.end_frame()
+            if self.profile_capture is not None:
+                self.profile_capture.poll()
+            self.scheduler.interval = self.frame_interval
+            # Slowed down frames land on wall clock ticks, so clock digits change on time
+            self.scheduler.align_to_clock = self.frame_interval > self.update_interval
+            self.scheduler.end_frame()
+
+
+def default_config_path():
+    return os.environ.get('DIGITAL_LCD_CONFIG', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json'))
+
+
+def create_controllers(config_path=None, metrics=None):
+    """
+    Creates a Controller for every display found, all sharing one Metrics sampler,
+    the compiled layouts and the compiled colors.
+
+    Devices matching the vendor_id/product_id of the config get the config itself,
+    unless an entry of its optional "devices" list matches their serial number or
+    device path and names their own config file (relative to this one):
+        "devices": [{"match": "<serial number or path>", "config": "cooler2.json"}]
+    An entry may also set "product_id" to drive another device of the same vendor.
+    Without any device found, a single controller waits for one as before.
+    """
+    config_path = config_path if config_path is not None else default_config_path()
+    try:
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+    except Exception as e:
+        print(f"Error loading config: {e}")
+        config = {}
+    if metrics is None:
+        metrics = Metrics(config_path=config_path)
+        metrics.start()
+    shared = {"metrics": metrics, "programs": ProgramCache(),
+              "layouts": {name: load_layout(name) for name in LAYOUT_SOURCES}}
+
+    entries = config.get('devices', [])
+    vendor_id = int(config.get('vendor_id', "0x0416"), 16)
+    product_ids = [int(config.get('product_id', "0x8001"), 16)]
+    product_ids += [int(entry['product_id'], 16) for entry in entries if 'product_id' in entry]
+    backend = config.get('output_backend', 'hidapi')
+    found = []
+    for product_id in dict.fromkeys(product_ids):
+        try:
+            found += enumerate_devices(backend, vendor_id, product_id)
+        except Exception as e:
+            print(f"Error enumerating HID devices: {e}")
+    if len(found) <= 1 and not entries:
+        return [Controller(config_path=config_path, **shared)]
+
+    controllers = []
+    for path, serial_number in found:
+        device_config_path = config_path
+        for entry in entries:
+            if entry.get('match') is not None and entry['match'] in (serial_number, path) and 'config' in entry:
+                device_config_path = os.path.join(os.path.dirname(config_path), entry['config'])
+                break
+        print(f"Found device {path} (serial {serial_number}), using config {device_config_path}")
+        controllers.append(Controller(config_path=device_config_path, device_path=path,
+                                      configure_metrics=not controllers, **shared))
+    return controllers or [Controller(config_path=config_path, **shared)]
+
+
+def start_control_server(controllers):
+    """Serves the control socket set by "control_socket" in the config (false disables it)."""
+    config = controllers[0].config or {}
+    path = config.get('control_socket')
+    if path is False:
+        return None
+    if not hasattr(socket, 'AF_UNIX'):
+        print("Control socket not available: this platform has no Unix sockets")
+        return None
+    from control import ControlServer  # Unix sockets only
+    try:
+        server = ControlServer(controllers, path).start()
+    except OSError as e:
+        print(f"Error starting the control socket: {e}")
+        return None
+    print(f"Control socket listening on {server.path}")
+    return server
+
+
+def start_metrics_exporter(controllers):
+    """Serves /metrics on the address set by "metrics_exporter" in the config, e.g. "127.0.0.1:9469"."""
+    config = controllers[0].config or {}
+    address = config.get('metrics_exporter')
+    if not address:
+        return None
+    from exporter import MetricsExporter, parse_address  # http.server is only needed here
+    try:
+        exporter = MetricsExporter(controllers, parse_address(address)).start()
+    except (OSError, ValueError) as e:
+        print(f"Error starting the metrics exporter: {e}")
+        return None
+    print(f"Metrics exporter listening on http://{exporter.server_address[0]}:{exporter.server_address[1]}/metrics")
+    return exporter
+
+
+def start_profile_capture(controllers):
+    """Lets SIGUSR1/SIGUSR2 start and write a cProfile capture of the render loops."""
+    if not hasattr(signal, 'SIGUSR1'):
+        return None  # Not on Windows
+    config = controllers[0].config or {}
+    capture = ProfileCapture(config.get('profile_dir'), config.get('profile_capture_seconds', 60.0)).install_signals()
+    for controller in controllers:
+        controller.profile_capture = capture
+    return capture
 
 
 def main(config_path):
-    controller = Controller(config_path=config_path)
-    controller.display()
+    controllers = create_controllers(config_path)
+    start_control_server(controllers)
+    start_metrics_exporter(controllers)
+    start_profile_capture(controllers)
+    if len(controllers) == 1:
+        controllers[0].display()
+        return
+    # One render loop per device, so a slow device only delays its own frames
+    threads = [threading.Thread(target=controller.display, name=f"display-{controller.device_path}", daemon=True)
+               for controller in controllers]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(1)
 
 if __name__ == '__main__':
     if len(sys.argv) > 1:
@@ -0,0 +1,149 @@
+import http.server
+import math
+import threading
+import time
+
+OPENMETRICS_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PROMETHEUS_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_ADDRESS = ("127.0.0.1", 9469)
+
+
+def parse_address(value):
+    """(host, port) of a "metrics_exporter" config value: true, a port or "host:port"."""
+    if value is True:
+        return DEFAULT_ADDRESS
+    if isinstance(value, int):
+        return DEFAULT_ADDRESS[0], value
+    host, _, port = str(value).rpartition(':')
+    return host or DEFAULT_ADDRESS[0], int(port)
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+def _value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsWriter:
+    """Builds a text exposition, in the OpenMetrics or the Prometheus 0.0.4 format."""
+
+    def __init__(self, openmetrics=False):
+        self.openmetrics = openmetrics
+        self.lines = []
+
+    def family(self, name, kind, help_text, samples):
+        """`samples` are (suffix, labels, value) tuples; a counter's "_total" suffix is added here."""
+        # Prometheus 0.0.4 names a counter family after its sample, OpenMetrics without "_total"
+        family_name = name + "_total" if kind == "counter" and not self.openmetrics else name
+        self.lines.append(f"# HELP {family_name} {help_text}")
+        self.lines.append(f"# TYPE {family_name} {kind}")
+        for suffix, labels, value in samples:
+            if kind == "counter":
+                suffix = "_total"
+            self.lines.append(f"{name}{suffix}{_labels(labels)} {_value(value)}")
+
+    def text(self):
+        return "\n".join(self.lines + (["# EOF"] if self.openmetrics else [])) + "\n"
+
+
+def _summary(stats, labels):
+    """_count/_sum samples of a scheduler RunningStats, in seconds."""
+    if stats is None:
+        return []
+    return [("_count", labels, stats.count), ("_sum", labels, stats.mean * stats.count)]
+
+
+def render_metrics(controllers, openmetrics=False):
+    """
+    Exposition of the latest metrics snapshot and of the render loops. Only reads
+    state the sampler and the loops already publish, so a scrape never reads a sensor.
+    """
+    writer = MetricsWriter(openmetrics)
+    snapshot = getattr(controllers[0].metrics, 'snapshot', None) if controllers else None
+    if snapshot is not None:
+        writer.family("digital_lcd_sensor", "gauge", "Latest sampled value of a metric, as sent to the display.",
+                      [("", {"metric": metric}, value) for metric, value in snapshot.values.items()])
+        now = time.monotonic()
+        writer.family("digital_lcd_sensor_age_seconds", "gauge", "Time since a metric was last sampled.",
+                      [("", {"metric": metric}, now - sampled_at) for metric, sampled_at in snapshot.sampled_at.items()])
+        stats = getattr(snapshot, 'stats', {})
+        for index, name in enumerate(["min", "max", "mean"]):
+            writer.family(f"digital_lcd_sensor_recent_{name}", "gauge", f"{name.capitalize()} of the recent samples of a metric.",
+                          [("", {"metric": metric}, values[index]) for metric, values in stats.items() if values is not None])
+
+    devices = []
+    for index, controller in enumerate(controllers):
+        labels = {"device": controller.device_path or str(index)}
+        devices.append((labels, controller, getattr(controller, 'scheduler', None)))
+    writer.family("digital_lcd_device_connected", "gauge", "Whether the display device is open.",
+                  [("", labels, controller.dev is not None) for labels, controller, _ in devices])
+    writer.family("digital_lcd_frame_interval_seconds", "gauge", "Current interval between frames, adapted to the config.",
+                  [("", labels, controller.frame_interval) for labels, controller, _ in devices])
+    writer.family("digital_lcd_frame_period_seconds", "summary", "Time between the starts of consecutive frames.",
+                  [sample for labels, _, scheduler in devices if scheduler is not None for sample in _summary(scheduler.frame_period, labels)])
+    writer.family("digital_lcd_render_seconds", "summary", "Time to render and send a frame.",
+                  [sample for labels, _, scheduler in devices if scheduler is not None for sample in _summary(scheduler.render_time, labels)])
+    writer.family("digital_lcd_hid_write_seconds", "summary", "Time to write the reports of a frame to the device.",
+                  [sample for labels, controller, _ in devices for sample in _summary(controller.write_latency, labels)])
+    writer.family("digital_lcd_time_to_first_frame_seconds", "gauge", "Time from process start to the first frame sent.",
+                  [("", labels, controller.time_to_first_frame) for labels, controller, _ in devices
+                   if controller.time_to_first_frame is not None])
+    writer.family("digital_lcd_frames_rendered", "counter", "Frames rendered.",
+                  [("", labels, controller.frames_rendered) for labels, controller, _ in devices])
+    writer.family("digital_lcd_frames_sent", "counter", "Frames written to the device (unchanged frames are skipped).",
+                  [("", labels, controller.frames_sent) for labels, controller, _ in devices])
+    writer.family("digital_lcd_frames_dropped", "counter", "Frame deadlines skipped because a frame overran.",
+                  [("", labels, scheduler.skipped_frames) for labels, _, scheduler in devices if scheduler is not None])
+    writer.family("digital_lcd_frame_overruns", "counter", "Frames that finished after the next deadline.",
+                  [("", labels, scheduler.overruns) for labels, _, scheduler in devices if scheduler is not None])
+    writer.family("digital_lcd_config_reloads", "counter", "Config changes applied after the first load.",
+                  [("", labels, controller.config_reloads) for labels, controller, _ in devices])
+    return writer.text()
+
+
+class ExporterHandler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        openmetrics = 'application/openmetrics-text' in self.headers.get('Accept', '')
+        body = render_metrics(self.server.controllers, openmetrics).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', OPENMETRICS_TYPE if openmetrics else PROMETHEUS_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # One line per scrape would flood the journal
+
+
+class MetricsExporter(http.server.ThreadingHTTPServer):
+    """
+    HTTP endpoint serving the controllers' metrics at /metrics for Prometheus,
+    in the OpenMetrics format when the scraper asks for it.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, controllers, address=DEFAULT_ADDRESS):
+        self.controllers = controllers
+        super().__init__(address, ExporterHandler)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="metrics-exporter", daemon=True).start()
+        return self
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,147 @@
+import numpy as np
+
+digit_to_segments = {
+    0: ['a', 'b', 'c', 'd', 'e', 'f'],
+    1: ['b', 'c'],
+    2: ['a', 'b', 'g', 'e', 'd'],
+    3: ['a', 'b', 'g', 'c', 'd'],
+    4: ['f', 'g', 'b', 'c'],
+    5: ['a', 'f', 'g', 'c', 'd'],
+    6: ['a', 'f', 'g', 'e', 'c', 'd'],
+    7: ['a', 'b', 'c'],
+    8: ['a', 'b', 'c', 'd', 'e', 'f', 'g'],
+    9: ['a', 'b', 'g', 'f', 'c', 'd'],
+}
+
+digit_mask = np.array(
+    [
+        [1, 1, 1, 1, 1, 1, 1],  # 0
+        [1, 1, 1, 1, 1, 1, 1],  # 1
+        [1, 1, 1, 1, 1, 1, 1],  # 2
+        [1, 1, 1, 1, 1, 1, 1],  # 3
+        [1, 1, 1, 1, 1, 1, 1],  # 4
+        [1, 1, 1, 1, 1, 1, 1],  # 5
+        [1, 1, 1, 1, 1, 1, 1],  # 6
+        [1, 1, 1, 1, 1, 1, 1],  # 7
+        [1, 1, 1, 1, 1, 1, 1],  # 8
+        [1, 1, 1, 1, 1, 1, 1],  # 9
+        [1, 1, 1, 1, 1, 1, 1],  # nothing
+    ]
+)
+
+letter_mask = {
+    'H': [1, 0, 1, 1, 1, 0, 1],
+}
+
+
+def _number_to_array(number):
+    if number>=10:
+        return _number_to_array(int(number/10))+[number%10]
+    else:
+        return [number]
+
+def get_number_array(temp, array_length=3, fill_value=-1):
+    if temp<0:
+        return [fill_value]*array_length
+    else:
+        narray = _number_to_array(temp)
+        if (len(narray)!=array_length):
+            if(len(narray)<array_length):
+                narray = np.concatenate([[fill_value]*(array_length-len(narray)),narray])
+            else:
+                narray = narray[1:]
+        return narray
+
+
+class GlyphTable:
+    """
+    Precomputed on/off states of the LEDs of a numeric field for every value it can show.
+
+    Row v of `masks` holds the state of the LEDs in `indexes` when the field shows v;
+    the extra last row is used for negative values. Drawing a value is then a
+    single fancy-indexed assignment instead of building the digits every frame.
+    """
+
+    def __init__(self, indexes, masks, blank=None):
+        self.indexes = np.asarray(indexes, dtype=np.intp)
+        if blank is None:
+            blank = np.zeros(len(self.indexes), dtype=np.uint8)
+        self.masks = np.vstack([np.asarray(masks, dtype=np.uint8), blank])
+        self.size = len(self.masks) - 1  # Values 0 to size - 1 can be shown
+
+    def lookup(self, value):
+        value = int(value)
+        if value < 0:
+            return self.masks[-1]
+        if value >= self.size:
+            raise ValueError(f"The numbers displayed on this field must be less than {self.size}")
+        return self.masks[value]
+
+    def draw(self, leds, value):
+        leds[self.indexes] = self.lookup(value)
+
+
+def compile_segment_field(digits, size, one_segments=()):
+    """
+    Table for a field of layout.json: `digits` are the digit entries (most
+    significant first) with their segment name -> LED index 'map', `one_segments`
+    the LEDs of a leading "1" lit for values of 10 ** len(digits) and more.
+    Values are drawn with leading zeros, as draw_number did.
+    """
+    indexes = list(one_segments) + [index for digit in digits for index in digit['segments']]
+    position = {index: i for i, index in enumerate(indexes)}
+    masks = np.zeros((size, len(indexes)), dtype=np.uint8)
+    modulo = 10 ** len(digits)
+    for value in range(size):
+        if value >= modulo:
+            masks[value, :len(one_segments)] = 1
+        for digit, digit_char in zip(digits, f"{value % modulo:0{len(digits)}d}"):
+            for segment_name in digit_to_segments[int(digit_char)]:
+                masks[value, position[digit['map'][segment_name]]] = 1
+    return GlyphTable(indexes, masks)
+
+
+def compile_layout_glyphs(layout):
+    """Tables for the numeric fields of layout.json, by field name."""
+    return {
+        'cpu_temp': compile_segment_field(layout['cpu_temp_digits'], 1000),
+        'gpu_temp': compile_segment_field(layout['gpu_temp_digits'], 1000),
+        'cpu_usage': compile_segment_field(layout['cpu_usage_digits'], 200,
+                                           (layout['cpu_usage_1']['top'], layout['cpu_usage_1']['bottom'])),
+        # The GPU usage digits are listed least significant first in layout.json
+        'gpu_usage': compile_segment_field(layout['gpu_usage_digits'][::-1], 200,
+                                           (layout['gpu_usage_1']['top'], layout['gpu_usage_1']['bottom'])),
+    }
+
+
+def _index_table(indexes, size, mask, blank=None):
+    return GlyphTable(indexes, [mask(value) for value in range(size)], blank)
+
+
+def compile_index_glyphs(indexes):
+    """
+    Tables for the numeric fields of a leds_indexes dict, by field name:
+    "<device>_temp" and "<device>_usage" for the metrics, "<device>_temp_hours" and
+    "<device>_usage_clock" for the time modes and "digit_frame" for the small display.
+    """
+    tables = {}
+    for device in ["cpu", "gpu"]:
+        if device + '_temp' in indexes:
+            field = indexes[device + '_temp']
+            tables[device + '_temp'] = _index_table(
+                field, 1000, lambda v: digit_mask[get_number_array(v)].flatten(),
+                digit_mask[get_number_array(-1)].flatten())
+            tables[device + '_temp_hours'] = _index_table(
+                field, 24, lambda v: np.concatenate((digit_mask[get_number_array(v, array_length=2, fill_value=0)].flatten(), letter_mask["H"])))
+        if device + '_usage' in indexes:
+            field = indexes[device + '_usage']
+            tables[device + '_usage'] = _index_table(
+                field, 200, lambda v: np.concatenate(([int(v >= 100)] * 2, digit_mask[get_number_array(v, array_length=2)].flatten())),
+                np.concatenate(([0, 0], digit_mask[get_number_array(-1, array_length=2)].flatten())))
+            tables[device + '_usage_clock'] = _index_table(
+                field, 60, lambda v: np.concatenate(([0, 0], digit_mask[get_number_array(v, array_length=2, fill_value=0)].flatten())))
+    if 'digit_frame' in indexes:
+        tables['digit_frame'] = _index_table(
+            indexes['digit_frame'], 1000, lambda v: digit_mask[get_number_array(v, array_length=3, fill_value=0)].flatten(),
+            digit_mask[get_number_array(-1, array_length=3, fill_value=0)].flatten())
+    return tables
@@ -0,0 +1,382 @@
+import atexit
+import subprocess
+import threading
+import time
+
+GPU_AGGREGATIONS = ("hottest", "max", "mean")
+
+
+def parse_bus_id(bus_id):
+    """
+    Comparable form of a PCI bus id. NVIDIA pads the domain to 8 digits
+    ("00000000:01:00.0"), AMD to 4, and the domain is often left out ("01:00.0").
+    """
+    parts = str(bus_id).strip().lower().split(':')
+    if len(parts) == 2:
+        parts.insert(0, '0')
+    if len(parts) != 3 or '.' not in parts[2]:
+        raise ValueError(f"invalid PCI bus id {bus_id!r}")
+    device, function = parts[2].split('.', 1)
+    return int(parts[0], 16), int(parts[1], 16), int(device, 16), int(function, 16)
+
+
+class GpuSelection:
+    """
+    The GPUs to read and how to combine their readings into one value per metric.
+
+    `devices` lists GPU indices and PCI bus ids, or is "all". `aggregation` is
+    one of GPU_AGGREGATIONS, or a {metric: aggregation} object for the metrics
+    that don't use the "hottest" default, e.g. {"gpu_temp": "max", "gpu_usage": "mean"}.
+    "hottest" takes every metric from the card with the highest temperature, so
+    the readings shown together come from the same card.
+    """
+
+    def __init__(self, devices=(0,), aggregation="hottest"):
+        if devices == "all":
+            self.devices = None
+        else:
+            if isinstance(devices, (int, str)):
+                devices = [devices]
+            self.devices = []
+            for device in devices:
+                if isinstance(device, bool) or not isinstance(device, (int, str)):
+                    raise ValueError(f"invalid GPU {device!r}, expected an index or a PCI bus id")
+                self.devices.append(device if isinstance(device, int) else parse_bus_id(device))
+        if isinstance(aggregation, str):
+            aggregation = {None: aggregation}
+        elif not isinstance(aggregation, dict):
+            raise ValueError(f"invalid GPU aggregation {aggregation!r}")
+        self.aggregation = dict(aggregation)
+        self.default = self.aggregation.pop(None, "hottest")
+        for mode in list(self.aggregation.values()) + [self.default]:
+            if mode not in GPU_AGGREGATIONS:
+                raise ValueError(f"unknown GPU aggregation {mode!r}, expected one of {GPU_AGGREGATIONS}")
+
+    @classmethod
+    def from_config(cls, config):
+        """The selection of the "gpus" and "gpu_aggregation" config keys, the first GPU if they are invalid."""
+        try:
+            return cls(config.get('gpus', [0]), config.get('gpu_aggregation', "hottest"))
+        except ValueError as e:
+            print(f"Warning: {e}, reading the first GPU only.")
+            return cls()
+
+    @property
+    def by_index(self):
+        """Whether every GPU is selected by index, so the devices can be opened without listing them."""
+        return self.devices is not None and all(isinstance(device, int) for device in self.devices)
+
+    def selects(self, index, bus_id=None):
+        if self.devices is None:
+            return True
+        if index in self.devices:
+            return True
+        if bus_id is None:
+            return False
+        try:
+            return parse_bus_id(bus_id) in self.devices
+        except ValueError:
+            return False
+
+    def key(self):
+        """JSON serializable form, for the probe cache fingerprint."""
+        return [self.devices, self.default, sorted(self.aggregation.items())]
+
+    def aggregate(self, samples):
+        """Combines the {metric: value} samples of the selected GPUs into one."""
+        samples = [sample for sample in samples if sample]
+        if len(samples) <= 1:
+            return samples[0] if samples else {}
+        hottest = max(samples, key=lambda sample: _reading(sample, 'gpu_temp'))
+        combined = {}
+        for metric in {metric for sample in samples for metric in sample}:
+            mode = self.aggregation.get(metric, self.default)
+            if mode == "hottest" and metric != 'gpu_temp':
+                combined[metric] = hottest.get(metric)
+                continue
+            values = [sample[metric] for sample in samples if sample.get(metric) is not None]
+            if not values:
+                combined[metric] = None
+            elif mode in ("max", "hottest"):  # The hottest card's temperature is the highest one
+                combined[metric] = max(values)
+            else:
+                combined[metric] = sum(values) / len(values)
+        return combined
+
+
+def _reading(sample, metric):
+    value = sample.get(metric)
+    return float('-inf') if value is None else value
+
+
+class NvmlBackend:
+    """
+    Persistent NVML session for the selected NVIDIA GPUs.
+
+    NVML is initialized once and the device handles are cached. Every sample reads
+    temperature, utilization and, when the driver supports them, power, fan speed
+    and memory usage of all the selected GPUs in a single pass and aggregates them;
+    metric getters called within `max_age` of each other share that sample. The
+    session is shut down at interpreter exit.
+    """
+
+    # Optional readings, dropped for good the first time the device reports them as unsupported
+    EXTRA_METRICS = ('gpu_power', 'gpu_fan', 'gpu_memory')
+
+    def __init__(self, selection=None, pynvml=None, max_age=0.1):
+        if pynvml is None:
+            import pynvml
+        self.nvml = pynvml
+        self.selection = selection or GpuSelection()
+        self.max_age = max_age
+        self.nvml.nvmlInit()
+        self._closed = False
+        atexit.register(self.close)
+        try:
+            self.handles = self._open_devices()
+        except Exception:
+            self.close()
+            raise
+        if not self.handles:
+            self.close()
+            raise RuntimeError("none of the selected GPUs found")
+        self.device_extra_metrics = [list(self.EXTRA_METRICS) for _ in self.handles]
+        self._sample = None
+        self._sample_time = None
+
+    @classmethod
+    def create(cls, **kwargs):
+        """Returns a backend, or None if NVML or the GPU is not available."""
+        try:
+            return cls(**kwargs)
+        except Exception:
+            return None
+
+    def _open_devices(self):
+        nvml = self.nvml
+        if self.selection.by_index:
+            return [nvml.nvmlDeviceGetHandleByIndex(index) for index in self.selection.devices]
+        handles = []
+        for index in range(nvml.nvmlDeviceGetCount()):
+            handle = nvml.nvmlDeviceGetHandleByIndex(index)
+            bus_id = nvml.nvmlDeviceGetPciInfo(handle).busId
+            if isinstance(bus_id, bytes):
+                bus_id = bus_id.decode()
+            if self.selection.selects(index, bus_id):
+                handles.append(handle)
+        return handles
+
+    @property
+    def extra_metrics(self):
+        """The optional readings still supported by at least one of the selected GPUs."""
+        return [metric for metric in self.EXTRA_METRICS
+                if any(metric in metrics for metrics in self.device_extra_metrics)]
+
+    def _read_extra(self, handle, metric):
+        nvml = self.nvml
+        if metric == 'gpu_power':
+            return nvml.nvmlDeviceGetPowerUsage(handle) / 1000  # milliwatts
+        elif metric == 'gpu_fan':
+            return nvml.nvmlDeviceGetFanSpeed(handle)
+        elif metric == 'gpu_memory':
+            memory = nvml.nvmlDeviceGetMemoryInfo(handle)
+            return memory.used * 100 / memory.total
+
+    def read(self):
+        """Queries every selected device once and returns all supported metrics, aggregated."""
+        samples = []
+        for handle, extra_metrics in zip(self.handles, self.device_extra_metrics):
+            sample = {
+                'gpu_temp': self.nvml.nvmlDeviceGetTemperature(handle, self.nvml.NVML_TEMPERATURE_GPU),
+                'gpu_usage': self.nvml.nvmlDeviceGetUtilizationRates(handle).gpu,
+            }
+            for metric in list(extra_metrics):
+                try:
+                    sample[metric] = self._read_extra(handle, metric)
+                except Exception:
+                    extra_metrics.remove(metric)
+            samples.append(sample)
+        return self.selection.aggregate(samples)
+
+    def sample(self):
+        now = time.monotonic()
+        if self._sample is None or now - self._sample_time >= self.max_age:
+            self._sample = self.read()
+            self._sample_time = now
+        return self._sample
+
+    def get_temperature(self):
+        return self.sample()['gpu_temp']
+
+    def get_usage(self):
+        return self.sample()['gpu_usage']
+
+    def getter(self, metric):
+        """Returns a function reading `metric` from the shared sample."""
+        return lambda: self.sample().get(metric)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            try:
+                self.nvml.nvmlShutdown()
+            except Exception:
+                pass
+
+
+class AmdGpuBackend:
+    """
+    The selected AMD GPUs of pyamdgpuinfo, read together like NvmlBackend: one
+    pass over the devices per sample, shared by the getters within `max_age`.
+    """
+
+    def __init__(self, selection=None, pyamdgpuinfo=None, max_age=0.1):
+        if pyamdgpuinfo is None:
+            import pyamdgpuinfo  # Only needed when the config asks for an AMD GPU
+        self.selection = selection or GpuSelection()
+        self.max_age = max_age
+        self.gpus = []
+        for index in range(pyamdgpuinfo.detect_gpus()):
+            gpu = pyamdgpuinfo.get_gpu(index)
+            if self.selection.selects(index, getattr(gpu, 'pci_slot', None)):
+                self.gpus.append(gpu)
+        if not self.gpus:
+            raise RuntimeError("none of the selected AMD GPUs detected")
+        self._sample = None
+        self._sample_time = None
+
+    @classmethod
+    def create(cls, **kwargs):
+        """Returns a backend, or None if pyamdgpuinfo or the GPUs are not available."""
+        try:
+            return cls(**kwargs)
+        except Exception as e:
+            print(f"AMD GPU metrics not available: {e}")
+            return None
+
+    def read(self):
+        samples = []
+        for gpu in self.gpus:
+            sample = {}
+            try:
+                sample['gpu_temp'] = gpu.query_temperature()
+            except Exception as e:
+                print(f"Error getting AMD GPU temperature: {e}")
+            try:
+                sample['gpu_usage'] = int(gpu.query_load() * 100)
+            except Exception:
+                pass
+            samples.append(sample)
+        return self.selection.aggregate(samples)
+
+    def sample(self):
+        now = time.monotonic()
+        if self._sample is None or now - self._sample_time >= self.max_age:
+            self._sample = self.read()
+            self._sample_time = now
+        return self._sample
+
+    def get_temperature(self):
+        return self.sample().get('gpu_temp')
+
+    def get_usage(self):
+        return self.sample().get('gpu_usage')
+
+
+class NvidiaSmiStream:
+    """
+    GPU readings from one long-lived `nvidia-smi --query-gpu=... -lms N` process.
+
+    A reader thread parses the CSV lines as nvidia-smi prints them and keeps the
+    latest values per GPU index, so sampling a metric never forks a process; the
+    lines of the selected GPUs are aggregated as they are read. If
+    nvidia-smi exits or its output can't be read, it is restarted after
+    `restart_delay` seconds. `command` replaces the nvidia-smi invocation, e.g.
+    with a script printing the same CSV lines.
+    """
+
+    QUERY = ('index', 'pci.bus_id', 'temperature.gpu', 'utilization.gpu')
+    METRICS = ('gpu_temp', 'gpu_usage')
+
+    def __init__(self, interval=0.5, selection=None, command=None, restart_delay=1.0, stale_after=5.0):
+        if command is None:
+            command = ['nvidia-smi', '--query-gpu=' + ','.join(self.QUERY),
+                       '--format=csv,noheader,nounits', '-lms', str(max(1, int(interval * 1000)))]
+        self.command = command
+        self.selection = selection or GpuSelection()
+        self.restart_delay = restart_delay
+        self.stale_after = max(stale_after, 3 * interval)
+        self.gpus = {}  # GPU index -> (values, monotonic time of the line)
+        self.restarts = 0
+        self._process = None
+        self._stop = threading.Event()
+        self._first_sample = threading.Event()
+        self._reader = threading.Thread(target=self._read_loop, name="nvidia-smi-reader", daemon=True)
+        self._reader.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def create(cls, timeout=2.0, **kwargs):
+        """Starts the stream and waits for its first line; returns None if nothing arrives."""
+        try:
+            stream = cls(**kwargs)
+        except Exception:
+            return None
+        if not stream._first_sample.wait(timeout):
+            stream.close()
+            return None
+        return stream
+
+    def parse_line(self, line):
+        fields = [field.strip() for field in line.split(',')]
+        if len(fields) != len(self.QUERY):
+            return
+        try:
+            index = int(fields[0])
+            values = dict(zip(self.METRICS, (float(field) for field in fields[2:])))
+        except ValueError:
+            # Header line or "[N/A]" readings
+            return
+        if not self.selection.selects(index, fields[1]):
+            return
+        # The first sample is complete once every selected GPU printed a line: all of them
+        # when they are selected by index, otherwise once the first of them comes around again
+        complete = index in self.gpus or (self.selection.by_index and len(self.gpus) + 1 >= len(self.selection.devices))
+        self.gpus[index] = (values, time.monotonic())
+        if complete:
+            self._first_sample.set()
+
+    def _read_loop(self):
+        while not self._stop.is_set():
+            try:
+                self._process = subprocess.Popen(self.command, stdout=subprocess.PIPE,
+                                                 stderr=subprocess.DEVNULL, text=True, bufsize=1)
+                for line in self._process.stdout:
+                    self.parse_line(line)
+                self._process.wait()
+            except Exception as e:
+                print(f"nvidia-smi stream error: {e}")
+            if self._stop.wait(self.restart_delay):
+                break
+            self.restarts += 1
+
+    def get(self, metric):
+        now = time.monotonic()
+        samples = [values for values, updated_at in list(self.gpus.values()) if now - updated_at <= self.stale_after]
+        return self.selection.aggregate(samples).get(metric)
+
+    def get_temperature(self):
+        return self.get('gpu_temp')
+
+    def get_usage(self):
+        return self.get('gpu_usage')
+
+    def close(self):
+        self._stop.set()
+        process = self._process
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                process.kill()
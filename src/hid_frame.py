@@ -0,0 +1,66 @@
+import ctypes
+import numpy as np
+from config import NUMBER_OF_LEDS
+
+REPORT_SIZE = 64  # LED data bytes per HID report
+HEADER = bytes.fromhex('dadbdcdd000000000000000000000000fc0000ff')
+
+
+class FrameEncoder:
+    """
+    Preallocated buffer holding the HID reports of one frame back to back.
+
+    The first report starts with the fixed HEADER, the following ones with a 0x00
+    report ID, and the LED RGB data fills the rest. The header and report IDs are
+    written once here; each frame only copies the RGB bytes into place, and the
+    report views handed to the device are created once and reused, so encoding and
+    writing a frame allocate nothing.
+
+    Report views are ctypes char arrays over the buffer rather than memoryviews:
+    hidapi's write binding only accepts bytes-like ctypes arguments, and ctypes
+    arrays also support the buffer protocol for os.write.
+    """
+
+    def __init__(self, header=HEADER, number_of_leds=NUMBER_OF_LEDS):
+        data_size = number_of_leds * 3
+        first_chunk = REPORT_SIZE - len(header)
+        layout = [(header, 0, min(first_chunk, data_size))]
+        for start in range(first_chunk, data_size, REPORT_SIZE):
+            layout.append((b'\x00', start, min(start + REPORT_SIZE, data_size)))
+
+        self.buffer = bytearray(sum(len(prefix) + end - start for prefix, start, end in layout))
+        self.sent = bytearray(len(self.buffer))  # Copy of the last frame written to the device
+        buffer_array = np.frombuffer(self.buffer, dtype=np.uint8)
+        self.rgb = np.zeros((number_of_leds, 3), dtype=np.uint8)
+        rgb_flat = self.rgb.reshape(-1)
+        self.reports = []
+        self._chunks = []  # (destination view in the buffer, source view in self.rgb)
+        offset = 0
+        for prefix, start, end in layout:
+            self.buffer[offset:offset + len(prefix)] = prefix
+            data_offset = offset + len(prefix)
+            self._chunks.append((buffer_array[data_offset:data_offset + end - start], rgb_flat[start:end]))
+            size = len(prefix) + end - start
+            self.reports.append((ctypes.c_char * size).from_buffer(self.buffer, offset))
+            offset += size
+
+    def encode(self, colors, leds):
+        """
+        Writes the colors of the lit LEDs (black for the others) into the buffer.
+        Args:
+            colors (np.ndarray): (number_of_leds, 3) uint8 RGB colors.
+            leds (np.ndarray): per LED on/off state.
+        Returns:
+            list: the report views to write to the device, in order.
+        """
+        np.multiply(colors, (leds != 0)[:, None], out=self.rgb)
+        for destination, source in self._chunks:
+            destination[:] = source
+        return self.reports
+
+    def changed(self):
+        """Whether the encoded frame differs from the last one marked as sent."""
+        return self.buffer != self.sent
+
+    def mark_sent(self):
+        self.sent[:] = self.buffer
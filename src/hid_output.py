@@ -0,0 +1,170 @@
+import glob
+import os
+import struct
+import time
+from scheduler import RunningStats
+
+LOOPBACK_MAGIC = b'LCDLOOP1'
+LOOPBACK_RECORD = struct.Struct('<QH')  # monotonic timestamp (ns), report length
+
+
+class OutputBackend:
+    """
+    Destination of the HID reports. Subclasses implement _write(); write() keeps
+    count of the reports and bytes written and of the time each write took, and
+    returns the number of bytes written, 0 if the report was dropped.
+    """
+
+    def __init__(self):
+        self.reports_written = 0
+        self.bytes_written = 0
+        self.dropped_reports = 0
+        self.write_latency = RunningStats()
+
+    def write(self, report):
+        start = time.perf_counter()
+        written = self._write(report)
+        self.write_latency.add(time.perf_counter() - start)
+        if written == 0:
+            return written
+        self.reports_written += 1
+        self.bytes_written += len(report)
+        return written
+
+    def _write(self, report):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class HidapiOutput(OutputBackend):
+    """Writes reports through hidapi (the hid package)."""
+
+    def __init__(self, vendor_id, product_id, path=None):
+        super().__init__()
+        import hid
+        if path:
+            self.dev = hid.Device(path=path.encode() if isinstance(path, str) else path)
+        else:
+            self.dev = hid.Device(vendor_id, product_id)
+
+    def _write(self, report):
+        return self.dev.write(report)
+
+    def close(self):
+        self.dev.close()
+
+
+def find_hidraw(vendor_id, product_id, sys_root='/sys'):
+    """Returns the /dev/hidrawN paths of the devices matching vendor_id:product_id."""
+    wanted = f"{vendor_id:08X}:{product_id:08X}"
+    paths = []
+    for hidraw in sorted(glob.glob(os.path.join(sys_root, 'class/hidraw/hidraw*'))):
+        try:
+            with open(os.path.join(hidraw, 'device/uevent'), 'r') as f:
+                uevent = f.read()
+        except OSError:
+            continue
+        for line in uevent.splitlines():
+            # HID_ID=<bus>:<vendor>:<product>
+            if line.startswith('HID_ID=') and line.split(':', 1)[1].upper() == wanted:
+                paths.append(os.path.join('/dev', os.path.basename(hidraw)))
+    return paths
+
+
+class HidrawOutput(OutputBackend):
+    """
+    Writes reports straight to /dev/hidrawN with non-blocking os.write, skipping
+    hidapi. Reports the kernel can't queue right away are dropped and counted,
+    write() returns 0 for them so the frame is sent again.
+    """
+
+    def __init__(self, vendor_id, product_id, path=None):
+        super().__init__()
+        if not path:
+            paths = find_hidraw(vendor_id, product_id)
+            if not paths:
+                raise OSError(f"no hidraw device for {vendor_id:04x}:{product_id:04x}")
+            path = paths[0]
+        self.path = path
+        self.fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+
+    def _write(self, report):
+        try:
+            return os.write(self.fd, report)
+        except BlockingIOError:
+            self.dropped_reports += 1
+            return 0
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class LoopbackOutput(OutputBackend):
+    """
+    Records reports instead of sending them, for machines without the cooler.
+    The file starts with LOOPBACK_MAGIC followed by one record per report: the
+    LOOPBACK_RECORD header (monotonic ns timestamp, length) and the report bytes.
+    """
+
+    def __init__(self, path=None):
+        super().__init__()
+        self.path = path
+        self.file = open(path, 'wb') if path else None
+        if self.file is not None:
+            self.file.write(LOOPBACK_MAGIC)
+
+    def _write(self, report):
+        if self.file is not None:
+            self.file.write(LOOPBACK_RECORD.pack(time.monotonic_ns(), len(report)))
+            self.file.write(report)
+        return len(report)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_recording(path):
+    """Yields (timestamp_ns, report bytes) from a LoopbackOutput recording."""
+    with open(path, 'rb') as f:
+        if f.read(len(LOOPBACK_MAGIC)) != LOOPBACK_MAGIC:
+            raise ValueError(f"{path} is not a loopback recording")
+        while True:
+            header = f.read(LOOPBACK_RECORD.size)
+            if len(header) < LOOPBACK_RECORD.size:
+                return
+            timestamp, length = LOOPBACK_RECORD.unpack(header)
+            yield timestamp, f.read(length)
+
+
+def enumerate_devices(backend, vendor_id, product_id):
+    """Returns (path, serial number or None) of every device matching vendor_id:product_id."""
+    if backend == "hidapi":
+        import hid
+        devices = {}
+        for info in hid.enumerate(vendor_id, product_id):
+            path = info['path'].decode() if isinstance(info['path'], bytes) else info['path']
+            # hidapi lists a path once per usage page on some platforms
+            devices.setdefault(path, info.get('serial_number') or None)
+        return list(devices.items())
+    elif backend == "hidraw":
+        return [(path, None) for path in find_hidraw(vendor_id, product_id)]
+    return []
+
+
+OUTPUT_BACKENDS = ["hidapi", "hidraw", "loopback"]
+
+
+def open_output(backend, vendor_id, product_id, path=None):
+    if backend == "hidapi":
+        return HidapiOutput(vendor_id, product_id, path)
+    elif backend == "hidraw":
+        return HidrawOutput(vendor_id, product_id, path)
+    elif backend == "loopback":
+        return LoopbackOutput(path)
+    raise ValueError(f"unknown output backend {backend!r}, expected one of {OUTPUT_BACKENDS}")
@@ -0,0 +1,171 @@
+import glob
+import hashlib
+import json
+import os
+import zipfile
+import numpy as np
+from config import leds_indexes, leds_indexes_small, NUMBER_OF_LEDS
+from glyphs import GlyphTable, compile_index_glyphs, compile_layout_glyphs, digit_to_segments, digit_mask, letter_mask
+
+LAYOUT_JSON = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'layout.json')
+
+# Layout name -> (LED groups, segment mapping file for the peerless modes)
+LAYOUT_SOURCES = {
+    "big": (leds_indexes, LAYOUT_JSON),
+    "small": (leds_indexes_small, None),
+}
+
+# Single LED entries of layout.json and the groups they must match
+LAYOUT_JSON_GROUPS = {
+    "cpu_led": "cpu_led",
+    "gpu_led": "gpu_led",
+    "cpu_celsius": "cpu_celsius",
+    "cpu_fahrenheit": "cpu_fahrenheit",
+    "gpu_celsius": "gpu_celsius",
+    "gpu_fahrenheit": "gpu_fahrenheit",
+    "cpu_percent": "cpu_percent_led",
+    "gpu_percent": "gpu_percent_led",
+}
+
+CACHE_VERSION = 1
+
+
+class Layout:
+    """
+    LED geometry of a display, compiled once: every named group as a NumPy index
+    array and the glyph tables of its numeric fields. `glyphs` follow the groups
+    (the leds_indexes path), `segment_glyphs` the real seven-segment mapping of
+    layout.json used by the peerless modes; it is empty if there is none.
+    """
+
+    def __init__(self, name, groups, scalars, glyphs, segment_glyphs, number_of_leds=NUMBER_OF_LEDS):
+        self.name = name
+        self.groups = groups
+        self.scalars = frozenset(scalars)  # Groups defined as a single LED
+        self.glyphs = glyphs
+        self.segment_glyphs = segment_glyphs
+        self.number_of_leds = number_of_leds
+
+    def __contains__(self, name):
+        return name in self.groups
+
+    def index(self, name, position=None):
+        """LED index of a single LED group, or of the LED at `position` in a group (all of them if None)."""
+        indexes = self.groups[name]
+        if name in self.scalars:
+            return int(indexes[0])
+        if position is None:
+            return indexes
+        return int(indexes[position])
+
+    def save(self, path):
+        arrays = {"number_of_leds": np.array(self.number_of_leds), "scalars": np.array(sorted(self.scalars), dtype=str)}
+        for name, indexes in self.groups.items():
+            arrays[f"group:{name}"] = indexes
+        for kind, tables in (("glyph", self.glyphs), ("segment", self.segment_glyphs)):
+            for name, table in tables.items():
+                arrays[f"{kind}:{name}:indexes"] = table.indexes
+                arrays[f"{kind}:{name}:masks"] = table.masks
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, name, path):
+        groups, tables = {}, {"glyph": {}, "segment": {}}
+        with np.load(path) as data:
+            for key in data.files:
+                parts = key.split(':')
+                if parts[0] == "group":
+                    groups[parts[1]] = data[key]
+                elif parts[0] in tables and parts[2] == "masks":
+                    masks = data[key]
+                    tables[parts[0]][parts[1]] = GlyphTable(data[f"{parts[0]}:{parts[1]}:indexes"], masks[:-1], masks[-1])
+            return cls(name, groups, data["scalars"].tolist(), tables["glyph"], tables["segment"], int(data["number_of_leds"]))
+
+
+def _check_indexes(name, group, indexes, number_of_leds):
+    if len(indexes) == 0 or indexes.min() < 0 or indexes.max() >= number_of_leds:
+        raise ValueError(f"layout {name}: {group} must hold LED indexes between 0 and {number_of_leds - 1}")
+
+
+def _check_segments(name, layout_json, groups):
+    for key, group in LAYOUT_JSON_GROUPS.items():
+        if sorted(np.atleast_1d(layout_json[key]).tolist()) != sorted(groups[group].tolist()):
+            raise ValueError(f"layout {name}: {key} of layout.json doesn't match the {group} LEDs")
+    for field in ["cpu_temp", "gpu_temp", "cpu_usage", "gpu_usage"]:
+        field_leds = set(groups[field].tolist())
+        for digit in layout_json[field + '_digits']:
+            if set(digit['map']) != set(digit_to_segments[8]) or sorted(digit['map'].values()) != sorted(digit['segments']):
+                raise ValueError(f"layout {name}: every {field} digit must map segments a-g to its 7 LEDs")
+            if not field_leds.issuperset(digit['segments']):
+                raise ValueError(f"layout {name}: {field} digit segments are outside the {field} LEDs")
+        if field.endswith('_usage') and not field_leds.issuperset(layout_json[field + '_1'].values()):
+            raise ValueError(f"layout {name}: {field}_1 segments are outside the {field} LEDs")
+
+
+def compile_layout(name, indexes, layout_json=None, number_of_leds=NUMBER_OF_LEDS):
+    """Validates the LED groups (and layout.json) of a display and compiles them into a Layout."""
+    groups = {}
+    scalars = []
+    for group, value in indexes.items():
+        if isinstance(value, int):
+            scalars.append(group)
+        groups[group] = np.atleast_1d(np.asarray(value, dtype=np.intp))
+        _check_indexes(name, group, groups[group], number_of_leds)
+    segment_glyphs = {}
+    if layout_json is not None:
+        _check_segments(name, layout_json, groups)
+        segment_glyphs = compile_layout_glyphs(layout_json)
+    return Layout(name, groups, scalars, compile_index_glyphs(indexes), segment_glyphs, number_of_leds)
+
+
+def default_cache_dir():
+    return os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'digital_lcd')
+
+
+def load_layout(name="big", cache_dir=None):
+    """
+    Returns the compiled Layout `name` of LAYOUT_SOURCES. The compiled form is cached
+    as an .npz file keyed by a hash of everything it is derived from, so it is only
+    rebuilt when the groups, layout.json or the digit masks change. A layout.json that
+    doesn't match the groups is left out with a warning: only the peerless modes need it.
+    """
+    indexes, layout_path = LAYOUT_SOURCES[name]
+    layout_json = None
+    if layout_path is not None:
+        try:
+            with open(layout_path, 'r') as f:
+                layout_json = json.load(f)
+        except Exception as e:
+            print(f"Error loading layout: {e}")
+    source = json.dumps([CACHE_VERSION, name, NUMBER_OF_LEDS, indexes, layout_json, digit_to_segments,
+                         digit_mask.tolist(), letter_mask], sort_keys=True)
+    key = hashlib.sha256(source.encode()).hexdigest()[:16]
+    cache_path = os.path.join(cache_dir or default_cache_dir(), f"layout-{name}-{key}.npz")
+    try:
+        return Layout.load(name, cache_path)
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        pass  # Not cached yet, or a truncated or corrupt cache file: compile it again
+    try:
+        layout = compile_layout(name, indexes, layout_json)
+    except (KeyError, TypeError, ValueError) as e:
+        if layout_json is None:
+            raise
+        print(f"Warning: ignoring {layout_path}, it doesn't match the {name} layout: {e}")
+        return compile_layout(name, indexes)  # Not cached, so the warning comes back until layout.json is fixed
+    try:
+        layout.save(cache_path)
+    except OSError as e:
+        print(f"Warning: could not cache the compiled layout: {e}")
+        return layout
+    # Layouts compiled from earlier sources are never loaded again
+    for stale_path in glob.glob(os.path.join(os.path.dirname(cache_path), f"layout-{name}-*.npz")):
+        if stale_path != cache_path:
+            try:
+                os.remove(stale_path)
+            except OSError:
+                pass
+    return layout
@@ -1,39 +1,75 @@
 import tkinter as tk
 from tkinter import ttk, colorchooser
 import json
+import socket
 import sys
-from config import leds_indexes, leds_indexes_small, NUMBER_OF_LEDS, display_modes, default_config, display_modes_small
+from config import NUMBER_OF_LEDS, display_modes, default_config, display_modes_small
+from layout import load_layout
 import numpy as np
-import threading
 import time
-from utils import interpolate_color, get_random_color
-
-segmented_digit_layout = {# Position segments in a 7-segment layout
-    "top_left":
-        {"row":1, "column":0, "padx":2, "pady":0, "orientation": "Vertical"},
-    "top":
-        {"row":0, "column":1, "pady":2, "padx":0,  "orientation": "Horizontal"},
-    "top_right":
-        {"row":1, "column":2, "padx":2, "pady":0, "orientation": "Vertical"},
-    "middle":
-        {"row":2, "column":1, "pady":2, "padx":0, "orientation": "Horizontal"},
-    "bottom_left":
-        {"row":3, "column":0, "padx":2, "pady":0, "orientation": "Vertical"},
-    "bottom":
-        {"row":4, "column":1, "pady":2, "padx":0, "orientation": "Horizontal"},
-    "bottom_right":
-        {"row":3, "column":2, "padx":2, "pady":0, "orientation": "Vertical"},
+from render_engine import RenderEngine, to_hex_colors
+from metrics import Metrics
+
+SEGMENT_LENGTH = 20
+SEGMENT_WIDTH = 5
+DIGIT_PITCH = 2 * SEGMENT_WIDTH + SEGMENT_LENGTH + 10
+OFF_COLOR = "#d9d9d9"
+
+# Segment rectangles (x0, y0, x1, y1) within a digit, in LED order
+_L, _W = SEGMENT_LENGTH, SEGMENT_WIDTH
+segmented_digit_layout = {
+    "top_left": (0, _W, _W, _W + _L),
+    "top": (_W, 0, _W + _L, _W),
+    "top_right": (_W + _L, _W, 2 * _W + _L, _W + _L),
+    "middle": (_W, _W + _L, _W + _L, 2 * _W + _L),
+    "bottom_left": (0, 2 * _W + _L, _W, 2 * _W + 2 * _L),
+    "bottom": (_W, 2 * _W + 2 * _L, _W + _L, 3 * _W + 2 * _L),
+    "bottom_right": (_W + _L, 2 * _W + _L, 2 * _W + _L, 2 * _W + 2 * _L),
 }
 
+# Metric values for the preview when the metrics can't be read
+PREVIEW_METRICS = {"cpu_temp": 50, "gpu_temp": 50, "cpu_usage": 50, "gpu_usage": 50}
+# Where the preview takes its metric values from ("preview_metrics" in the config):
+#   "daemon": the running controller's samples, read over its control socket
+#   "sampler": a Metrics sampler of its own, reading every sensor again next to the controller's
+#   "static": PREVIEW_METRICS
+PREVIEW_METRICS_SOURCES = ("daemon", "sampler", "static")
+DAEMON_TIMEOUT = 0.2  # Seconds, the status request blocks the Tk thread
+
+
+def read_daemon_metrics(socket_path, temp_unit, timeout=DAEMON_TIMEOUT):
+    """The metrics last sampled by the running controller, with `temp_unit` applied. Raises OSError if it can't be reached."""
+    from control import send_request  # Unix sockets only
+    try:
+        response = send_request({"cmd": "status"}, socket_path, timeout=timeout)
+    except ValueError as e:
+        raise OSError(f"invalid response: {e}")
+    if not response.get("ok") or response.get("metrics") is None:
+        raise OSError(response.get("error", "no metrics"))
+    metrics = dict(response["metrics"])
+    for device in ["cpu", "gpu"]:
+        if temp_unit[device] == "fahrenheit" and metrics.get(f"{device}_temp") is not None:
+            metrics[f"{device}_temp"] = int(metrics[f"{device}_temp"] * 9 / 5 + 32)
+    return metrics
+
+
+# Attributes belonging to the widgets of one layout mode, swapped when switching layouts
+VIEW_ATTRIBUTES = ("layout", "number_of_leds", "led_items", "shown_colors", "preview", "led_frame",
+                   "config_frame", "display_mode", "color_mode", "group_var", "config_vars")
+
 
 class LEDDisplayUI:
     def __init__(self, root, config_path="config.json"):
         self.root = root
         self.config_path = config_path
         self.config = self.load_config()
+        self.engine = RenderEngine()
+        self.config_version = 0  # Bumped on every edit, the engine recompiles the colors then
         self.root.title("LED Display Layout")
         self.style = ttk.Style()
-        self.leds_indexes = leds_indexes
+        self.layout = load_layout("big")
+        self.views = {}  # Layout mode -> VIEW_ATTRIBUTES of its cached widgets
+        self.view_mode = None
         # Layout mode selection
         self.layout_mode = tk.StringVar(value=self.config.get("layout_mode", "big"))
         layout_mode_frame = ttk.LabelFrame(root, text="Choose layout mode:", padding=(10, 10))
@@ -50,11 +86,29 @@ class LEDDisplayUI:
         # Create initial layout (big)
         self.change_layout_mode()
 
-        # Start update thread
-        self.update_interval = self.config["update_interval"]
-        self.cycle_duration = self.config["cycle_duration"]
-        self.start_time = time.time()
-        threading.Thread(target=self.update_ui_loop, daemon=True).start()
+        # Preview updates run on the Tk thread
+        self.update_interval = float(self.config["update_interval"])
+        self.metrics = None
+        self.metrics_source = self.config.get("preview_metrics", "daemon")
+        if self.metrics_source not in PREVIEW_METRICS_SOURCES:
+            print(f"Warning: unknown preview_metrics {self.metrics_source}, using the controller's metrics.")
+            self.metrics_source = "daemon"
+        if self.metrics_source == "daemon" and (self.config.get("control_socket") is False or not hasattr(socket, 'AF_UNIX')):
+            print("Control socket disabled, previewing with sample values.")
+            self.metrics_source = "static"
+        if self.metrics_source == "sampler":
+            try:
+                self.metrics = Metrics(config_path=self.config_path)
+                self.metrics.start()
+            except Exception as e:
+                print(f"Metrics not available, previewing with sample values: {e}")
+                self.metrics_source = "static"
+        # Controller metrics, refreshed as often as it samples them
+        self.daemon_metrics = None
+        self.daemon_polled = None
+        self.daemon_poll_interval = float(self.config.get("metrics_update_interval", 0.5))
+        self.daemon_error = None
+        self.root.after(0, self.update_preview)
 
         # Reset button
         reset_button = ttk.Button(
@@ -65,90 +119,89 @@ class LEDDisplayUI:
         reset_button.grid(row=2, column=0, padx=10, pady=10, columnspan=2)
 
     def create_big_layout(self):
-        # Clear previous layout
-        for widget in self.layout_frame.winfo_children():
-            widget.destroy()
-
         self.number_of_leds = NUMBER_OF_LEDS
-        self.leds_ui = np.array([None] * self.number_of_leds)
+        self.led_items = [None] * self.number_of_leds
+        self.shown_colors = [None] * self.number_of_leds
 
-        led_frame = ttk.Frame(self.layout_frame, padding=(10, 10))
-        led_frame.grid(row=0, column=0, padx=10, pady=10)
+        self.led_frame = ttk.Frame(self.layout_frame, padding=(10, 10))
+        self.led_frame.grid(row=0, column=0, padx=10, pady=10)
         self.config_frame = self.create_config_panel(self.layout_frame)
 
-        display_frame = ttk.Frame(led_frame, padding=(10, 10))
+        display_frame = ttk.Frame(self.led_frame, padding=(10, 10))
         display_frame.grid(row=0, column=0, padx=10, pady=10)
         self.create_color_mode(display_frame)
         self.create_display_mode(display_frame, display_modes)
 
-        # Create frames for CPU and GPU
-        self.cpu_frame = self.create_device_frame(led_frame, "cpu", 1)
-        self.gpu_frame = self.create_device_frame(led_frame, "gpu", 2)
+        # CPU and GPU rows of the preview
+        self.preview = self.create_preview(self.led_frame, width=430, height=190, row=1)
+        self.create_device_items("cpu", 10)
+        self.create_device_items("gpu", 100)
 
         # Add controls for group selection and color change
-        self.create_controls(led_frame)
+        self.create_controls(self.led_frame)
 
     def create_small_layout(self):
-        # Clear previous layout
-        for widget in self.layout_frame.winfo_children():
-            widget.destroy()
-
         self.number_of_leds = 30
-        self.leds_ui = np.array([None] * self.number_of_leds)
+        self.led_items = [None] * self.number_of_leds
+        self.shown_colors = [None] * self.number_of_leds
 
-        led_frame = ttk.Frame(self.layout_frame, padding=(10, 10))
-        led_frame.grid(row=0, column=0, padx=10, pady=10)
+        self.led_frame = ttk.Frame(self.layout_frame, padding=(10, 10))
+        self.led_frame.grid(row=0, column=0, padx=10, pady=10)
         self.config_frame = self.create_config_panel(self.layout_frame)
 
         # Display controls at the top (row 0)
-        display_frame = ttk.Frame(led_frame, padding=(10, 10))
+        display_frame = ttk.Frame(self.led_frame, padding=(10, 10))
         display_frame.grid(row=0, column=0, padx=10, pady=10)
         self.create_display_mode(display_frame, display_modes_small)
 
-        # Device LED labels in row 1
-        device_led_frame = ttk.Frame(led_frame)
-        device_led_frame.grid(row=1, column=0, columnspan=4, padx=5, pady=5)
-        
-        self.create_label(device_led_frame, "cpu_led", "CP", 0, 0, index=0)
-        self.create_label(device_led_frame, "cpu_led", "U", 0, 1, index=1)
-        self.create_label(device_led_frame, "gpu_led", "GP", 1, 0, index=0)
-        self.create_label(device_led_frame, "gpu_led", "U", 1, 1, index=1)
-
-        # Temperature unit selection in row 1, column 1
-        unit_frame = ttk.Frame(led_frame)
-        unit_frame.grid(row=1, column=1, padx=5, pady=5)
-        
-        # Create clickable labels for °C and °F
-        self.create_label(unit_frame, "celsius", "°C", 0, 0)
-        self.create_label(unit_frame, "fahrenheit", "°F", 1, 0)
-        self.create_label(unit_frame, "percent_led", "%", 2, 0)
-        
-        # Digit frame in row 2
-        digit_frame = ttk.Frame(led_frame)
-        digit_frame.grid(row=2, column=0, columnspan=2, padx=5, pady=5)
-        self.create_segmented_digit_layout(digit_frame, "digit_frame")
-        
-        # Add controls for group selection and color change in row 3
-        self.create_controls(led_frame, row=3)
+        # Device LEDs, unit LEDs and digits in row 1
+        self.preview = self.create_preview(self.led_frame, width=260, height=90, row=1)
+        self.create_text_item(10, 20, "cpu_led", "CP", index=0)
+        self.create_text_item(48, 20, "cpu_led", "U", index=1)
+        self.create_text_item(10, 60, "gpu_led", "GP", index=0)
+        self.create_text_item(48, 60, "gpu_led", "U", index=1)
+        self.create_digit_items(90, 10, "digit_frame")
+        self.create_text_item(210, 15, "celsius", "°C")
+        self.create_text_item(210, 45, "fahrenheit", "°F")
+        self.create_text_item(210, 75, "percent_led", "%")
 
+        # Add controls for group selection and color change in row 3
+        self.create_controls(self.led_frame, row=3)
 
     def change_layout_mode(self):
         if self.layout_mode.get() == "big":
-            self.leds_indexes = leds_indexes
             self.config["layout_mode"] = "big"
             if self.config["display_mode"] not in display_modes:
                 print(f"Warning: Display mode {self.config['display_mode']} not compatible with big layout, switching to metrics.")
                 self.config["display_mode"] = "metrics"
-            self.create_big_layout()
         else:
             self.config["layout_mode"] = "small"
             if self.config["display_mode"] not in display_modes_small:
                 print(f"Warning: Display mode {self.config['display_mode']} not compatible with small layout, switching to alternate metrics.")
                 self.config["display_mode"] = "alternate_metrics"
-            self.leds_indexes = leds_indexes_small
-            self.create_small_layout()
+        self.show_layout(self.config["layout_mode"])
         self.write_config()
 
+    def show_layout(self, mode):
+        """Shows the widgets of a layout mode, built the first time and reused afterwards."""
+        if self.view_mode is not None:
+            self.views[self.view_mode] = {name: getattr(self, name, None) for name in VIEW_ATTRIBUTES}
+            self.led_frame.grid_remove()
+            self.config_frame.grid_remove()
+        if mode in self.views:
+            for name, value in self.views[mode].items():
+                setattr(self, name, value)
+            self.led_frame.grid()
+            self.config_frame.grid()
+            self.display_mode.set(self.config["display_mode"])
+        else:
+            self.layout = load_layout(mode)
+            if mode == "big":
+                self.create_big_layout()
+            else:
+                self.create_small_layout()
+        self.view_mode = mode
+
     def set_default_config(self):
         self.config = default_config.copy()
         self.write_config()
@@ -156,88 +209,42 @@ class LEDDisplayUI:
         self.config_frame = self.create_config_panel(self.layout_frame)
         print("Default config set.")
 
-    def update_ui_loop(self):
-        while True:
-            try:
-                current_time = time.time()
-                elapsed_time = (current_time - self.start_time)%(self.cycle_duration*2)
-                colors = np.array(self.config[self.get_color_key()]["colors"])
-                for index, color_str in enumerate(colors):
-                    color = color_str
-                    if color.lower() == "random":
-                        color = get_random_color()
-                    elif color.startswith("wave_"):
-                        wave_type, gradient = color.split(";", 1)
-                        colors_list = gradient.split('-')
-                        num_colors = len(colors_list)
-
-                        if num_colors >= 2:
-                            if colors_list[0] != colors_list[-1]:
-                                colors_list.append(colors_list[0])
-                            
-                            num_segments = len(colors_list) - 1
-                            total_duration = self.cycle_duration
-                            
-                            if wave_type == "wave_ltr":
-                                phase_shift = (index / self.number_of_leds) * total_duration
-                            else: # wave_rtl
-                                phase_shift = ((self.number_of_leds - index) / self.number_of_leds) * total_duration
-                            
-                            time_in_cycle = ((current_time - self.start_time) + phase_shift) % total_duration
-                            
-                            if num_segments > 0:
-                                segment_duration = total_duration / num_segments
-                                segment_index = min(int(time_in_cycle / segment_duration), num_segments - 1)
-                                
-                                start_color = colors_list[segment_index]
-                                end_color = colors_list[segment_index + 1]
-                                
-                                time_in_segment = time_in_cycle - (segment_index * segment_duration)
-                                if segment_duration > 0:
-                                    factor = time_in_segment / segment_duration
-                                else:
-                                    factor = 0
-                                color = interpolate_color(start_color=start_color, end_color=end_color, factor=factor)
-                            else:
-                                color = colors_list[0]
-                        else:
-                            color = colors_list[0]
-                    elif "-" in color:
-                        split_color = color.split("-")
-                        if len(split_color) == 3:
-                            start_color, end_color, metric = split_color
-                            factor=elapsed_time/(self.cycle_duration*2)
-                            color = interpolate_color(start_color=start_color, end_color=end_color, factor=factor)
-                        else:
-                            colors_list = split_color
-                            num_colors = len(colors_list)
-                            
-                            if num_colors >= 2:
-                                # Add first color to the end to make a loop
-                                if colors_list[0] != colors_list[-1]:
-                                    colors_list.append(colors_list[0])
-                                
-                                num_segments = len(colors_list) - 1
-                                total_duration = self.cycle_duration
-                                time_in_cycle = (current_time - self.start_time) % total_duration
-                                
-                                segment_duration = total_duration / num_segments
-                                segment_index = min(int(time_in_cycle / segment_duration), num_segments - 1)
-                                
-                                start_color = colors_list[segment_index]
-                                end_color = colors_list[segment_index + 1]
-                                
-                                time_in_segment = time_in_cycle - (segment_index * segment_duration)
-                                factor = time_in_segment / segment_duration
-                                
-                                color = interpolate_color(start_color=start_color, end_color=end_color, factor=factor)
-                            else:
-                                color = colors_list[0]
-
-                    self.set_ui_color(index, color="#"+color)
-            except Exception as e:
-                print(f"Error in update_ui_loop: {e}")
-            time.sleep(self.update_interval)
+    def update_preview(self):
+        """Renders the preview colors and repaints the LEDs whose color changed. Runs on the Tk thread."""
+        try:
+            self.engine.load(self.config, self.config_version)
+            metrics = self.preview_metrics()
+            # Same engine and clock as the controller, so the preview shows what the device shows
+            colors = to_hex_colors(self.engine.colors(self.get_color_key(), metrics, time.monotonic()))
+            for index, item in enumerate(self.led_items):
+                if item is None:
+                    continue
+                color = "#" + colors[index]
+                if color != self.shown_colors[index]:
+                    self.preview.itemconfigure(item, fill=color)
+                    self.shown_colors[index] = color
+        except Exception as e:
+            print(f"Error in update_preview: {e}")
+        self.root.after(int(self.update_interval * 1000), self.update_preview)
+
+    def preview_metrics(self):
+        """Metric values for the preview, from the source picked by "preview_metrics"."""
+        if self.metrics is not None:
+            return self.metrics.get_metrics(self.engine.temp_unit)
+        if self.metrics_source == "daemon":
+            now = time.monotonic()
+            if self.daemon_polled is None or now - self.daemon_polled >= self.daemon_poll_interval:
+                self.daemon_polled = now
+                try:
+                    self.daemon_metrics = read_daemon_metrics(self.config.get("control_socket"), self.engine.temp_unit)
+                    self.daemon_error = None
+                except OSError as e:
+                    if self.daemon_error is None:
+                        print(f"Controller not reachable, previewing with sample values: {e}")
+                    self.daemon_metrics, self.daemon_error = None, e
+            if self.daemon_metrics is not None:
+                return self.daemon_metrics
+        return dict(PREVIEW_METRICS)
 
     def load_config(self):
         try:
@@ -248,10 +255,14 @@ class LEDDisplayUI:
             return None
         
     def get_index(self, led_key, index=None):
-        if index is None or isinstance(self.leds_indexes[led_key],int):
-            return self.leds_indexes[led_key]
-        else:
-            return self.leds_indexes[led_key][index]
+        return self.layout.index(led_key, index)
+
+    def register_led(self, led_key, item, index=None):
+        if led_key in self.layout:
+            if index is None or led_key in self.layout.scalars or index < len(self.layout.groups[led_key]):
+                led_index = self.layout.index(led_key, index)
+                if led_index < self.number_of_leds:
+                    self.led_items[led_index] = item
 
     def get_color_key(self):
         if self.layout_mode.get() == "big":
@@ -269,141 +280,62 @@ class LEDDisplayUI:
             print("Config not loaded. Cannot set color.")
 
     def write_config(self):
+        self.config_version += 1
         try:
             with open(self.config_path, 'w') as f:
                 json.dump(self.config, f, indent=4)
         except Exception as e:
             print(f"Error writing config: {e}")
 
-    def set_ui_color(self, index, color):
-        if self.leds_ui[index] is not None:
-            if isinstance(self.leds_ui[index],(ttk.Label)):
-                self.leds_ui[index].config(foreground=color)
-            else:
-                self.leds_ui[index].config(background=color)
-
-    def create_device_frame(self, root, device_name, row):
-        frame = ttk.LabelFrame(root, text=device_name.upper(), padding=(10, 10))
-        frame.grid(row=row, column=0, padx=10, pady=10)
-
-        device_led_frame = ttk.Frame(frame)
-        device_led_frame.grid(row=0, column=0, padx=0, pady=0)
-        self.create_label(device_led_frame, device_name+"_led", device_name.upper()[0], 0, 0, index=int(device_name=="cpu"))
-        self.create_label(device_led_frame, device_name+"_led", device_name.upper()[1:], 0, 1, index=int(device_name!="cpu"))
-
-        temp_frame = ttk.LabelFrame(frame, text=device_name.upper()+" temp", padding=(10, 10))
-        temp_frame.grid(row=1, column=0, padx=10, pady=10)
+    def create_preview(self, root, width, height, row):
+        preview = tk.Canvas(root, width=width, height=height, highlightthickness=0, cursor="hand2")
+        preview.grid(row=row, column=0, padx=10, pady=10)
+        return preview
 
-        # Add temperature unit selection
-        unit_frame = ttk.Frame(frame)
-        unit_frame.grid(row=1, column=1, padx=5, pady=5)
-        
-        # Create clickable labels for °C and °F
-        self.create_label(unit_frame, device_name+"_celsius", "°C", 0, 0)
-        self.create_label(unit_frame, device_name+"_fahrenheit", "°F", 1, 0)
-
-        usage_frame = ttk.LabelFrame(frame, text=device_name.upper()+" usage", padding=(10, 10))
-        usage_frame.grid(row=1, column=2, padx=10, pady=10)
-
-        # Create LED layout for CPU and GPU
-        self.create_segmented_digit_layout(temp_frame, device_name+"_temp")
-        self.create_usage_frame(usage_frame, device_name+"_usage")
-        
-        self.create_label(frame, device_name+"_percent_led", "%", 1, 3)
-        return frame
-
-    def create_label(self, parent_frame, led_key, text, row, column, index=None):
-        unit_style = {"font": ("Arial", 20), "cursor": "hand2"}
-        label = ttk.Label(parent_frame, text=text, **unit_style)
-        label.grid(row=row, column=column, padx=0, pady=5)
-        label.bind(
+    def create_led_item(self, item, led_key, index=None):
+        self.preview.tag_bind(
+            item,
             "<Button-1>",
-            lambda event,
-            led_key=led_key, led_index=index: self.change_led_color(
-                led_key, index=led_index
-            ),
+            lambda event, led_key=led_key, led_index=index: self.change_led_color(led_key, index=led_index),
         )
-        if index is not None:
-            if led_key in self.leds_indexes and isinstance(self.leds_indexes[led_key], list):
-                if index < len(self.leds_indexes[led_key]):
-                    self.leds_ui[self.leds_indexes[led_key][index]] = label
-            elif led_key in self.leds_indexes:
-                self.leds_ui[self.leds_indexes[led_key]] = label
-        else:
-            if led_key in self.leds_indexes:
-                self.leds_ui[self.leds_indexes[led_key]] = label
-
-    def create_usage_frame(self, frame, label):
-        index = 0
-        one_frame = ttk.Frame(frame, padding=(5, 5))
-        one_frame.grid(row=1, column=0, padx=5, pady=5)
-        for one_index in range(2,0,-1):
-            self.create_segment(
-                one_frame,
-                label,
-                led_index=index,
-                row=one_index,
-                column=0,
-                pady=4,
-            )
-            index+=1
-        
-        digit_frame = ttk.Frame(frame, padding=(5, 5))
-        digit_frame.grid(row=1, column=1, padx=0, pady=0)
-        self.create_segmented_digit_layout(digit_frame, label, number_of_digits=2, index=index)
-
-    def create_segment(self, parent_frame, label, led_index, row, column, orientation="Vertical", pady=0, padx=0):
-        if orientation == "Vertical":
-            segment = tk.Canvas(
-                parent_frame,
-                width=5,
-                height=20,
-                highlightthickness=0,
-            )
-        else:
-            segment = tk.Canvas(
-                parent_frame,
-                width=20,
-                height=5,
-                highlightthickness=0,
-            )
-        segment.grid(
-            row=row,
-            column=column,
-            padx=padx,
-            pady=pady,
-        )
-        segment.bind(
-            "<Button-1>",
-            lambda event,
-            led_key=label, led_index=led_index: self.change_led_color(
-                led_key, index=led_index
-            ),
-        )
-        if led_index is not None and label in self.leds_indexes:
-            if isinstance(self.leds_indexes[label], list) and led_index < len(self.leds_indexes[label]):
-                self.leds_ui[self.leds_indexes[label][led_index]] = segment
-            elif isinstance(self.leds_indexes[label], int):
-                self.leds_ui[self.leds_indexes[label]] = segment
+        self.register_led(led_key, item, index)
+
+    def create_text_item(self, x, y, led_key, text, index=None):
+        item = self.preview.create_text(x, y, text=text, anchor="w", font=("Arial", 20), fill=OFF_COLOR)
+        self.create_led_item(item, led_key, index)
 
-    def create_segmented_digit_layout(self, frame, label, number_of_digits=3, index = 0):
+    def create_segment_item(self, x, y, led_key, index, rectangle):
+        x0, y0, x1, y1 = rectangle
+        item = self.preview.create_rectangle(x + x0, y + y0, x + x1, y + y1, width=0, fill=OFF_COLOR)
+        self.create_led_item(item, led_key, index)
+
+    def create_digit_items(self, x, y, led_key, number_of_digits=3, index=0):
         for digit_index in range(number_of_digits):
-            digit_frame = ttk.Frame(frame, padding=(5, 5))
-            digit_frame.grid(row=1, column=digit_index, padx=5, pady=5)
-
-            # Create 7 segments for the digit
-            for segment_name in segmented_digit_layout.keys():
-                self.create_segment(
-                    digit_frame,
-                    label,
-                    led_index=index,
-                    row=segmented_digit_layout[segment_name]["row"],
-                    column=segmented_digit_layout[segment_name]["column"],
-                    orientation=segmented_digit_layout[segment_name]["orientation"],
-                    pady=segmented_digit_layout[segment_name]["pady"],
-                    padx=segmented_digit_layout[segment_name]["padx"],
-                )
-                index+=1
+            # 7 segments per digit
+            for rectangle in segmented_digit_layout.values():
+                self.create_segment_item(x + digit_index * DIGIT_PITCH, y, led_key, index, rectangle)
+                index += 1
+        return index
+
+    def create_device_items(self, device_name, y):
+        caption = {"anchor": "w", "font": ("Arial", 9), "fill": "#606060"}
+        self.preview.create_text(10, y, text=device_name.upper(), **caption)
+        self.preview.create_text(70, y, text="temp", **caption)
+        self.preview.create_text(265, y, text="usage", **caption)
+        # The "C" of CPU is the second cpu_led, the "G" of GPU the first gpu_led
+        self.create_text_item(10, y + 40, device_name + "_led", device_name.upper()[0], index=int(device_name == "cpu"))
+        self.create_text_item(28, y + 40, device_name + "_led", device_name.upper()[1:], index=int(device_name != "cpu"))
+
+        self.create_digit_items(70, y + 15, device_name + "_temp")
+        self.create_text_item(215, y + 28, device_name + "_celsius", "°C")
+        self.create_text_item(215, y + 58, device_name + "_fahrenheit", "°F")
+
+        # Leading "1" of the usage: lower segment first
+        one = (0, 0, SEGMENT_WIDTH, SEGMENT_LENGTH)
+        self.create_segment_item(265, y + 15 + 2 * SEGMENT_WIDTH + SEGMENT_LENGTH, device_name + "_usage", 0, one)
+        self.create_segment_item(265, y + 15 + SEGMENT_WIDTH, device_name + "_usage", 1, one)
+        self.create_digit_items(285, y + 15, device_name + "_usage", number_of_digits=2, index=2)
+        self.create_text_item(365, y + 43, device_name + "_percent_led", "%")
 
     def create_display_mode(self, root, display_modes, row=0, column=0):
         display_mode_frame = ttk.LabelFrame(root, text="Choose display mode :", padding=(10, 10))
@@ -445,7 +377,7 @@ class LEDDisplayUI:
         group_dropdown = ttk.Combobox(
             controls_frame, textvariable=self.group_var, state="readonly"
         )
-        group_dropdown["values"] = [led_key.upper() for led_key in self.leds_indexes]
+        group_dropdown["values"] = [led_key.upper() for led_key in self.layout.groups]
         
         group_dropdown.grid(row=0, column=0, padx=5, pady=5)
 
@@ -585,20 +517,17 @@ class LEDDisplayUI:
 
     def change_group_color(self):
         group_name = self.group_var.get().lower()
-        if group_name in self.leds_indexes:
+        if group_name in self.layout:
             result = self.custom_color_popup(initial_color=self.get_color(group_name, index=0))
             if result:
-                if isinstance(self.leds_indexes[group_name], int):
-                    self.set_color(self.leds_indexes[group_name], result)
-                else:
-                    for index in self.leds_indexes[group_name]:
-                        self.set_color(index, result)
+                for index in self.layout.groups[group_name]:
+                    self.set_color(index, result)
             self.write_config()
         else:
             print("Invalid group selected.")
 
     def change_led_color(self, led_key, index=None):
-        if led_key in self.leds_indexes:
+        if led_key in self.layout:
             led_index = self.get_index(led_key, index)
             result = self.custom_color_popup(initial_color=self.get_color(led_key, index))
             if result:
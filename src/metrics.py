@@ -3,17 +3,46 @@ import re
 import psutil
 import time
 import os
+import sys
 import json
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+import shutil
+from functools import partial
+from gpu_backends import NvmlBackend, NvidiaSmiStream, AmdGpuBackend, GpuSelection
+from sysfs_sensors import find_sensor
+from metrics_history import MetricHistory, history_settings
+from probe_cache import ProbeCache, system_fingerprint
+from providers import create_providers
 
-try:
-    import pyamdgpuinfo
-except Exception as e:
-    print("pyamdgpuinfo cannot start : ",str(e))
+# Backends tried for each metric, best first; Metrics._open_backend resolves the names
+CPU_BACKENDS = {
+    'cpu_temp': ['sysfs', 'psutil', 'thermal_zone', 'wmi', 'wintmp', 'vcgencmd'],
+    'cpu_usage': ['psutil'],
+}
+GPU_BACKENDS = {
+    'nvidia': {
+        'gpu_temp': ['nvml', 'nvidia_smi_stream', 'nvidia_smi', 'wintmp'],
+        'gpu_usage': ['nvml', 'nvidia_smi_stream', 'nvidia_smi'],
+    },
+    'amd': {
+        'gpu_temp': ['amdgpuinfo'],
+        'gpu_usage': ['amdgpuinfo'],
+    },
+}
+WINDOWS_BACKENDS = {'wmi', 'wintmp'}
 
 
+# Immutable view of the latest sampled values. `values`, `sampled_at` and `stats`
+# ((min, max, mean) of each metric's history) are read-only mappings; the sampler
+# thread replaces the whole snapshot instead of mutating it, so readers never need a lock.
+MetricsSnapshot = namedtuple('MetricsSnapshot', ['values', 'sampled_at', 'timestamp', 'stats'])
+
 
 class Metrics:
-    def __init__(self, update_interval=0.5):
+    def __init__(self, update_interval=0.5, config_path=None):
+        """Takes the GPU, CPU sensor and provider settings from `config_path`, $DIGITAL_LCD_CONFIG or config.json by default."""
         self.metrics_functions = {
             'cpu_temp': None,
             'gpu_temp': None,
@@ -26,92 +55,223 @@ class Metrics:
             'cpu_usage': 0,
             'gpu_usage': 0
         }
-        config_path = os.environ.get('DIGITAL_LCD_CONFIG', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json'))
+        if config_path is None:
+            config_path = os.environ.get('DIGITAL_LCD_CONFIG', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json'))
         try:
             with open(config_path, 'r') as f:
                 config = json.load(f)
                 self.gpu_vendor = config.get('gpu_vendor', 'nvidia')
+                self.cpu_temp_sensor = config.get('cpu_temp_sensor')
+                self.gpu_selection = GpuSelection.from_config(config)
+                provider_selection = config.get('metric_providers')
         except Exception as e:
             print(f"Could not load config to get gpu_vendor, defaulting to nvidia: {e}")
             self.gpu_vendor = 'nvidia'
+            self.cpu_temp_sensor = None
+            self.gpu_selection = GpuSelection()
+            provider_selection = None
 
-        try:
-            device_count = pyamdgpuinfo.detect_gpus()
-            if device_count > 0:
-                self.gpu = pyamdgpuinfo.get_gpu(0)
-            else:
-                print(f"No AMD GPU detected.")
-                self.gpu = -1
-        except:
-            print("pyamdgpuinfo not installed. GPU temperature will not be available.")
-            self.gpu = None
-
-        candidates =  {
-            'cpu_temp': [get_cpu_temp_psutils,get_cpu_temp_linux,get_cpu_temp_windows_wmi,get_cpu_temp_windows_wintmp,get_cpu_temp_raspberry_pi],
-            'gpu_temp': [],
-            'cpu_usage': [get_cpu_usage],
-            'gpu_usage': []
-        }
+        self.update_interval = update_interval # seconds
+        self.cpu_sensor = None
+        self.nvml = None
+        self.nvidia_smi = None
+        self.amd = None
+        self._unavailable = set()  # Backends that failed to open
 
-        if self.gpu_vendor == 'nvidia':
-            candidates['gpu_temp'] = [get_gpu_temp_nvidia, get_gpu_temp_wintemp]
-            candidates['gpu_usage'] = [get_gpu_usage_nvml, get_gpu_usage_nvidia_smi]
-        elif self.gpu_vendor == 'amd':
-            candidates['gpu_temp'] = [self.get_gpu_temp_amdgpuinfo]
-            candidates['gpu_usage'] = [self.get_gpu_usage_amd]
-        for metric, functions in candidates.items():
-            for function in functions:
+        candidates = dict(CPU_BACKENDS)
+        candidates.update(GPU_BACKENDS.get(self.gpu_vendor, {'gpu_temp': [], 'gpu_usage': []}))
+        if sys.platform != 'win32':
+            candidates = {metric: [name for name in names if name not in WINDOWS_BACKENDS] for metric, names in candidates.items()}
+        # Go straight to the backends that worked last time on this system, probe the rest only if they fail
+        self.probe_cache = ProbeCache()
+        probe_key = system_fingerprint(self.gpu_vendor, self.cpu_temp_sensor, self.gpu_selection.key())
+        cached = self.probe_cache.load(probe_key)
+        self.backends = {}  # Metric -> name of the backend reading it
+        for metric, names in candidates.items():
+            if metric in cached and cached[metric] is None:
+                names = []  # Nothing worked last time on this system, don't wait on the probes again
+            elif cached.get(metric) in names:
+                names = [cached[metric]] + [name for name in names if name != cached[metric]]
+            for name in names:
+                function = self._open_backend(metric, name)
+                if function is None:
+                    continue
                 try:
                     result = function()
-                    if result is not None:
-                        self.metrics[metric] = int(result)
-                        self.metrics_functions[metric] = function
-                        break
-                except Exception as e:
+                except Exception:
                     continue
+                if result is not None:
+                    self.metrics[metric] = int(result)
+                    self.metrics_functions[metric] = function
+                    self.backends[metric] = name
+                    break
             if self.metrics_functions[metric] is None:
                 print(f"Warning: No suitable function found for {metric}.")
+        if self.nvml is not None:
+            # Power, fan and memory come with the same NVML sample
+            for metric in self.nvml.extra_metrics:
+                result = self.nvml.sample().get(metric)
+                self.metrics_functions[metric] = self.nvml.getter(metric)
+                self.metrics[metric] = int(result) if result is not None else 0
+                self.backends[metric] = 'nvml'
+        probed = {metric: self.backends.get(metric) for metric in candidates}  # None: no backend available
+        probed.update(self.backends)
+        if probed != cached:
+            self.probe_cache.save(probe_key, probed)
+
+        # Any other metric comes from the provider registry; metrics with a backend above keep it
+        self.default_intervals = {}  # Refresh interval of the provider metrics
+        self.providers = create_providers(provider_selection)
+        for provider in self.providers:
+            for metric in provider.metrics:
+                if self.metrics_functions.get(metric) is not None:
+                    continue
+                self.metrics_functions[metric] = provider.getter(metric)
+                self.metrics[metric] = 0
+                self.default_intervals[metric] = provider.interval
         self.last_update = time.time()
-        self.update_interval = update_interval # seconds
+        self.intervals = {}  # Per metric refresh interval, defaults to update_interval
+        self.sampled_at = {metric: time.monotonic() for metric in self.metrics}
+        self.history = {metric: MetricHistory() for metric in self.metrics}
+        self._history_lock = threading.Lock()  # configure_smoothing runs outside the sampler thread
+        self.snapshot = None
+        self._publish()
+        self._sampler = None
+        self._stop_sampler = threading.Event()
+
+    def _open_backend(self, metric, name):
+        """Returns the function reading `metric` with backend `name`, None if it isn't available."""
+        if name in self._unavailable:
+            return None
+        function = None
+        if name == 'sysfs':
+            # Resolve the CPU sensor once ("chip:label", e.g. "k10temp:Tctl") and keep it open
+            self.cpu_sensor = find_sensor(self.cpu_temp_sensor)
+            if self.cpu_sensor is not None:
+                function = self.cpu_sensor.read
+            elif self.cpu_temp_sensor:
+                print(f"Warning: CPU temperature sensor {self.cpu_temp_sensor} not found.")
+        elif name == 'psutil':
+            function = get_cpu_temp_psutils if metric == 'cpu_temp' else get_cpu_usage
+        elif name == 'thermal_zone':
+            function = get_cpu_temp_linux
+        elif name == 'wmi':
+            function = get_cpu_temp_windows_wmi
+        elif name == 'wintmp':
+            function = get_cpu_temp_windows_wintmp if metric == 'cpu_temp' else get_gpu_temp_wintemp
+        elif name == 'vcgencmd':
+            function = get_cpu_temp_raspberry_pi
+        elif name == 'nvml':
+            if self.nvml is None:
+                self.nvml = NvmlBackend.create(selection=self.gpu_selection)
+            if self.nvml is not None:
+                function = self.nvml.get_temperature if metric == 'gpu_temp' else self.nvml.get_usage
+        elif name == 'nvidia_smi_stream':
+            # No pynvml: read nvidia-smi's streaming output instead of forking it per sample
+            if self.nvidia_smi is None and shutil.which('nvidia-smi'):
+                self.nvidia_smi = NvidiaSmiStream.create(interval=self.update_interval, selection=self.gpu_selection)
+            if self.nvidia_smi is not None:
+                function = self.nvidia_smi.get_temperature if metric == 'gpu_temp' else self.nvidia_smi.get_usage
+        elif name == 'nvidia_smi':
+            function = partial(query_nvidia_smi, metric, self.gpu_selection)
+        elif name == 'amdgpuinfo':
+            if self.amd is None:
+                self.amd = AmdGpuBackend.create(selection=self.gpu_selection)
+            if self.amd is not None:
+                function = self.amd.get_temperature if metric == 'gpu_temp' else self.amd.get_usage
+        if function is None:
+            self._unavailable.add(name)
+        return function
+
+    def _sample(self, metric):
+        function = self.metrics_functions[metric]
+        if function is not None:
+            try:
+                result = function()
+                if result is None:
+                    self.metrics[metric] = 0
+                else:
+                    with self._history_lock:
+                        self.metrics[metric] = self.history[metric].push(result)
+            except Exception as e:
+                print(f"Error getting {metric}: {e}")
+        self.sampled_at[metric] = time.monotonic()
+
+    def _publish(self):
+        self.snapshot = MetricsSnapshot(
+            MappingProxyType(dict(self.metrics)),
+            MappingProxyType(dict(self.sampled_at)),
+            time.monotonic(),
+            MappingProxyType({metric: history.stats() for metric, history in self.history.items()}),
+        )
+
+    def configure_smoothing(self, smoothing):
+        """
+        Sets the smoothing of each metric from the "metrics_smoothing" config object,
+        e.g. {"cpu_usage": {"method": "ema", "alpha": 0.3, "hysteresis": 1}}. Metrics
+        without an entry are shown unsmoothed. A history keeps its samples unless
+        its size changes.
+        """
+        with self._history_lock:
+            for metric in self.metrics:
+                settings = history_settings(smoothing.get(metric, {}))
+                size = settings.pop("size")
+                if size != self.history[metric].size:
+                    self.history[metric] = MetricHistory(size, **settings)
+                else:
+                    self.history[metric].configure(**settings)
+
+    def start(self):
+        """Start refreshing metrics in a background thread, so get_metrics never waits on a sensor."""
+        if self._sampler is None:
+            self._stop_sampler.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name="metrics-sampler", daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        if self._sampler is not None:
+            self._stop_sampler.set()
+            self._sampler.join()
+            self._sampler = None
+
+    def _sample_loop(self):
+        next_sample = {metric: 0 for metric in self.metrics_functions}
+        while not self._stop_sampler.is_set():
+            now = time.monotonic()
+            sampled = False
+            for metric in self.metrics_functions:
+                if now >= next_sample[metric]:
+                    self._sample(metric)
+                    next_sample[metric] = now + self.intervals.get(metric, self.default_intervals.get(metric, self.update_interval))
+                    sampled = True
+            if sampled:
+                self.last_update = time.time()
+                self._publish()
+            # Wake up at least every half second so interval changes are picked up
+            timeout = min(next_sample.values()) - time.monotonic()
+            self._stop_sampler.wait(max(0, min(timeout, 0.5)))
+
+    def snapshot_age(self, metric=None):
+        """Seconds since the snapshot (or a single metric in it) was sampled."""
+        snapshot = self.snapshot
+        if metric is None:
+            return time.monotonic() - snapshot.timestamp
+        return time.monotonic() - snapshot.sampled_at[metric]
 
     def get_metrics(self, temp_unit):
-        if time.time() - self.last_update < self.update_interval:
-            metrics = self.metrics.copy()
-        else:
-            for metric, function in self.metrics_functions.items():
-                if function is not None:
-                    try:
-                        result = function()
-                        if result is None:
-                            self.metrics[metric] = 0
-                        else:
-                            self.metrics[metric] = int(result)
-                    except Exception as e:
-                        print(f"Error getting {metric}: {e}")
+        if self._sampler is None and time.time() - self.last_update >= self.update_interval:
+            # No background sampler: refresh inline once the cache expired
+            for metric in self.metrics_functions:
+                self._sample(metric)
             self.last_update = time.time()
-            metrics = self.metrics.copy()
+            self._publish()
+        metrics = dict(self.snapshot.values)
 
         for device in ["cpu", "gpu"]:
             if temp_unit[device] == "fahrenheit":
                 metrics[f"{device}_temp"] = int(metrics[f"{device}_temp"] * 9 / 5 + 32)
         return metrics
 
-    def get_gpu_usage_amd(self):
-        try:
-            if self.gpu is None:
-                return None
-            else:
-                return int(self.gpu.query_load()*100)
-        except :
-            return None
-        
-    def get_gpu_temp_amdgpuinfo(self):
-        try:
-            return self.gpu.query_temperature()
-        except Exception as e:
-            print(f"Error getting AMD GPU temperature: {e}")
-            return None
-
 def get_cpu_temp_psutils():
     try:
         if hasattr(psutil, 'sensors_temperatures'):
@@ -152,30 +312,24 @@ def get_cpu_temp_raspberry_pi():
     except Exception:
         return None
 
-def get_gpu_temp_nvidia():
-    # Try NVIDIA GPU first
+def query_nvidia_smi(metric, selection):
+    """`metric` of the selected GPUs, aggregated, from a one-off nvidia-smi query of all of them."""
     try:
-        # Try using pynvml library
-        try:
-            from pynvml import nvmlInit, nvmlDeviceGetCount, nvmlDeviceGetHandleByIndex, \
-                            nvmlDeviceGetTemperature, NVML_TEMPERATURE_GPU, nvmlShutdown
-            
-            nvmlInit()
-            device_count = nvmlDeviceGetCount()
-            
-            if device_count > 0:
-                handle = nvmlDeviceGetHandleByIndex(0)
-                temp = nvmlDeviceGetTemperature(handle, NVML_TEMPERATURE_GPU)
-                nvmlShutdown()
-                return temp
-            
-            nvmlShutdown()
-        except:
-            # Try using nvidia-smi command
-            output = subprocess.check_output(['nvidia-smi', '--query-gpu=temperature.gpu', '--format=csv,noheader']).decode()
-            return float(output.strip().split('\n')[0])
-    except:
+        output = subprocess.check_output(
+            ['nvidia-smi', '--query-gpu=index,pci.bus_id,temperature.gpu,utilization.gpu',
+                '--format=csv,noheader,nounits']
+        ).decode()
+    except Exception:
         return None
+    samples = []
+    for line in output.strip().split('\n'):
+        fields = [field.strip() for field in line.split(',')]
+        try:
+            if len(fields) == 4 and selection.selects(int(fields[0]), fields[1]):
+                samples.append({'gpu_temp': float(fields[2]), 'gpu_usage': float(fields[3])})
+        except ValueError:
+            continue
+    return selection.aggregate(samples).get(metric)
 
 def get_gpu_temp_wintemp():
     try:
@@ -191,29 +345,3 @@ def get_cpu_usage():
     except:
         print("Warning: Could not retrieve CPU usage.")
         return None
-
-def get_gpu_usage_nvidia_smi():
-    try: 
-        output = subprocess.check_output(
-            ['nvidia-smi', '--query-gpu=utilization.gpu',
-                '--format=csv,noheader']
-        ).decode().strip()
-        return int(output.split()[0])
-    except Exception:
-        return None
-    
-def get_gpu_usage_nvml():
-    try:
-        # NVIDIA GPUs using pynvml
-        from pynvml import (nvmlInit, nvmlShutdown,
-                        nvmlDeviceGetHandleByIndex,
-                        nvmlDeviceGetUtilizationRates)
-        nvmlInit()
-        try:
-            handle = nvmlDeviceGetHandleByIndex(0)
-            utilization = nvmlDeviceGetUtilizationRates(handle)
-            return int(utilization.gpu)
-        finally:
-            nvmlShutdown()
-    except:
-        return None
@@ -0,0 +1,143 @@
+import math
+import numpy as np
+
+SMOOTHING_METHODS = ("none", "ema", "mean")
+DEFAULT_HISTORY_SIZE = 120
+
+
+class _WindowExtreme:
+    """
+    Minimum (or maximum) of the last len(samples) samples of a ring buffer: a
+    monotonic queue of sample positions stored in a fixed array, amortized O(1)
+    per push and O(1) per query.
+    """
+
+    def __init__(self, samples, maximum=False):
+        self.samples = samples
+        self.size = len(samples)
+        self.positions = np.zeros(self.size, dtype=np.int64)
+        self.head = 0
+        self.length = 0
+        self.maximum = maximum
+
+    def push(self, position, value):
+        """Called before `value` is written to the buffer as sample number `position`."""
+        size = self.size
+        if self.length and self.positions[self.head] <= position - size:
+            self.head = (self.head + 1) % size  # Falls out of the buffer with this sample
+            self.length -= 1
+        while self.length:
+            last = self.samples[self.positions[(self.head + self.length - 1) % size] % size]
+            if (last <= value) if self.maximum else (last >= value):
+                self.length -= 1
+            else:
+                break
+        self.positions[(self.head + self.length) % size] = position
+        self.length += 1
+
+    def value(self):
+        return float(self.samples[self.positions[self.head] % self.size])
+
+
+class MetricHistory:
+    """
+    The last `size` samples of a metric in a preallocated ring buffer, their
+    smoothed value and the integer to display.
+
+    Smoothing is "none", "ema" (exponential moving average with weight `alpha`
+    for the new sample) or "mean" (mean of the last `window` samples). The
+    displayed integer only changes once the smoothed value is more than
+    `hysteresis` away from it, so a metric sitting between two values doesn't
+    flicker. push() is O(1) and writes into fixed arrays; minimum(), maximum()
+    and mean() over the buffer are O(1).
+    """
+
+    def __init__(self, size=DEFAULT_HISTORY_SIZE, method="none", alpha=0.5, window=5, hysteresis=0.0):
+        self.size = int(size)
+        if self.size < 1:
+            raise ValueError("history size must be at least 1")
+        self.samples = np.zeros(self.size, dtype=np.float64)
+        self._min = _WindowExtreme(self.samples)
+        self._max = _WindowExtreme(self.samples, maximum=True)
+        self.count = 0  # Samples pushed so far
+        self.total = 0.0  # Sum of the samples in the buffer
+        self.configure(method, alpha, window, hysteresis)
+
+    def configure(self, method="none", alpha=0.5, window=5, hysteresis=0.0):
+        if method not in SMOOTHING_METHODS:
+            raise ValueError(f"smoothing method must be one of {SMOOTHING_METHODS}, not {method!r}")
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be between 0 (excluded) and 1")
+        if not 1 <= window <= self.size:
+            raise ValueError(f"window must be between 1 and the history size ({self.size})")
+        if hysteresis < 0:
+            raise ValueError("hysteresis can't be negative")
+        self.method = method
+        self.alpha = float(alpha)
+        self.window = int(window)
+        self.hysteresis = float(hysteresis)
+        # Restart the smoothing from the samples already in the buffer
+        recent = self.samples[(self.count - np.arange(1, min(self.count, self.window) + 1)) % self.size]
+        self.window_total = float(recent.sum())
+        self.smoothed = float(self.samples[(self.count - 1) % self.size]) if self.count else None
+        self.shown = None
+
+    def push(self, value):
+        """Adds a sample and returns the integer to display."""
+        value = float(value)
+        position = self.count
+        index = position % self.size
+        if position >= self.window:
+            self.window_total -= self.samples[(position - self.window) % self.size]
+        if position >= self.size:
+            self.total -= self.samples[index]
+        self._min.push(position, value)
+        self._max.push(position, value)
+        self.samples[index] = value
+        self.count += 1
+        self.total += value
+        self.window_total += value
+        if index == self.size - 1:
+            # Resync the running sums once per lap so float errors can't pile up
+            self.total = float(self.samples.sum())
+            self.window_total = float(self.samples[(self.count - np.arange(1, min(self.count, self.window) + 1)) % self.size].sum())
+
+        if self.method == "ema" and self.smoothed is not None:
+            self.smoothed += self.alpha * (value - self.smoothed)
+        elif self.method == "mean":
+            self.smoothed = self.window_total / min(self.count, self.window)
+        else:
+            self.smoothed = value
+        if self.shown is None or abs(self.smoothed - self.shown) > self.hysteresis:
+            # Raw samples are truncated as they always were, smoothed ones rounded
+            self.shown = int(self.smoothed) if self.method == "none" else int(math.floor(self.smoothed + 0.5))
+        return self.shown
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def minimum(self):
+        return self._min.value() if self.count else None
+
+    def maximum(self):
+        return self._max.value() if self.count else None
+
+    def mean(self):
+        return self.total / len(self) if self.count else None
+
+    def stats(self):
+        """(min, max, mean) of the samples in the buffer, None if there are none yet."""
+        if not self.count:
+            return None
+        return self.minimum(), self.maximum(), self.mean()
+
+
+def history_settings(settings):
+    """MetricHistory keyword arguments of a "metrics_smoothing" entry of the config."""
+    return {
+        "size": int(settings.get("history", DEFAULT_HISTORY_SIZE)),
+        "method": settings.get("method", "none"),
+        "alpha": float(settings.get("alpha", 0.5)),
+        "window": int(settings.get("window", 5)),
+        "hysteresis": float(settings.get("hysteresis", 0.0)),
+    }
@@ -0,0 +1,69 @@
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import shutil
+from config_watcher import write_config
+from layout import default_cache_dir
+
+PROBE_CACHE_VERSION = 1
+
+# First line of each is the loaded driver's version; a driver update re-probes the GPU backends
+DRIVER_VERSION_FILES = [
+    "/proc/driver/nvidia/version",
+    "/sys/module/nvidia/version",
+    "/sys/module/amdgpu/version",
+]
+# Optional modules and commands of the backends; installing one re-probes the metrics that had none
+BACKEND_MODULES = ["pynvml", "pyamdgpuinfo", "wmi", "WinTmp"]
+BACKEND_COMMANDS = ["nvidia-smi", "vcgencmd"]
+
+
+def system_fingerprint(gpu_vendor, cpu_temp_sensor=None, gpus=None):
+    """
+    Hash of what the metric backends depend on: host, kernel, GPU driver versions,
+    the backends' modules and commands installed and the config.
+    """
+    drivers = {}
+    for path in DRIVER_VERSION_FILES:
+        try:
+            with open(path, 'r') as f:
+                drivers[path] = f.readline().strip()
+        except OSError:
+            pass
+    installed = [name for name in BACKEND_MODULES if importlib.util.find_spec(name) is not None]
+    installed += [name for name in BACKEND_COMMANDS if shutil.which(name)]
+    source = json.dumps([PROBE_CACHE_VERSION, platform.node(), platform.system(), platform.release(),
+                         drivers, installed, gpu_vendor, cpu_temp_sensor, gpus], sort_keys=True)
+    return hashlib.sha256(source.encode()).hexdigest()[:16]
+
+
+class ProbeCache:
+    """
+    The backend Metrics picked for each metric, saved with the system fingerprint
+    it was probed on. Later starts try those backends first and only probe the
+    others if they fail or the fingerprint changed. A metric saved as None had no
+    backend available and isn't probed again under the same fingerprint.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(default_cache_dir(), 'backends.json')
+
+    def load(self, key):
+        """metric -> backend name (None if there was none) saved for `key`, empty if nothing was saved."""
+        try:
+            with open(self.path, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(cache, dict) or cache.get("key") != key or not isinstance(cache.get("backends"), dict):
+            return {}
+        return cache["backends"]
+
+    def save(self, key, backends):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            write_config(self.path, {"key": key, "backends": backends})
+        except OSError as e:
+            print(f"Warning: could not cache the metric backends: {e}")
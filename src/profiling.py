@@ -0,0 +1,181 @@
+import datetime
+import os
+import signal
+import threading
+import time
+import numpy as np
+from layout import default_cache_dir
+
+# Stages of a frame of Controller.display(). Time spent in a nested stage (the
+# config reload inside update(), metrics read while drawing) is only counted there.
+PROFILE_STAGES = ("config", "update", "metrics", "colors", "render", "send")
+STAGE_INDEX = {stage: i for i, stage in enumerate(PROFILE_STAGES)}
+PERCENTILES = (50, 90, 99)
+
+_current = threading.local()  # StageProfiler of the render loop running in this thread
+
+
+def profiling_enabled(config):
+    """Stage timers are on with DIGITAL_LCD_PROFILE=1 in the environment or "profile": true in the config."""
+    return os.environ.get('DIGITAL_LCD_PROFILE', '') not in ('', '0') or bool((config or {}).get('profile', False))
+
+
+def _timed(stage, function):
+    def timed(*args, **kwargs):
+        profiler = getattr(_current, 'profiler', None)
+        if profiler is None:
+            return function(*args, **kwargs)
+        return profiler.measure(stage, function, args, kwargs)
+    timed.profiled_stage = stage
+    return timed
+
+
+class StageProfiler:
+    """
+    Times the stages of every frame of a render loop and logs their percentiles
+    over the last `window` frames every `log_interval` seconds.
+
+    install() wraps the stage methods once; the wrappers cost one thread-local
+    lookup when no profiler is running in the calling thread, which keeps the
+    Metrics shared by several render loops correct.
+    """
+
+    def __init__(self, name, window=1000, log_interval=60.0):
+        self.name = name
+        self.samples = np.zeros((window, len(PROFILE_STAGES)))  # Seconds per stage, one row per frame
+        self.frame = np.zeros(len(PROFILE_STAGES))
+        self.count = 0
+        self.log_interval = log_interval
+        self.next_log = time.monotonic() + log_interval
+        self._stack = []
+
+    def install(self, controller):
+        targets = [
+            ("config", controller, 'apply_config'),
+            ("update", controller, 'update'),
+            ("metrics", controller.metrics, 'get_metrics'),
+            ("colors", controller, 'get_config_colors'),
+            ("render", controller, 'render_mode'),
+            ("send", controller, 'send_packets'),
+        ]
+        for stage, owner, attribute in targets:
+            function = getattr(owner, attribute)
+            if getattr(function, 'profiled_stage', None) is None:
+                setattr(owner, attribute, _timed(stage, function))
+        return self
+
+    def measure(self, stage, function, args, kwargs):
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self._stack.pop()
+            self.frame[STAGE_INDEX[stage]] += elapsed - nested
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def begin_frame(self):
+        _current.profiler = self
+        self.frame[:] = 0
+
+    def end_frame(self):
+        self.samples[self.count % len(self.samples)] = self.frame
+        self.count += 1
+        now = time.monotonic()
+        if now >= self.next_log:
+            self.next_log = now + self.log_interval
+            print(self.summary())
+
+    def summary(self):
+        frames = min(self.count, len(self.samples))
+        if not frames:
+            return f"Stage timings of {self.name}: no frames yet"
+        values = np.percentile(self.samples[:frames], PERCENTILES, axis=0) * 1e3
+        maximum = self.samples[:frames].max(axis=0) * 1e3
+        stages = " | ".join(
+            f"{stage} {'/'.join(f'{value:.2f}' for value in values[:, i])}/{maximum[i]:.2f}"
+            for i, stage in enumerate(PROFILE_STAGES))
+        columns = "/".join(f"p{p}" for p in PERCENTILES)
+        return f"Stage timings of {self.name}, last {frames} frames (ms, {columns}/max): {stages}"
+
+
+class ProfileCapture:
+    """
+    On-demand cProfile of the render loops: SIGUSR1 starts a capture, bounded to
+    `max_seconds`, and SIGUSR2 writes it to `directory` as a .prof file per render
+    loop (read it with `python -m pstats`). The signal handlers only bump request
+    counters; each render loop acts on them between frames in its own thread.
+    """
+
+    def __init__(self, directory=None, max_seconds=60.0):
+        self.directory = directory or os.path.join(default_cache_dir(), 'profiles')
+        self.max_seconds = max_seconds
+        self.start_requests = 0
+        self.dump_requests = 0
+        self._local = threading.local()
+
+    def install_signals(self):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: self.request_start())
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self.request_dump())
+        return self
+
+    def request_start(self):
+        self.start_requests += 1
+
+    def request_dump(self):
+        self.dump_requests += 1
+
+    def poll(self):
+        """Starts, stops or writes this thread's capture as requested. Called between frames."""
+        state = self._local
+        if not hasattr(state, 'profile'):
+            state.profile = None
+            state.running = False
+            state.start_requests = self.start_requests
+            state.dump_requests = self.dump_requests
+        now = time.monotonic()
+        if state.start_requests != self.start_requests:
+            state.start_requests = self.start_requests
+            if not state.running:
+                self._start(state, now)
+        if state.running and now - state.started_at >= self.max_seconds:
+            state.profile.disable()
+            state.running = False
+            print(f"Profiling of {threading.current_thread().name} stopped after {self.max_seconds:g}s, send SIGUSR2 to write it")
+        if state.dump_requests != self.dump_requests:
+            state.dump_requests = self.dump_requests
+            self._dump(state)
+
+    def _start(self, state, now):
+        import cProfile  # Only needed once a capture is requested
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Python 3.12+ profiles every thread from one capture, another loop already started it
+            print(f"Not profiling {threading.current_thread().name}: {e}")
+            return
+        state.profile = profile
+        state.running = True
+        state.started_at = now
+        print(f"Profiling {threading.current_thread().name} for up to {self.max_seconds:g}s")
+
+    def _dump(self, state):
+        if state.profile is None:
+            print(f"No profile of {threading.current_thread().name} to write, send SIGUSR1 first")
+            return
+        if state.running:
+            state.profile.disable()
+            state.running = False
+        name = threading.current_thread().name.replace(os.sep, '_')
+        stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, f"profile-{os.getpid()}-{name}-{stamp}.prof")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            state.profile.dump_stats(path)
+            print(f"Profile written to {path}")
+        except OSError as e:
+            print(f"Error writing the profile: {e}")
+        state.profile = None
@@ -0,0 +1,276 @@
+import glob
+import os
+import time
+from sysfs_sensors import SysfsSensor, list_temperature_sensors
+
+ENTRY_POINT_GROUP = "digital_lcd.providers"
+PROVIDER_COSTS = ("low", "high")
+
+
+class MetricProvider:
+    """
+    A source of one or more metrics, all served by a single read. Subclasses set:
+        name: unique name, used in the "metric_providers" config list
+        metrics: names of the metrics read() returns
+        cost: "low" providers are enabled by default, "high" ones only when listed
+        interval: default refresh interval of their metrics, in seconds
+        bounds: default (min, max) of their metrics for "start-end-metric" gradients
+    and implement read(), returning {metric: value or None}. available() tells
+    whether the source exists on this system.
+
+    Third-party providers register a subclass under the "digital_lcd.providers"
+    entry point group.
+    """
+
+    name = None
+    metrics = ()
+    cost = "low"
+    interval = 1.0
+    bounds = {}
+    max_age = 0.1  # Metrics read within this many seconds of each other share a read
+
+    _sample = None
+    _sample_time = None
+
+    def available(self):
+        return True
+
+    def read(self):
+        raise NotImplementedError
+
+    def sample(self):
+        now = time.monotonic()
+        if self._sample is None or now - self._sample_time >= self.max_age:
+            self._sample = self.read()
+            self._sample_time = now
+        return self._sample
+
+    def getter(self, metric):
+        """Returns a function reading `metric` from the shared sample."""
+        return lambda: self.sample().get(metric)
+
+
+_registry = {}
+_entry_points_loaded = False
+
+
+def register_provider(cls):
+    """Class decorator adding a MetricProvider to the registry."""
+    if not cls.name or not cls.metrics:
+        raise ValueError(f"provider {cls.__name__} must set a name and its metrics")
+    if cls.cost not in PROVIDER_COSTS:
+        raise ValueError(f"provider {cls.name} cost must be one of {PROVIDER_COSTS}")
+    _registry[cls.name] = cls
+    return cls
+
+
+def _load_entry_points():
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    try:
+        from importlib.metadata import entry_points
+        try:
+            found = entry_points(group=ENTRY_POINT_GROUP)
+        except TypeError:
+            # Python 3.8 and 3.9: no selection by keyword, a dict of the groups instead
+            found = entry_points().get(ENTRY_POINT_GROUP, [])
+    except Exception as e:
+        print(f"Warning: could not list metric provider plugins: {e}")
+        return
+    for entry_point in found:
+        try:
+            register_provider(entry_point.load())
+        except Exception as e:
+            print(f"Warning: could not load metric provider {entry_point.name}: {e}")
+
+
+def registered_providers():
+    """Provider classes by name, the built-in ones and those of installed plugins."""
+    _load_entry_points()
+    return dict(_registry)
+
+
+def create_providers(selection=None):
+    """
+    Instances of the available providers of `selection`: a list of provider names,
+    "all", or None for every low cost provider.
+    """
+    if isinstance(selection, str) and selection != "all":
+        selection = [selection]
+    providers = []
+    for name, cls in registered_providers().items():
+        if selection is None:
+            if cls.cost != "low":
+                continue
+        elif selection != "all" and name not in selection:
+            continue
+        try:
+            provider = cls()
+            if provider.available():
+                providers.append(provider)
+        except Exception as e:
+            print(f"Warning: metric provider {name} failed to start: {e}")
+    if isinstance(selection, list):
+        for name in selection:
+            if name not in _registry:
+                print(f"Warning: unknown metric provider {name}.")
+    return providers
+
+
+def provider_bounds():
+    """Default gradient bounds of the registered providers' metrics."""
+    bounds = {}
+    for cls in registered_providers().values():
+        bounds.update(cls.bounds)
+    return bounds
+
+
+@register_provider
+class MemoryProvider(MetricProvider):
+    name = "memory"
+    metrics = ("memory_usage", "swap_usage")
+    bounds = {"memory_usage": (0, 100), "swap_usage": (0, 100)}
+
+    def __init__(self):
+        import psutil
+        self.psutil = psutil
+
+    def read(self):
+        return {"memory_usage": self.psutil.virtual_memory().percent,
+                "swap_usage": self.psutil.swap_memory().percent}
+
+
+@register_provider
+class StorageTemperatureProvider(MetricProvider):
+    """Hottest NVMe drive (its "Composite" sensor) and hottest SATA drive of the drivetemp driver."""
+
+    name = "storage"
+    cost = "high"
+    metrics = ("nvme_temp", "disk_temp")
+    interval = 2.0
+    bounds = {"nvme_temp": (30, 70), "disk_temp": (25, 55)}
+
+    def __init__(self, root='/sys'):
+        self.sensors = {"nvme_temp": [], "disk_temp": []}
+        for chip, label, input_path in list_temperature_sensors(root):
+            if chip == "nvme" and label in (None, "Composite"):
+                self.sensors["nvme_temp"].append(SysfsSensor(input_path))
+            elif chip == "drivetemp":
+                self.sensors["disk_temp"].append(SysfsSensor(input_path))
+
+    def available(self):
+        return any(self.sensors.values())
+
+    def read(self):
+        return {metric: _max_reading(sensors) for metric, sensors in self.sensors.items()}
+
+
+@register_provider
+class FanProvider(MetricProvider):
+    """Fastest fan of all hwmon chips, in RPM."""
+
+    name = "fans"
+    cost = "high"
+    metrics = ("fan_rpm",)
+    interval = 2.0
+    bounds = {"fan_rpm": (0, 3000)}
+
+    def __init__(self, root='/sys'):
+        self.inputs = []
+        for path in sorted(glob.glob(os.path.join(root, 'class/hwmon/hwmon*/fan*_input'))):
+            try:
+                self.inputs.append(os.open(path, os.O_RDONLY))
+            except OSError:
+                continue
+
+    def available(self):
+        return bool(self.inputs)
+
+    def read(self):
+        speeds = []
+        for fd in self.inputs:
+            try:
+                speeds.append(int(os.pread(fd, 32, 0)))
+            except (OSError, ValueError):
+                continue
+        return {"fan_rpm": max(speeds, default=None)}
+
+
+@register_provider
+class RaplPowerProvider(MetricProvider):
+    """
+    CPU package power in watts from the powercap (RAPL) energy counters of every
+    package, averaged since the previous read. Reading them usually needs root.
+    """
+
+    name = "rapl"
+    cost = "high"
+    metrics = ("cpu_power",)
+    bounds = {"cpu_power": (0, 150)}
+
+    def __init__(self, root='/sys'):
+        self.zones = []  # (energy_uj fd, max_energy_range_uj)
+        for zone in sorted(glob.glob(os.path.join(root, 'class/powercap/intel-rapl:[0-9]'))):
+            try:
+                with open(os.path.join(zone, 'max_energy_range_uj'), 'r') as f:
+                    max_range = int(f.read())
+                self.zones.append((os.open(os.path.join(zone, 'energy_uj'), os.O_RDONLY), max_range))
+            except (OSError, ValueError):
+                continue
+        self.last = None  # (monotonic time, energy of each zone)
+
+    def available(self):
+        return bool(self.zones)
+
+    def read(self):
+        now = time.monotonic()
+        try:
+            energy = [int(os.pread(fd, 32, 0)) for fd, _ in self.zones]
+        except (OSError, ValueError):
+            return {"cpu_power": None}
+        last, self.last = self.last, (now, energy)
+        if last is None or now <= last[0]:
+            return {"cpu_power": None}
+        # The counters wrap around at max_energy_range_uj
+        used = sum((current - previous) % max_range
+                   for current, previous, (_, max_range) in zip(energy, last[1], self.zones))
+        return {"cpu_power": used / 1e6 / (now - last[0])}
+
+
+@register_provider
+class NetworkProvider(MetricProvider):
+    """Receive and transmit throughput of all interfaces but loopback, in Mbit/s."""
+
+    name = "network"
+    metrics = ("net_rx", "net_tx")
+    bounds = {"net_rx": (0, 1000), "net_tx": (0, 1000)}
+
+    def __init__(self):
+        import psutil
+        self.psutil = psutil
+        self.last = None  # (monotonic time, bytes received, bytes sent)
+
+    def read(self):
+        now = time.monotonic()
+        counters = self.psutil.net_io_counters(pernic=True)
+        received = sum(counter.bytes_recv for nic, counter in counters.items() if nic != 'lo')
+        sent = sum(counter.bytes_sent for nic, counter in counters.items() if nic != 'lo')
+        last, self.last = self.last, (now, received, sent)
+        if last is None or now <= last[0]:
+            return {"net_rx": None, "net_tx": None}
+        elapsed = now - last[0]
+        # Counters restart from zero when an interface goes away
+        return {"net_rx": max(received - last[1], 0) * 8 / 1e6 / elapsed,
+                "net_tx": max(sent - last[2], 0) * 8 / 1e6 / elapsed}
+
+
+def _max_reading(sensors):
+    readings = []
+    for sensor in sensors:
+        try:
+            readings.append(sensor.read())
+        except (OSError, ValueError):
+            continue
+    return max(readings, default=None)
@@ -0,0 +1,95 @@
+import numpy as np
+from config import NUMBER_OF_LEDS
+from color_program import ProgramCache
+from providers import provider_bounds
+
+COLOR_KEYS = ("metrics", "time")
+DEFAULT_LED_COLOR = "ffe000"
+
+
+def metrics_bounds(config):
+    """
+    (min, max) values of each metric for the "start-end-metric" gradients of the config:
+    the defaults of the metric providers, the <device>_min/max_<temp|usage> keys for the
+    CPU and GPU and "metric_bounds" ({"fan_rpm": [0, 2000]}) for any metric.
+    """
+    bounds = provider_bounds()
+    metrics_min_value = {metric: low for metric, (low, high) in bounds.items()}
+    metrics_max_value = {metric: high for metric, (low, high) in bounds.items()}
+    metrics_min_value.update({
+        "cpu_temp": config.get('cpu_min_temp', 30),
+        "gpu_temp": config.get('gpu_min_temp', 30),
+        "cpu_usage": config.get('cpu_min_usage', 0),
+        "gpu_usage": config.get('gpu_min_usage', 0),
+    })
+    metrics_max_value.update({
+        "cpu_temp": config.get('cpu_max_temp', 90),
+        "gpu_temp": config.get('gpu_max_temp', 90),
+        "cpu_usage": config.get('cpu_max_usage', 100),
+        "gpu_usage": config.get('gpu_max_usage', 100),
+    })
+    for metric, (low, high) in config.get('metric_bounds', {}).items():
+        metrics_min_value[metric] = low
+        metrics_max_value[metric] = high
+    return metrics_min_value, metrics_max_value
+
+
+class RenderEngine:
+    """
+    Computes the LED colors of a config from a metrics snapshot and the time, for
+    the controller and the GUI preview alike.
+
+    Everything derived from the config (metric bounds, cycle duration, compiled
+    color programs) is built once per config version: load() is a no-op while
+    the same config object and version are passed, so callers can hand the
+    config in on every frame.
+    """
+
+    def __init__(self, programs=None):
+        self.programs = programs if programs is not None else ProgramCache()
+        self.config = None
+        self.version = None
+        self.load({})
+
+    def load(self, config, version=None):
+        """Compiles `config` unless it is already loaded. Returns True if it was compiled."""
+        if self.config is config and self.version == version:
+            return False
+        self.config = config
+        self.version = version
+        config = config or {}
+        self.metrics_min_value, self.metrics_max_value = metrics_bounds(config)
+        self.cycle_duration = float(config.get('cycle_duration', 5))
+        self.temp_unit = {device: config.get(f"{device}_temperature_unit", "celsius") for device in ["cpu", "gpu"]}
+        self.color_programs = {key: self.compile(config, key) for key in COLOR_KEYS}
+        return True
+
+    def compile(self, config, key="metrics"):
+        colors = config.get(key, {}).get('colors', [DEFAULT_LED_COLOR] * NUMBER_OF_LEDS)
+        return self.programs.get(colors, self.metrics_min_value, self.metrics_max_value)
+
+    def colors(self, key, metrics, phase, now=None):
+        """
+        (NUMBER_OF_LEDS, 3) uint8 colors of the loaded config's `key` colors.
+        Args:
+            metrics (dict): metric values, as returned by Metrics.get_metrics.
+            phase (float): seconds on the animation clock.
+            now (datetime): time for the time gradients, the current time by default.
+        """
+        return self.color_programs[key].evaluate(metrics, phase, self.cycle_duration, now)
+
+    def refresh_interval(self, keys, frame_interval, metrics_interval):
+        """Longest interval between frames that shows every change of the `keys` colors, None if they're static."""
+        intervals = [self.color_programs[key].refresh_interval(frame_interval, metrics_interval) for key in keys]
+        return min([interval for interval in intervals if interval is not None], default=None)
+
+    def frame(self, config, metrics, phase, version=None, now=None):
+        """Colors of every color key of `config`, by key."""
+        self.load(config, version)
+        return {key: self.colors(key, metrics, phase, now) for key in COLOR_KEYS}
+
+
+def to_hex_colors(colors):
+    """Hex strings (without '#') of a (n, 3) uint8 color array."""
+    data = np.ascontiguousarray(colors, dtype=np.uint8).tobytes().hex()
+    return [data[i:i + 6] for i in range(0, len(data), 6)]
@@ -0,0 +1,99 @@
+import math
+import time
+
+CLOCK_MARGIN = 0.005  # Seconds after a wall clock tick that aligned frames are rendered
+
+
+class RunningStats:
+    """Count, mean, standard deviation, min and max of a stream of values, in constant memory."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def add(self, value):
+        # Welford's online algorithm
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last = value
+
+    @property
+    def stdev(self):
+        return math.sqrt(self._m2 / self.count) if self.count > 1 else 0.0
+
+    def as_dict(self):
+        return {"count": self.count, "mean": self.mean, "stdev": self.stdev,
+                "min": self.min, "max": self.max, "last": self.last}
+
+
+class FrameScheduler:
+    """
+    Paces the render loop on absolute deadlines of the monotonic clock.
+
+    Deadlines are start + n * interval, so render time doesn't add up into drift.
+    A frame that finishes after its next deadline doesn't trigger a burst of
+    catch-up frames: the missed deadlines are skipped and counted instead.
+    With `align_to_clock`, deadlines are snapped to the wall clock grid of the
+    interval, so slow frame rates still show clock digits changing on time.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.frame_period = RunningStats()
+        self.render_time = RunningStats()
+        self.overruns = 0        # Frames that finished after the next deadline
+        self.skipped_frames = 0  # Deadlines dropped because of overruns
+        self.align_to_clock = False
+        self.reset()
+
+    def reset(self):
+        """Restart pacing from now, e.g. after the loop was paused."""
+        self.next_deadline = time.monotonic()
+        self.frame_start = None
+
+    def begin_frame(self):
+        now = time.monotonic()
+        if self.frame_start is not None:
+            self.frame_period.add(now - self.frame_start)
+        self.frame_start = now
+        return now
+
+    def end_frame(self):
+        """Records the render time and sleeps until the next deadline."""
+        now = time.monotonic()
+        self.render_time.add(now - self.frame_start)
+        self.next_deadline += self.interval
+        if now > self.next_deadline:
+            missed = math.floor((now - self.next_deadline) / self.interval) + 1
+            self.overruns += 1
+            self.skipped_frames += missed
+            self.next_deadline += missed * self.interval
+        if self.align_to_clock:
+            wall_now = time.time()
+            wall_deadline = wall_now + self.next_deadline - now
+            aligned = round((wall_deadline - CLOCK_MARGIN) / self.interval) * self.interval + CLOCK_MARGIN
+            if aligned <= wall_now:
+                aligned += self.interval
+            self.next_deadline = now + aligned - wall_now
+        time.sleep(self.next_deadline - now)
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "align_to_clock": self.align_to_clock,
+            "frame_period": self.frame_period.as_dict(),
+            "render_time": self.render_time.as_dict(),
+            "overruns": self.overruns,
+            "skipped_frames": self.skipped_frames,
+        }
@@ -0,0 +1,86 @@
+import glob
+import os
+
+# Preferred CPU sensors as "chip:label" (or just "chip" for its first input), best first.
+# Chips are hwmon names; thermal zone types (e.g. x86_pkg_temp) are matched the same way.
+DEFAULT_CPU_SENSORS = [
+    "k10temp:Tctl",
+    "k10temp:Tdie",
+    "zenpower:Tdie",
+    "coretemp:Package id 0",
+    "cpu_thermal",
+    "x86_pkg_temp",
+    "soc_thermal",
+    "acpitz",
+]
+
+
+def _read_text(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _input_number(path):
+    digits = ''.join(c for c in os.path.basename(path) if c.isdigit())
+    return int(digits) if digits else 0
+
+
+def list_temperature_sensors(root='/sys'):
+    """Returns (chip, label, input path) for every hwmon temperature input and thermal zone."""
+    sensors = []
+    for hwmon in sorted(glob.glob(os.path.join(root, 'class/hwmon/hwmon*')), key=_input_number):
+        chip = _read_text(os.path.join(hwmon, 'name')) or _read_text(os.path.join(hwmon, 'device/name'))
+        inputs = glob.glob(os.path.join(hwmon, 'temp*_input')) or glob.glob(os.path.join(hwmon, 'device/temp*_input'))
+        for input_path in sorted(inputs, key=_input_number):
+            label = _read_text(input_path[:-len('_input')] + '_label')
+            sensors.append((chip, label, input_path))
+    for zone in sorted(glob.glob(os.path.join(root, 'class/thermal/thermal_zone*')), key=_input_number):
+        sensors.append((_read_text(os.path.join(zone, 'type')), None, os.path.join(zone, 'temp')))
+    return sensors
+
+
+def find_sensor(selection=None, root='/sys'):
+    """
+    Resolves the first available sensor of `selection` (a "chip:label" string or a
+    list of them, DEFAULT_CPU_SENSORS by default) and returns an open SysfsSensor,
+    or None if none of them exists.
+    """
+    if selection is None:
+        selection = DEFAULT_CPU_SENSORS
+    elif isinstance(selection, str):
+        selection = [selection]
+    sensors = list_temperature_sensors(root)
+    for wanted in selection:
+        chip, _, label = wanted.partition(':')
+        for sensor_chip, sensor_label, input_path in sensors:
+            if sensor_chip == chip and (not label or sensor_label == label):
+                try:
+                    return SysfsSensor(input_path, name=wanted)
+                except OSError:
+                    continue
+    return None
+
+
+class SysfsSensor:
+    """
+    A sysfs temperature input (millidegrees) kept open between reads.
+
+    sysfs attributes are regenerated on every read from offset 0, so re-reading an
+    open descriptor with os.pread is enough; no path lookup or open per sample.
+    """
+
+    def __init__(self, path, name=None):
+        self.path = path
+        self.name = name or path
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self):
+        return int(os.pread(self.fd, 32, 0)) / 1000.0
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -1,21 +1,34 @@
 import numpy as np
 
-def interpolate_color(start_color: str, end_color: str, factor: float) -> str:
+def hex_to_rgb(color: str) -> np.ndarray:
     """
-    Interpolates between two hex colors.
+    Parses a hex color (e.g. 'ff0000' or '#ff0000') into a uint8 RGB array.
+    Raises ValueError if the string is not a 6 digit hex color.
+    """
+    color = color.lstrip('#')
+    if len(color) != 6:
+        raise ValueError(f"invalid color {color!r}")
+    return np.array([int(color[i:i+2], 16) for i in (0, 2, 4)], dtype=np.uint8)
+
+def rgb_to_hex(color) -> str:
+    """Formats an RGB triplet as a hex string (e.g. 'ff0000')."""
+    return bytes(np.asarray(color, dtype=np.uint8)).hex()
+
+def interpolate_color(start_color, end_color, factor):
+    """
+    Interpolates between two RGB colors.
     Args:
-        start_color (str): The starting color in hex format (e.g., '#ff0000').
-        end_color (str): The ending color in hex format (e.g., '#00ff00').
-        factor (float): A value between 0 and 1 that determines the interpolation factor.
+        start_color (array): The starting color(s), RGB values in the last axis.
+        end_color (array): The ending color(s), RGB values in the last axis.
+        factor (float or array): A value between 0 and 1 that determines the interpolation factor.
                         0 returns the start color, 1 returns the end color.
+                        Arrays broadcast against the colors, e.g. shape (n, 1) for n colors.
     Returns:
-        str: The interpolated color in hex format.
+        np.ndarray: The interpolated color(s) as uint8.
     """
-    start_color = np.array([int(start_color[i:i+2], 16) for i in (0, 2, 4)])
-    end_color = np.array([int(end_color[i:i+2], 16) for i in (0, 2, 4)])
-    interpolated_color = (start_color * (1 - factor) + end_color * factor).astype(int)
-    return ''.join(f"{c:02x}" for c in interpolated_color)
+    start_color = np.asarray(start_color, dtype=float)
+    end_color = np.asarray(end_color, dtype=float)
+    return (start_color * (1 - factor) + end_color * factor).astype(np.uint8)
 
 def get_random_color():
-    return (f"{np.random.randint(0, 256):02x}{np.random.randint(0, 256):02x}{np.random.randint(0, 256):02x}")
-                
\ No newline at end of file
+    return np.random.randint(0, 256, 3).astype(np.uint8)
@@ -0,0 +1,124 @@
+import json
+import os
+import sys
+import types
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO, 'src'))
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """Keeps the layout, probe and profile caches out of the real home directory."""
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
+
+
+def write_hwmon(root, chips):
+    """
+    Fake sysfs hwmon tree under `root`: `chips` is a list of (name, [(label or None,
+    millidegrees), ...]), one hwmonN directory per chip.
+    """
+    for number, (name, inputs) in enumerate(chips):
+        hwmon = root / 'class' / 'hwmon' / f'hwmon{number}'
+        hwmon.mkdir(parents=True)
+        (hwmon / 'name').write_text(name + '\n')
+        for index, (label, value) in enumerate(inputs, start=1):
+            (hwmon / f'temp{index}_input').write_text(f'{value}\n')
+            if label is not None:
+                (hwmon / f'temp{index}_label').write_text(label + '\n')
+    return root
+
+
+def fake_pynvml(temperatures, usages, power=None):
+    """
+    Namespace standing in for pynvml with one device per temperature. Device N has
+    PCI bus id 00000000:0<N+1>:00.0; power (watts per device, None if unsupported)
+    defaults to unsupported, like fan speed always is.
+    """
+    calls = {'temperature': 0}
+
+    def handle_by_index(index):
+        if not 0 <= index < len(temperatures):
+            raise RuntimeError("NVML_ERROR_INVALID_ARGUMENT")
+        return index
+
+    def temperature(handle, sensor):
+        calls['temperature'] += 1
+        return temperatures[handle]
+
+    def power_usage(handle):
+        if power is None or power[handle] is None:
+            raise RuntimeError("NVML_ERROR_NOT_SUPPORTED")
+        return power[handle] * 1000
+
+    def fan_speed(handle):
+        raise RuntimeError("NVML_ERROR_NOT_SUPPORTED")
+
+    return types.SimpleNamespace(
+        calls=calls,
+        NVML_TEMPERATURE_GPU=0,
+        nvmlInit=lambda: None,
+        nvmlShutdown=lambda: None,
+        nvmlDeviceGetCount=lambda: len(temperatures),
+        nvmlDeviceGetHandleByIndex=handle_by_index,
+        nvmlDeviceGetPciInfo=lambda handle: types.SimpleNamespace(busId=f"00000000:0{handle + 1}:00.0".encode()),
+        nvmlDeviceGetTemperature=temperature,
+        nvmlDeviceGetUtilizationRates=lambda handle: types.SimpleNamespace(gpu=usages[handle], memory=0),
+        nvmlDeviceGetPowerUsage=power_usage,
+        nvmlDeviceGetFanSpeed=fan_speed,
+        nvmlDeviceGetMemoryInfo=lambda handle: types.SimpleNamespace(used=handle + 1, total=8),
+    )
+
+
+class FakeDevice:
+    """Stands in for the HID output, keeping the reports written to it."""
+
+    def __init__(self):
+        self.reports = []
+
+    def write(self, report):
+        self.reports.append(bytes(report))
+        return len(report)
+
+
+class FakeMetrics:
+    """Stands in for Metrics with fixed values and a snapshot, without reading any sensor."""
+
+    def __init__(self, values=None):
+        self.update_interval = 0.5
+        self.intervals = {}
+        self.values = values or {"cpu_temp": 45, "gpu_temp": 60, "cpu_usage": 20, "gpu_usage": 75}
+        self.snapshot = types.SimpleNamespace(values=dict(self.values), sampled_at={}, stats={})
+
+    def configure_smoothing(self, smoothing):
+        pass
+
+    def get_metrics(self, temp_unit):
+        return dict(self.values)
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    """The shipped config.json, copied so tests can change it."""
+    with open(os.path.join(REPO, 'config.json'), 'r') as f:
+        config = json.load(f)
+    config.update(control_socket=False, metrics_exporter=False)
+    path = tmp_path / 'config.json'
+    path.write_text(json.dumps(config))
+    return path
+
+
+@pytest.fixture
+def make_controller(config_path):
+    import controller
+
+    def make(**config_changes):
+        if config_changes:
+            config = json.loads(config_path.read_text())
+            config.update(config_changes)
+            config_path.write_text(json.dumps(config))
+        return controller.Controller(config_path=str(config_path), metrics=FakeMetrics(), device=FakeDevice())
+    return make
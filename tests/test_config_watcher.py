@@ -0,0 +1,99 @@
+import json
+import os
+
+import pytest
+
+from config_watcher import ConfigWatcher, write_config
+
+
+@pytest.fixture(params=["inotify", "polling"])
+def watch(request, tmp_path, monkeypatch):
+    """Watchers of tmp_path/config.json, with inotify and with the stat polling fallback."""
+    if request.param == "polling":
+        monkeypatch.setattr(ConfigWatcher, '_init_inotify', lambda self: None)
+    watchers = []
+
+    def watch(path=tmp_path / 'config.json'):
+        watcher = ConfigWatcher(str(path))
+        watchers.append(watcher)
+        if request.param == "inotify" and watcher._inotify_fd is None:
+            pytest.skip("inotify not available")
+        return watcher
+    yield watch
+    for watcher in watchers:
+        watcher.close()
+
+
+def _write_in_place(path, config):
+    with open(path, 'w') as f:
+        json.dump(config, f)
+
+
+def test_initial_load(watch, tmp_path):
+    _write_in_place(tmp_path / 'config.json', {"display_mode": "metrics"})
+    watcher = watch()
+    assert watcher.poll()
+    assert (watcher.config, watcher.generation) == ({"display_mode": "metrics"}, 1)
+    assert not watcher.poll()
+    assert watcher.generation == 1
+
+
+def test_write_in_place(watch, tmp_path):
+    path = tmp_path / 'config.json'
+    _write_in_place(path, {"display_mode": "metrics"})
+    watcher = watch()
+    watcher.poll()
+    _write_in_place(path, {"display_mode": "alternate_time"})
+    assert watcher.poll()
+    assert (watcher.config["display_mode"], watcher.generation) == ("alternate_time", 2)
+
+
+def test_atomic_rename(watch, tmp_path):
+    path = tmp_path / 'config.json'
+    write_config(path, {"display_mode": "metrics"})
+    watcher = watch()
+    watcher.poll()
+    write_config(path, {"display_mode": "time"})
+    assert watcher.poll()
+    assert (watcher.config["display_mode"], watcher.generation) == ("time", 2)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+def test_deleted_and_recreated(watch, tmp_path, capsys):
+    path = tmp_path / 'config.json'
+    _write_in_place(path, {"display_mode": "metrics"})
+    watcher = watch()
+    watcher.poll()
+    path.unlink()
+    assert not watcher.poll()
+    assert watcher.config == {"display_mode": "metrics"}  # Kept while the file is gone
+    assert "does not exist" in capsys.readouterr().out
+    _write_in_place(path, {"display_mode": "debug_ui"})
+    assert watcher.poll()
+    assert (watcher.config["display_mode"], watcher.generation) == ("debug_ui", 2)
+
+
+def test_invalid_json_keeps_previous_config(watch, tmp_path, capsys):
+    path = tmp_path / 'config.json'
+    _write_in_place(path, {"display_mode": "metrics"})
+    watcher = watch()
+    watcher.poll()
+    path.write_text('{"display_mode": ')
+    assert not watcher.poll()
+    assert (watcher.config, watcher.generation) == ({"display_mode": "metrics"}, 1)
+    assert "Error loading config" in capsys.readouterr().out
+    # Not retried (nor reported again) until the file changes
+    assert not watcher.poll()
+    assert capsys.readouterr().out == ""
+    _write_in_place(path, {"display_mode": "time_cpu"})
+    assert watcher.poll()
+    assert (watcher.config["display_mode"], watcher.generation) == ("time_cpu", 2)
+
+
+def test_other_files_are_ignored(watch, tmp_path):
+    _write_in_place(tmp_path / 'config.json', {"display_mode": "metrics"})
+    watcher = watch()
+    watcher.poll()
+    _write_in_place(tmp_path / 'other.json', {"display_mode": "time"})
+    assert not watcher.poll()
+    assert watcher.generation == 1
@@ -0,0 +1,124 @@
+import json
+import os
+import socket
+import stat
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from config import NUMBER_OF_LEDS
+from conftest import REPO
+from control import ControlServer, send_request
+from controller import start_control_server
+
+
+@pytest.fixture
+def serve(tmp_path):
+    """Starts a control socket for a controller, with a render loop applying the queued changes."""
+    servers, stop = [], threading.Event()
+
+    def serve(controller):
+        server = ControlServer([controller], str(tmp_path / 'control.sock')).start()
+        servers.append(server)
+
+        def render_loop():
+            while not stop.is_set():
+                controller.phase = time.monotonic()
+                controller.update()
+                controller.render_frame()
+                time.sleep(0.01)
+        threading.Thread(target=render_loop, daemon=True).start()
+        return lambda request: send_request(request, server.path)
+    yield serve
+    stop.set()
+    for server in servers:
+        server.close()
+
+
+def test_socket_is_owner_only(make_controller, serve, tmp_path):
+    serve(make_controller())
+    assert stat.S_IMODE(os.stat(tmp_path / 'control.sock').st_mode) == 0o600
+
+
+def test_status(make_controller, serve):
+    request = serve(make_controller(display_mode="metrics", layout_mode="big"))
+    response = request({"cmd": "status"})
+    assert response["ok"]
+    device, = response["devices"]
+    assert (device["display_mode"], device["layout_mode"]) == ("metrics", "big")
+    assert response["metrics"]["gpu_usage"] == 75
+
+
+def test_set_mode_round_trip(make_controller, serve, config_path):
+    controller = make_controller(display_mode="metrics", layout_mode="big")
+    request = serve(controller)
+    assert request({"cmd": "set_mode", "mode": "time"}) == {"applied": True, "ok": True}
+    assert controller.display_mode == "time"
+    # Not persisted unless asked
+    assert json.loads(config_path.read_text())["display_mode"] == "metrics"
+
+
+def test_set_mode_rejects_modes_of_other_layout(make_controller, serve):
+    controller = make_controller(display_mode="alternate_metrics", layout_mode="small")
+    request = serve(controller)
+    response = request({"cmd": "set_mode", "mode": "metrics"})
+    assert not response["ok"]
+    assert "small layout" in response["error"]
+    assert controller.display_mode == "alternate_metrics"
+    assert request({"cmd": "set_mode", "mode": "metrics", "layout_mode": "big"})["ok"]
+    assert (controller.display_mode, controller.layout.name) == ("metrics", "big")
+
+
+def test_patch_colors_persist(make_controller, serve, config_path):
+    controller = make_controller(display_mode="metrics", layout_mode="big")
+    request = serve(controller)
+    response = request({"cmd": "patch_colors", "key": "metrics", "start": 0, "end": 1, "color": "ff0000", "persist": True})
+    assert response == {"applied": True, "ok": True}
+    assert json.loads(config_path.read_text())["metrics"]["colors"][:2] == ["ff0000", "ff0000"]
+    assert controller.config["metrics"]["colors"][:2] == ["ff0000", "ff0000"]
+
+
+def test_frame(make_controller, serve):
+    request = serve(make_controller())
+    colors = request({"cmd": "frame"})["colors"]
+    assert len(colors) == NUMBER_OF_LEDS
+
+
+@pytest.mark.parametrize("bad_request, error", [
+    ({"cmd": "reboot"}, "unknown command"),
+    ({"cmd": "set_mode", "mode": "disco"}, "unknown display mode"),
+    ({"cmd": "patch_colors", "start": 80, "end": 90, "color": "ff0000"}, "LED indexes"),
+    ({"cmd": "preset", "name": "nope"}, "unknown preset"),
+    ({"cmd": "frame", "device": 3}, "no device 3"),
+])
+def test_errors(make_controller, serve, bad_request, error):
+    request = serve(make_controller())
+    response = request(bad_request)
+    assert not response["ok"]
+    assert error in response["error"]
+
+
+def test_controller_imports_without_unix_sockets():
+    # psutil needs AF_UNIX on Linux, so it is imported before the attribute goes away
+    script = ("import psutil, socket, sys; del socket.AF_UNIX; sys.path.insert(0, 'src'); import controller; "
+              "assert 'control' not in sys.modules")
+    subprocess.run([sys.executable, '-c', script], cwd=REPO, check=True)
+
+
+def test_no_control_socket_without_unix_sockets(make_controller, monkeypatch):
+    controller = make_controller(control_socket=None)
+    monkeypatch.delattr(socket, 'AF_UNIX')
+    assert start_control_server([controller]) is None
+
+
+def test_gui_preview_reads_controller_metrics(make_controller, serve, tmp_path):
+    led_display_ui = pytest.importorskip("led_display_ui")
+    serve(make_controller(display_mode="metrics", layout_mode="big"))
+    path = str(tmp_path / 'control.sock')
+    metrics = led_display_ui.read_daemon_metrics(path, {"cpu": "celsius", "gpu": "fahrenheit"})
+    assert (metrics["cpu_temp"], metrics["gpu_temp"], metrics["gpu_usage"]) == (45, 140, 75)
+    with pytest.raises(OSError):
+        led_display_ui.read_daemon_metrics(str(tmp_path / 'missing.sock'), {"cpu": "celsius", "gpu": "celsius"})
@@ -0,0 +1,53 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from exporter import OPENMETRICS_TYPE, PROMETHEUS_TYPE, MetricsExporter, parse_address
+
+
+@pytest.fixture
+def scrape(make_controller):
+    controller = make_controller()
+    controller.render_frame()
+    exporter = MetricsExporter([controller], ("127.0.0.1", 0)).start()
+
+    def scrape(path='/metrics', accept=None):
+        url = f"http://127.0.0.1:{exporter.server_address[1]}{path}"
+        headers = {"Accept": accept} if accept else {}
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=5) as response:
+            return response.headers['Content-Type'], response.read().decode()
+    yield scrape
+    exporter.close()
+
+
+def test_parse_address():
+    assert parse_address(True) == ("127.0.0.1", 9469)
+    assert parse_address(9100) == ("127.0.0.1", 9100)
+    assert parse_address("0.0.0.0:9100") == ("0.0.0.0", 9100)
+
+
+def test_prometheus_format(scrape):
+    content_type, text = scrape()
+    assert content_type == PROMETHEUS_TYPE
+    lines = text.splitlines()
+    assert 'digital_lcd_sensor{metric="gpu_usage"} 75' in lines
+    assert 'digital_lcd_device_connected{device="0"} 1' in lines
+    assert "# TYPE digital_lcd_frames_rendered_total counter" in lines
+    assert 'digital_lcd_frames_rendered_total{device="0"} 1' in lines
+    assert "# EOF" not in lines
+
+
+def test_openmetrics_format(scrape):
+    content_type, text = scrape(accept="application/openmetrics-text; version=1.0.0")
+    assert content_type == OPENMETRICS_TYPE
+    lines = text.splitlines()
+    assert "# TYPE digital_lcd_frames_rendered counter" in lines
+    assert 'digital_lcd_frames_sent_total{device="0"} 1' in lines
+    assert lines[-1] == "# EOF"
+
+
+def test_unknown_path(scrape):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        scrape('/other')
+    assert error.value.code == 404
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+import controller as controller_module
+from config import NUMBER_OF_LEDS
+from conftest import FakeMetrics
+from hid_frame import HEADER
+from hid_output import read_recording
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def loopback(config_path, tmp_path, monkeypatch):
+    """Controller of a static metrics frame writing to a loopback recording, on a fake monotonic clock."""
+    clock = Clock()
+    monkeypatch.setattr(controller_module.time, 'monotonic', clock)
+    recording = tmp_path / 'recording.bin'
+
+    def make(**config_changes):
+        config = json.loads(config_path.read_text())
+        config.update(display_mode="metrics", layout_mode="big", adaptive_frame_rate=False, update_interval=0.1,
+                      output_backend="loopback", output_path=str(recording), **config_changes)
+        config["metrics"]["colors"] = ["ff0000"] * NUMBER_OF_LEDS
+        config_path.write_text(json.dumps(config))
+        controller = controller_module.Controller(config_path=str(config_path), metrics=FakeMetrics())
+
+        def run(seconds, step=0.1):
+            """Renders a frame every `step` seconds of the fake clock; returns the frames written."""
+            for _ in range(round(seconds / step)):
+                controller.update()
+                controller.render_frame()
+                clock.now += step
+            return controller.frames_sent
+
+        def reports():
+            controller.dev.close()
+            return [report for _, report in read_recording(recording)]
+        return controller, run, reports
+    return make
+
+
+def test_unchanged_frames_are_skipped(loopback):
+    controller, run, reports = loopback()
+    assert run(0.5) == 1
+    assert controller.frames_rendered == 5
+    recorded = reports()
+    assert len(recorded) == len(controller.frame_encoder.reports)
+    assert recorded[0].startswith(HEADER)
+
+
+def test_changed_frame_is_sent_right_away(loopback):
+    controller, run, reports = loopback()
+    run(0.3)
+    controller.metrics.values["cpu_usage"] = 150  # Lights the leading 1 of the usage field
+    assert run(0.1) == 2
+    recorded = reports()
+    count = len(controller.frame_encoder.reports)
+    assert len(recorded) == 2 * count
+    assert recorded[:count] != recorded[count:]
+
+
+def test_keepalive_resends_unchanged_frame(loopback):
+    controller, run, reports = loopback(keepalive_interval=1.0)
+    assert run(3.0) == 3  # At 0, ~1 and ~2 seconds
+    recorded = reports()
+    count = len(controller.frame_encoder.reports)
+    assert recorded[:count] == recorded[count:2 * count] == recorded[2 * count:]
+
+
+@pytest.mark.parametrize("keepalive_interval", [None, 0])
+def test_keepalive_can_be_disabled(loopback, keepalive_interval):
+    controller, run, reports = loopback(keepalive_interval=keepalive_interval)
+    assert run(5.0) == 1
+    controller.metrics.values["gpu_usage"] = 150
+    assert run(0.1) == 2
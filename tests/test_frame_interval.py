@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from config import NUMBER_OF_LEDS
+from config_watcher import write_config
+from controller import IDLE_FRAME_INTERVAL
+
+STATIC = ["00ff00"] * NUMBER_OF_LEDS
+
+
+def _colors(color):
+    return {"colors": [color] * NUMBER_OF_LEDS}
+
+
+@pytest.fixture
+def frame_interval(make_controller):
+    """Frame interval of a controller with static colors, 0.1 s frames, 2 s metrics and no keepalive, unless changed."""
+    def frame_interval(**config_changes):
+        config = dict(layout_mode="big", update_interval=0.1, metrics_update_interval=2.0, metrics_update_intervals={},
+                      keepalive_interval=None, cycle_duration=5.0, metrics={"colors": STATIC},
+                      time={"colors": STATIC})
+        config.update(config_changes)
+        controller = make_controller(**config)
+        controller.update()
+        return controller.frame_interval
+    return frame_interval
+
+
+@pytest.mark.parametrize("changes, expected", [
+    (dict(display_mode="metrics"), 2.0),  # Metric refreshes
+    (dict(display_mode="metrics", metrics_update_intervals={"gpu": 0.7}), 0.7),  # The most frequent one
+    (dict(display_mode="time"), 1.0),  # Clock seconds, no metrics shown
+    (dict(display_mode="time_cpu", metrics_update_interval=120), 60.0),  # Clock minutes
+    (dict(display_mode="time_cpu"), 2.0),
+    (dict(display_mode="alternate_time", metrics_update_interval=120, cycle_duration=30), 30.0),  # View switches
+    (dict(display_mode="alternate_metrics", layout_mode="small", metrics_update_interval=10), 2.5),
+    (dict(display_mode="debug_ui"), IDLE_FRAME_INTERVAL),  # Nothing changes
+    (dict(display_mode="metrics", keepalive_interval=1.0), 1.0),
+])
+def test_slowest_interval_showing_every_change(frame_interval, changes, expected):
+    assert frame_interval(**changes) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("changes, expected", [
+    (dict(metrics=_colors("random")), 0.1),
+    (dict(metrics=_colors("ff0000-0000ff")), 0.1),  # Wave
+    (dict(metrics=_colors("00ff00-ff0000-cpu_temp"), metrics_update_interval=3.0), 3.0),
+    (dict(metrics=_colors("00ff00-ff0000-seconds"), metrics_update_interval=3.0), 1.0),
+    # Only the color keys shown by the mode count
+    (dict(display_mode="time", metrics=_colors("random")), 1.0),
+    (dict(display_mode="time", time=_colors("00ff00-ff0000-minutes")), 1.0),
+])
+def test_colors(frame_interval, changes, expected):
+    changes.setdefault("display_mode", "metrics")
+    assert frame_interval(**changes) == pytest.approx(expected)
+
+
+def test_never_below_update_interval(frame_interval):
+    assert frame_interval(display_mode="metrics", metrics_update_interval=0.05, update_interval=0.25) == 0.25
+    assert frame_interval(display_mode="metrics", metrics=_colors("random"), update_interval=0.25) == 0.25
+
+
+def test_disabled(frame_interval):
+    assert frame_interval(display_mode="debug_ui", adaptive_frame_rate=False, update_interval=0.2) == 0.2
+
+
+def test_follows_config_reloads(make_controller, config_path):
+    controller = make_controller(display_mode="time", layout_mode="big", keepalive_interval=None, time={"colors": STATIC})
+    controller.update()
+    assert controller.frame_interval == 1.0
+    config = json.loads(config_path.read_text())
+    config["time"] = _colors("random")
+    write_config(config_path, config)
+    controller.update()
+    assert controller.frame_interval == 0.1
@@ -0,0 +1,112 @@
+import json
+
+import numpy as np
+import pytest
+
+from config import NUMBER_OF_LEDS, leds_indexes, leds_indexes_small
+from conftest import REPO
+from glyphs import (compile_index_glyphs, compile_layout_glyphs, digit_mask, digit_to_segments, get_number_array,
+                    letter_mask)
+
+
+@pytest.fixture(scope="module")
+def layout_json():
+    with open(f"{REPO}/layout.json") as f:
+        return json.load(f)
+
+
+def _draw(table, value):
+    leds = np.zeros(NUMBER_OF_LEDS, dtype=int)
+    table.draw(leds, value)
+    return leds
+
+
+# The drawing code the tables replaced, kept as the reference
+
+def _draw_number(leds, number, num_digits, digits_mapping):
+    number_str = f"{number:0{num_digits}d}"
+    for i, digit_char in enumerate(number_str):
+        digit_map = digits_mapping[i]['map']
+        for segment_name in digit_to_segments[int(digit_char)]:
+            leds[digit_map[segment_name]] = 1
+
+
+def _old_layout_temp(layout, device, temp):
+    leds = np.zeros(NUMBER_OF_LEDS, dtype=int)
+    _draw_number(leds, temp, 3, layout[device + '_temp_digits'])
+    return leds
+
+
+def _old_layout_usage(layout, device, usage, reverse_gpu_digits=True):
+    leds = np.zeros(NUMBER_OF_LEDS, dtype=int)
+    digits = layout[device + '_usage_digits']
+    if device == 'gpu' and reverse_gpu_digits:
+        digits = digits[::-1]
+    _draw_number(leds, usage % 100, 2, digits)
+    if usage >= 100:
+        leds[layout[device + '_usage_1']['top']] = 1
+        leds[layout[device + '_usage_1']['bottom']] = 1
+    return leds
+
+
+def _old_set_leds(indexes, key, value):
+    leds = np.zeros(NUMBER_OF_LEDS, dtype=int)
+    leds[indexes[key]] = value
+    return leds
+
+
+@pytest.mark.parametrize("device", ["cpu", "gpu"])
+def test_layout_temperatures(layout_json, device):
+    table = compile_layout_glyphs(layout_json)[device + '_temp']
+    for temp in range(1000):
+        np.testing.assert_array_equal(_draw(table, temp), _old_layout_temp(layout_json, device, temp), err_msg=str(temp))
+
+
+@pytest.mark.parametrize("device", ["cpu", "gpu"])
+def test_layout_usages(layout_json, device):
+    table = compile_layout_glyphs(layout_json)[device + '_usage']
+    for usage in range(200):
+        np.testing.assert_array_equal(_draw(table, usage), _old_layout_usage(layout_json, device, usage), err_msg=str(usage))
+
+
+def test_gpu_usage_digit_order(layout_json):
+    # peerless_standard reversed the GPU usage digits, peerless_usage did not and showed them swapped
+    table = compile_layout_glyphs(layout_json)['gpu_usage']
+    for usage in range(200):
+        unreversed = _old_layout_usage(layout_json, 'gpu', usage, reverse_gpu_digits=False)
+        tens, units = divmod(usage % 100, 10)
+        assert np.array_equal(_draw(table, usage), unreversed) == (tens == units), usage
+
+
+@pytest.mark.parametrize("indexes", [leds_indexes, leds_indexes_small], ids=["big", "small"])
+def test_index_fields(indexes):
+    tables = compile_index_glyphs(indexes)
+    for device in ["cpu", "gpu"]:
+        if device + '_temp' not in indexes:
+            continue
+        for temp in range(-1, 1000):
+            expected = _old_set_leds(indexes, device + '_temp', digit_mask[get_number_array(temp)].flatten())
+            np.testing.assert_array_equal(_draw(tables[device + '_temp'], temp), expected)
+        for usage in range(-1, 200):
+            expected = _old_set_leds(indexes, device + '_usage', np.concatenate(
+                ([int(usage >= 100)] * 2, digit_mask[get_number_array(usage, array_length=2)].flatten())))
+            np.testing.assert_array_equal(_draw(tables[device + '_usage'], usage), expected)
+        for hour in range(24):
+            expected = _old_set_leds(indexes, device + '_temp', np.concatenate(
+                (digit_mask[get_number_array(hour, array_length=2, fill_value=0)].flatten(), letter_mask["H"])))
+            np.testing.assert_array_equal(_draw(tables[device + '_temp_hours'], hour), expected)
+        for minute in range(60):
+            expected = _old_set_leds(indexes, device + '_usage', np.concatenate(
+                ([0, 0], digit_mask[get_number_array(minute, array_length=2, fill_value=0)].flatten())))
+            np.testing.assert_array_equal(_draw(tables[device + '_usage_clock'], minute), expected)
+    if 'digit_frame' in indexes:
+        for value in range(1000):
+            expected = _old_set_leds(indexes, 'digit_frame',
+                                     digit_mask[get_number_array(value, array_length=3, fill_value=0)].flatten())
+            np.testing.assert_array_equal(_draw(tables['digit_frame'], value), expected)
+
+
+def test_values_out_of_range():
+    table = compile_index_glyphs(leds_indexes)['cpu_usage']
+    with pytest.raises(ValueError):
+        table.lookup(200)
@@ -0,0 +1,183 @@
+import time
+import types
+
+import pytest
+
+from conftest import fake_pynvml
+from gpu_backends import AmdGpuBackend, GpuSelection, NvidiaSmiStream, NvmlBackend, parse_bus_id
+
+
+def test_nvml_default_reads_first_gpu():
+    backend = NvmlBackend(pynvml=fake_pynvml([50, 72, 65], [10, 90, 40], power=[100, 150, None]))
+    assert backend.read() == {"gpu_temp": 50, "gpu_usage": 10, "gpu_power": 100.0, "gpu_memory": 12.5}
+    assert backend.extra_metrics == ["gpu_power", "gpu_memory"]
+
+
+def test_nvml_drops_unsupported_extras():
+    backend = NvmlBackend(pynvml=fake_pynvml([50], [10]))
+    assert "gpu_power" not in backend.read()
+    assert backend.extra_metrics == ["gpu_memory"]
+
+
+def test_nvml_getters_share_one_sample():
+    pynvml = fake_pynvml([50], [10])
+    backend = NvmlBackend(pynvml=pynvml, max_age=10)
+    assert (backend.get_temperature(), backend.get_usage(), backend.getter("gpu_memory")()) == (50, 10, 12.5)
+    assert pynvml.calls['temperature'] == 1
+
+
+def test_nvml_refreshes_after_max_age():
+    pynvml = fake_pynvml([50], [10])
+    backend = NvmlBackend(pynvml=pynvml, max_age=0.01)
+    backend.get_temperature()
+    time.sleep(0.02)
+    backend.get_temperature()
+    assert pynvml.calls['temperature'] == 2
+
+
+def test_nvml_without_gpu():
+    assert NvmlBackend.create(pynvml=fake_pynvml([], [])) is None
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+SMI_LINES = 'echo "0, 00000000:01:00.0, 50, 10"; echo "1, 00000000:02:00.0, 72, 90"'
+
+
+def test_smi_stream_reads_first_gpu():
+    stream = NvidiaSmiStream.create(command=['sh', '-c', f'while true; do {SMI_LINES}; sleep 0.05; done'])
+    try:
+        assert (stream.get_temperature(), stream.get_usage()) == (50, 10)
+    finally:
+        stream.close()
+
+
+def test_smi_stream_skips_unparsable_lines():
+    stream = NvidiaSmiStream(command=['true'])
+    stream.close()
+    stream.parse_line("index, pci.bus_id, temperature.gpu, utilization.gpu")
+    stream.parse_line("0, 00000000:01:00.0, [N/A], 10")
+    assert stream.gpus == {}
+    stream.parse_line("0, 00000000:01:00.0, 55, 12")
+    assert stream.get_temperature() == 55
+
+
+def test_smi_stream_restarts_after_exit(tmp_path):
+    # Prints one reading, from a temperature bumped on every start, then exits like a crashed nvidia-smi
+    counter = tmp_path / 'starts'
+    counter.write_text('0')
+    script = tmp_path / 'nvidia-smi'
+    script.write_text(f'n=$(($(cat {counter}) + 1)); echo $n > {counter}; echo "0, 00000000:01:00.0, $((40 + n)), 5"\n')
+    stream = NvidiaSmiStream.create(command=['sh', str(script)], restart_delay=0.05)
+    try:
+        assert stream is not None
+        assert _wait_for(lambda: stream.restarts >= 2)
+        assert stream.get_temperature() > 41
+    finally:
+        stream.close()
+
+
+def test_smi_stream_without_output():
+    assert NvidiaSmiStream.create(timeout=0.2, command=['sh', '-c', 'sleep 5']) is None
+
+
+def test_smi_stream_stale_readings():
+    stream = NvidiaSmiStream.create(interval=0.01, command=['sh', '-c', SMI_LINES + '; sleep 5'], stale_after=0.1)
+    try:
+        assert stream.get_temperature() == 50
+        time.sleep(0.2)
+        assert stream.get_temperature() is None
+    finally:
+        stream.close()
+
+
+def test_parse_bus_id_ignores_domain_padding():
+    assert parse_bus_id("00000000:01:00.0") == parse_bus_id("0000:01:00.0") == parse_bus_id("01:00.0")
+    assert parse_bus_id("0000:65:00.0") != parse_bus_id("0000:01:00.0")
+    with pytest.raises(ValueError):
+        parse_bus_id("gpu0")
+
+
+def test_selection_by_index_and_bus_id():
+    selection = GpuSelection([0, "0000:03:00.0"])
+    assert selection.selects(0)
+    assert not selection.selects(1, "00000000:02:00.0")
+    assert selection.selects(2, "00000000:03:00.0")
+    assert GpuSelection("all").selects(7)
+
+
+@pytest.mark.parametrize("value", [[True], ["zz"], [1.5]])
+def test_invalid_selection_falls_back_to_first_gpu(value):
+    assert GpuSelection.from_config({"gpus": value}).devices == [0]
+
+
+@pytest.mark.parametrize("aggregation, expected", [
+    ("hottest", {"gpu_temp": 72, "gpu_usage": 20}),
+    ("max", {"gpu_temp": 72, "gpu_usage": 90}),
+    ("mean", {"gpu_temp": 60, "gpu_usage": 55}),
+    ({"gpu_temp": "max", "gpu_usage": "mean"}, {"gpu_temp": 72, "gpu_usage": 55}),
+])
+def test_aggregate(aggregation, expected):
+    samples = [{"gpu_temp": 48, "gpu_usage": 90}, {"gpu_temp": 72, "gpu_usage": 20}]
+    assert GpuSelection("all", aggregation).aggregate(samples) == expected
+
+
+def test_aggregate_skips_missing_readings():
+    samples = [{"gpu_temp": 50, "gpu_power": None}, {"gpu_temp": 70, "gpu_power": 200.0}, {}]
+    assert GpuSelection("all", "mean").aggregate(samples) == {"gpu_temp": 60, "gpu_power": 200.0}
+
+
+def test_nvml_selection_by_bus_id():
+    backend = NvmlBackend(selection=GpuSelection(["03:00.0"]), pynvml=fake_pynvml([50, 72, 65], [10, 90, 40]))
+    assert backend.read()["gpu_temp"] == 65
+    assert backend.extra_metrics == ["gpu_memory"]
+
+
+def test_nvml_aggregates_all_gpus():
+    pynvml = fake_pynvml([50, 72, 65], [10, 90, 40], power=[100, 150, None])
+    hottest = NvmlBackend(selection=GpuSelection("all"), pynvml=pynvml)
+    assert hottest.read() == {"gpu_temp": 72, "gpu_usage": 90, "gpu_power": 150.0, "gpu_memory": 25.0}
+    mean = NvmlBackend(selection=GpuSelection([0, 2], "mean"), pynvml=pynvml)
+    assert mean.read() == {"gpu_temp": 57.5, "gpu_usage": 25, "gpu_power": 100.0, "gpu_memory": 25.0}
+
+
+def test_nvml_reads_all_gpus_in_one_pass():
+    pynvml = fake_pynvml([50, 72], [10, 90])
+    backend = NvmlBackend(selection=GpuSelection("all"), pynvml=pynvml, max_age=10)
+    assert (backend.get_temperature(), backend.get_usage(), backend.getter("gpu_memory")()) == (72, 90, 25.0)
+    assert pynvml.calls['temperature'] == 2  # One read per GPU
+
+
+def test_nvml_missing_gpu():
+    assert NvmlBackend.create(selection=GpuSelection([5]), pynvml=fake_pynvml([50], [10])) is None
+
+
+def test_amd_selection_and_aggregation():
+    gpus = [types.SimpleNamespace(pci_slot="0000:03:00.0", query_temperature=lambda: 55, query_load=lambda: 0.2),
+            types.SimpleNamespace(pci_slot="0000:04:00.0", query_temperature=lambda: 48, query_load=lambda: 0.7)]
+    pyamdgpuinfo = types.SimpleNamespace(detect_gpus=lambda: len(gpus), get_gpu=lambda index: gpus[index])
+    assert AmdGpuBackend(selection=GpuSelection(["04:00.0"]), pyamdgpuinfo=pyamdgpuinfo).read() == \
+        {"gpu_temp": 48, "gpu_usage": 70}
+    assert AmdGpuBackend(selection=GpuSelection("all", "max"), pyamdgpuinfo=pyamdgpuinfo).read() == \
+        {"gpu_temp": 55, "gpu_usage": 70}
+
+
+def test_smi_stream_aggregates_selected_gpus():
+    command = ['sh', '-c', f'while true; do {SMI_LINES}; sleep 0.05; done']
+    stream = NvidiaSmiStream.create(selection=GpuSelection("all", "mean"), command=command)
+    try:
+        assert (stream.get_temperature(), stream.get_usage()) == (61, 50)
+    finally:
+        stream.close()
+    stream = NvidiaSmiStream.create(selection=GpuSelection(["02:00.0"]), command=command)
+    try:
+        assert stream.get_temperature() == 72
+    finally:
+        stream.close()
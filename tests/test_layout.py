@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+import pytest
+
+import layout
+from config import leds_indexes
+
+
+@pytest.fixture
+def layout_cache(tmp_path):
+    return tmp_path / 'layouts'
+
+
+def _cache_files(directory):
+    return sorted(directory.glob('layout-big-*.npz'))
+
+
+def test_cached_layout_matches_compiled(layout_cache):
+    compiled = layout.load_layout('big', layout_cache)
+    cached = layout.load_layout('big', layout_cache)
+    assert set(cached.groups) == set(compiled.groups)
+    for name, indexes in compiled.groups.items():
+        np.testing.assert_array_equal(cached.groups[name], indexes)
+    assert set(cached.segment_glyphs) == set(compiled.segment_glyphs)
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda data: data[:len(data) // 2],  # Truncated
+    lambda data: b'',
+    lambda data: b'not a zip file' * 100,
+])
+def test_corrupt_cache_is_rebuilt(layout_cache, corrupt):
+    layout.load_layout('big', layout_cache)
+    path, = _cache_files(layout_cache)
+    path.write_bytes(corrupt(path.read_bytes()))
+    rebuilt = layout.load_layout('big', layout_cache)
+    assert rebuilt.segment_glyphs
+    # And cached again
+    assert layout.Layout.load('big', path).segment_glyphs
+
+
+def test_stale_caches_are_removed(layout_cache, monkeypatch):
+    layout.load_layout('big', layout_cache)
+    old, = _cache_files(layout_cache)
+    monkeypatch.setattr(layout, 'CACHE_VERSION', layout.CACHE_VERSION + 1)
+    layout.load_layout('big', layout_cache)
+    new, = _cache_files(layout_cache)
+    assert new != old
+
+
+def test_mismatched_layout_json_is_ignored(layout_cache, tmp_path, monkeypatch, capsys):
+    with open(layout.LAYOUT_JSON, 'r') as f:
+        layout_json = json.load(f)
+    layout_json['cpu_led'] = layout_json['gpu_led']
+    bad_path = tmp_path / 'layout.json'
+    bad_path.write_text(json.dumps(layout_json))
+    monkeypatch.setitem(layout.LAYOUT_SOURCES, 'big', (leds_indexes, str(bad_path)))
+    compiled = layout.load_layout('big', layout_cache)
+    assert compiled.segment_glyphs == {}
+    assert 'cpu_led' in compiled.groups
+    assert "Warning: ignoring" in capsys.readouterr().out
+    assert _cache_files(layout_cache) == []  # Not cached, so the warning comes back
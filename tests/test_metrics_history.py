@@ -0,0 +1,110 @@
+import math
+import random
+
+import pytest
+
+from metrics_history import MetricHistory, history_settings
+
+
+class BruteForceHistory:
+    """Keeps every sample and recomputes everything from them on each push."""
+
+    def __init__(self, size, method="none", alpha=0.5, window=5, hysteresis=0.0):
+        self.size = size
+        self.pushed = []
+        self.configure(method, alpha, window, hysteresis)
+
+    def configure(self, method="none", alpha=0.5, window=5, hysteresis=0.0):
+        self.method, self.alpha, self.window, self.hysteresis = method, alpha, window, hysteresis
+        self.smoothed = self.pushed[-1] if self.pushed else None
+        self.shown = None
+
+    def push(self, value):
+        self.pushed.append(float(value))
+        if self.method == "ema" and self.smoothed is not None:
+            self.smoothed += self.alpha * (value - self.smoothed)
+        elif self.method == "mean":
+            recent = self.pushed[-self.window:]
+            self.smoothed = sum(recent) / len(recent)
+        else:
+            self.smoothed = float(value)
+        if self.shown is None or abs(self.smoothed - self.shown) > self.hysteresis:
+            self.shown = int(self.smoothed) if self.method == "none" else math.floor(self.smoothed + 0.5)
+        return self.shown
+
+    def stats(self):
+        buffer = self.pushed[-self.size:]
+        return min(buffer), max(buffer), sum(buffer) / len(buffer)
+
+
+def _samples(rng, count):
+    """Runs of integer readings (lots of ties for the monotonic queues) mixed with noisy floats."""
+    value = 50.0
+    for _ in range(count):
+        if rng.random() < 0.5:
+            value = float(rng.randint(0, 100))
+        else:
+            value = min(100.0, max(0.0, value + rng.uniform(-7, 7)))
+        yield value
+
+
+def _assert_same(history, reference):
+    minimum, maximum, mean = history.stats()
+    ref_minimum, ref_maximum, ref_mean = reference.stats()
+    assert (minimum, maximum) == (ref_minimum, ref_maximum)
+    assert mean == pytest.approx(ref_mean)
+    assert len(history) == min(len(reference.pushed), reference.size)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("size", [1, 2, 7, 120])
+@pytest.mark.parametrize("method, hysteresis", [("none", 0.0), ("none", 1.5), ("ema", 0.0), ("ema", 0.6),
+                                                ("mean", 0.0), ("mean", 0.8)])
+def test_matches_brute_force(seed, size, method, hysteresis):
+    rng = random.Random(seed)
+    settings = dict(method=method, alpha=rng.choice([0.1, 0.5, 1.0]), window=rng.randint(1, size),
+                    hysteresis=hysteresis)
+    history = MetricHistory(size, **settings)
+    reference = BruteForceHistory(size, **settings)
+    assert history.stats() is None
+    for value in _samples(rng, 5 * size + 50):
+        assert history.push(value) == reference.push(value)
+        _assert_same(history, reference)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_reconfigured_while_running(seed):
+    rng = random.Random(seed)
+    history, reference = MetricHistory(20), BruteForceHistory(20)
+    samples = _samples(rng, 400)
+    for _ in range(8):
+        settings = dict(method=rng.choice(["none", "ema", "mean"]), alpha=rng.choice([0.2, 0.7]),
+                        window=rng.randint(1, 20), hysteresis=rng.choice([0.0, 0.5, 2.0]))
+        history.configure(**settings)
+        reference.configure(**settings)
+        for _ in range(50):
+            value = next(samples)
+            assert history.push(value) == reference.push(value)
+            _assert_same(history, reference)
+
+
+def test_hysteresis_holds_the_shown_value():
+    history = MetricHistory(10, hysteresis=1.0)
+    assert [history.push(value) for value in [60, 60.9, 59.2, 61, 61.1, 60.1, 59.9]] == [60, 60, 60, 60, 61, 61, 59]
+
+
+def test_ema_rounds_and_starts_from_the_first_sample():
+    history = MetricHistory(10, method="ema", alpha=0.5)
+    assert [history.push(value) for value in [40, 50, 50, 50]] == [40, 45, 48, 49]  # 40, 45, 47.5, 48.75
+
+
+@pytest.mark.parametrize("settings", [dict(method="median"), dict(alpha=0), dict(alpha=1.5), dict(window=0),
+                                      dict(window=11), dict(hysteresis=-1)])
+def test_invalid_settings(settings):
+    with pytest.raises(ValueError):
+        MetricHistory(10, **settings)
+
+
+def test_history_settings():
+    assert history_settings({}) == {"size": 120, "method": "none", "alpha": 0.5, "window": 5, "hysteresis": 0.0}
+    assert history_settings({"history": "30", "method": "ema", "alpha": "0.2"})["size"] == 30
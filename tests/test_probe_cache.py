@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+import metrics
+import probe_cache
+from probe_cache import ProbeCache, system_fingerprint
+
+
+def test_default_path_is_in_the_cache_dir(cache_dir):
+    assert ProbeCache().path == str(cache_dir / 'digital_lcd' / 'backends.json')
+
+
+def test_round_trip(cache_dir):
+    ProbeCache().save("key", {"cpu_temp": "sysfs", "gpu_temp": None})
+    assert ProbeCache().load("key") == {"cpu_temp": "sysfs", "gpu_temp": None}
+    assert ProbeCache().load("other key") == {}
+
+
+@pytest.mark.parametrize("content", ['{"key": "key", "backends": {"cpu_temp": ', 'not json', '[]', '{"key": "key"}',
+                                     '{"key": "key", "backends": ["sysfs"]}', ''])
+def test_corrupt_cache(tmp_path, content):
+    path = tmp_path / 'backends.json'
+    path.write_text(content)
+    assert ProbeCache(str(path)).load("key") == {}
+    ProbeCache(str(path)).save("key", {"cpu_temp": "psutil"})  # And replaced on the next save
+    assert ProbeCache(str(path)).load("key") == {"cpu_temp": "psutil"}
+
+
+def test_missing_cache(tmp_path):
+    assert ProbeCache(str(tmp_path / 'missing.json')).load("key") == {}
+
+
+def test_unwritable_cache(tmp_path, capsys):
+    (tmp_path / 'file').write_text('')
+    ProbeCache(str(tmp_path / 'file' / 'backends.json')).save("key", {})
+    assert "could not cache the metric backends" in capsys.readouterr().out
+
+
+def test_fingerprint_follows_its_inputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(probe_cache, 'BACKEND_MODULES', [])
+    monkeypatch.setattr(probe_cache, 'BACKEND_COMMANDS', [])
+    driver = tmp_path / 'version'
+    driver.write_text('NVRM version: 550.54\nmore\n')
+    monkeypatch.setattr(probe_cache, 'DRIVER_VERSION_FILES', [str(driver), str(tmp_path / 'missing')])
+    key = system_fingerprint("nvidia", None, [0])
+    assert system_fingerprint("nvidia", None, [0]) == key
+    assert len({key, system_fingerprint("amd", None, [0]), system_fingerprint("nvidia", "k10temp:Tctl", [0]),
+                system_fingerprint("nvidia", None, None)}) == 4
+    driver.write_text('NVRM version: 555.42\n')
+    assert system_fingerprint("nvidia", None, [0]) != key
+
+
+def test_fingerprint_follows_installed_backends(monkeypatch):
+    installed = set()
+    monkeypatch.setattr(probe_cache.importlib.util, 'find_spec', lambda name: object() if name in installed else None)
+    monkeypatch.setattr(probe_cache.shutil, 'which', lambda name: f'/usr/bin/{name}' if name in installed else None)
+    key = system_fingerprint("nvidia")
+    installed.add("pynvml")
+    with_module = system_fingerprint("nvidia")
+    installed.add("nvidia-smi")
+    assert len({key, with_module, system_fingerprint("nvidia")}) == 3
+
+
+@pytest.fixture
+def probes(config_path, monkeypatch):
+    """Metrics with fake backends: only thermal_zone (cpu_temp) and psutil (cpu_usage) work. Returns the backends opened."""
+    config = json.loads(config_path.read_text())
+    config.update(gpu_vendor="nvidia", metric_providers=[])
+    config_path.write_text(json.dumps(config))
+    working = {('cpu_temp', 'thermal_zone'): 50, ('cpu_usage', 'psutil'): 10}
+    opened = []
+
+    def open_backend(self, metric, name):
+        opened.append((metric, name))
+        if (metric, name) in working:
+            return lambda: working[metric, name]
+        return None
+    monkeypatch.setattr(metrics.Metrics, '_open_backend', open_backend)
+
+    def probe():
+        opened.clear()
+        sampler = metrics.Metrics(config_path=str(config_path))
+        return sampler, list(opened)
+    return probe
+
+
+def test_metrics_probe_once(probes, cache_dir):
+    sampler, opened = probes()
+    assert sampler.backends == {'cpu_temp': 'thermal_zone', 'cpu_usage': 'psutil'}
+    assert ('cpu_temp', 'sysfs') in opened and ('gpu_temp', 'nvml') in opened
+    assert json.loads((cache_dir / 'digital_lcd' / 'backends.json').read_text())["backends"] == {
+        'cpu_temp': 'thermal_zone', 'cpu_usage': 'psutil', 'gpu_temp': None, 'gpu_usage': None}
+    # Next start: the cached backends only, and no probe of the GPU metrics that had none
+    sampler, opened = probes()
+    assert opened == [('cpu_temp', 'thermal_zone'), ('cpu_usage', 'psutil')]
+    assert sampler.backends == {'cpu_temp': 'thermal_zone', 'cpu_usage': 'psutil'}
+
+
+def test_metrics_probe_again_on_a_new_fingerprint(probes, monkeypatch):
+    probes()
+    monkeypatch.setattr(metrics, 'system_fingerprint', lambda *args: "another system")
+    sampler, opened = probes()
+    assert ('gpu_temp', 'nvml') in opened and ('cpu_temp', 'sysfs') in opened
+
+
+def test_metrics_corrupt_cache(probes, cache_dir):
+    probes()
+    (cache_dir / 'digital_lcd' / 'backends.json').write_text('{"key": ')
+    sampler, opened = probes()
+    assert ('gpu_temp', 'nvml') in opened
+    assert sampler.backends == {'cpu_temp': 'thermal_zone', 'cpu_usage': 'psutil'}
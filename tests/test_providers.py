@@ -0,0 +1,87 @@
+import pytest
+
+import providers
+from conftest import write_hwmon
+from providers import (FanProvider, MetricProvider, RaplPowerProvider, StorageTemperatureProvider,
+                       create_providers, register_provider)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """An isolated copy of the built-in registry, without the installed plugins."""
+    monkeypatch.setattr(providers, '_registry', dict(providers._registry))
+    monkeypatch.setattr(providers, '_entry_points_loaded', True)
+    return providers._registry
+
+
+class CostlyProvider(MetricProvider):
+    name = "costly"
+    metrics = ("costly_metric",)
+    cost = "high"
+
+    def read(self):
+        return {"costly_metric": 1}
+
+
+def _names(selection=None):
+    return [provider.name for provider in create_providers(selection)]
+
+
+def test_builtin_costs(registry):
+    assert {name for name, cls in registry.items() if cls.cost == "low"} == {"memory", "network"}
+    assert {name for name, cls in registry.items() if cls.cost == "high"} == {"storage", "fans", "rapl"}
+
+
+def test_defaults_are_low_cost_only(registry):
+    register_provider(CostlyProvider)
+    assert sorted(_names()) == ["memory", "network"]
+
+
+def test_high_cost_providers_are_opt_in(registry):
+    register_provider(CostlyProvider)
+    assert _names(["costly"]) == ["costly"]
+    assert _names("costly") == ["costly"]
+    assert "costly" in _names("all")
+
+
+def test_string_selection_is_not_a_substring_match(registry, capsys):
+    assert _names("mem") == []
+    assert "unknown metric provider mem" in capsys.readouterr().out
+
+
+def test_register_provider_checks_its_attributes(registry):
+    with pytest.raises(ValueError):
+        register_provider(type("Nameless", (MetricProvider,), {"metrics": ("x",)}))
+    with pytest.raises(ValueError):
+        register_provider(type("Pricey", (MetricProvider,), {"name": "pricey", "metrics": ("x",), "cost": "extreme"}))
+
+
+def test_storage_temperatures(tmp_path):
+    write_hwmon(tmp_path, [("nvme", [("Composite", 41850), ("Sensor 1", 50000)]), ("nvme", [("Composite", 38000)]),
+                           ("drivetemp", [(None, 33000)])])
+    provider = StorageTemperatureProvider(root=str(tmp_path))
+    assert provider.available()
+    assert provider.read() == {"nvme_temp": 41.85, "disk_temp": 33.0}
+
+
+def test_fans(tmp_path):
+    hwmon = tmp_path / 'class/hwmon/hwmon0'
+    hwmon.mkdir(parents=True)
+    (hwmon / 'fan1_input').write_text('850\n')
+    (hwmon / 'fan2_input').write_text('1200\n')
+    assert FanProvider(root=str(tmp_path)).read() == {"fan_rpm": 1200}
+    assert not FanProvider(root=str(tmp_path / 'empty')).available()
+
+
+def test_rapl_power_wraps_around(tmp_path, monkeypatch):
+    zone = tmp_path / 'class/powercap/intel-rapl:0'
+    zone.mkdir(parents=True)
+    (zone / 'max_energy_range_uj').write_text('1000000\n')
+    (zone / 'energy_uj').write_text('900000\n')
+    now = [100.0]
+    monkeypatch.setattr(providers.time, 'monotonic', lambda: now[0])
+    provider = RaplPowerProvider(root=str(tmp_path))
+    assert provider.read() == {"cpu_power": None}  # Needs two readings
+    (zone / 'energy_uj').write_text('100000\n')
+    now[0] += 2.0
+    assert provider.read() == {"cpu_power": pytest.approx(0.1)}  # 200000 uJ over 2 s, across the wrap
@@ -0,0 +1,41 @@
+from conftest import write_hwmon
+from sysfs_sensors import find_sensor, list_temperature_sensors
+
+
+def test_list_temperature_sensors(tmp_path):
+    write_hwmon(tmp_path, [("nvme", [("Composite", 41000)]), ("k10temp", [("Tctl", 55250), ("Tccd1", 50000)])])
+    chips = [(chip, label) for chip, label, _ in list_temperature_sensors(tmp_path)]
+    assert chips == [("nvme", "Composite"), ("k10temp", "Tctl"), ("k10temp", "Tccd1")]
+
+
+def test_find_sensor_by_chip_and_label(tmp_path):
+    write_hwmon(tmp_path, [("k10temp", [("Tctl", 55250), ("Tccd1", 50000)])])
+    sensor = find_sensor("k10temp:Tccd1", root=tmp_path)
+    assert sensor.name == "k10temp:Tccd1"
+    assert sensor.read() == 50.0
+    sensor.close()
+
+
+def test_find_sensor_chip_only_takes_first_input(tmp_path):
+    write_hwmon(tmp_path, [("coretemp", [("Package id 0", 61000), ("Core 0", 58000)])])
+    assert find_sensor("coretemp", root=tmp_path).read() == 61.0
+
+
+def test_find_sensor_default_preference(tmp_path):
+    write_hwmon(tmp_path, [("acpitz", [(None, 27800)]), ("k10temp", [("Tdie", 49000), ("Tctl", 59000)])])
+    sensor = find_sensor(root=tmp_path)
+    assert sensor.name == "k10temp:Tctl"
+    assert sensor.read() == 59.0
+
+
+def test_find_sensor_rereads_open_input(tmp_path):
+    write_hwmon(tmp_path, [("k10temp", [("Tctl", 40000)])])
+    sensor = find_sensor("k10temp:Tctl", root=tmp_path)
+    (tmp_path / 'class/hwmon/hwmon0/temp1_input').write_text('42500\n')
+    assert sensor.read() == 42.5
+
+
+def test_find_sensor_missing(tmp_path):
+    write_hwmon(tmp_path, [("nvme", [("Composite", 41000)])])
+    assert find_sensor("k10temp:Tctl", root=tmp_path) is None
+    assert find_sensor(["k10temp:Tctl", "nvme:Sensor 1"], root=tmp_path) is None